@@ -8,7 +8,10 @@ from api.tasks import create_router
 
 
 def create_app(
-    task_params: dict[int, TaskParameters], func: Callable[..., Any], logger: Logger
+    task_params: dict[int, TaskParameters],
+    func: Callable[..., Any],
+    logger: Logger,
+    metrics: Callable[[], dict] | None = None,
 ) -> FastAPI:
     """
     Creates a FastAPI application and registers a router for task handling.
@@ -22,6 +25,8 @@ def create_app(
         A callable function to be executed for task processing.
     logger : Logger
         A `Logger` instance for logging application events and task activity.
+    metrics : Callable[[], dict] | None, optional
+        Returns the runtime metrics of the whole service for `/api/metrics`.
 
     Returns
     -------
@@ -36,7 +41,7 @@ def create_app(
     """
     app = FastAPI()
 
-    router = create_router(task_params, func, logger)
+    router = create_router(task_params, func, logger, metrics)
     app.include_router(router)
 
     return app
@@ -0,0 +1,142 @@
+import os
+from logging import Logger
+from typing import Callable
+
+from fastapi import APIRouter, Body, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from config import general_cfg
+
+
+def is_allowed_model_path(path: str) -> bool:
+    """
+    Checks whether a model may be loaded from a path given in a request:
+    the file must lie in the `models_dir` directory of the general config
+    or be one of the models declared in `models`.
+
+    Parameters
+    ----------
+    path : str
+        The path to the model file.
+
+    Returns
+    -------
+    bool
+        True if the model may be loaded from the path.
+    """
+    real_path = os.path.realpath(path)
+    models_dir = os.path.realpath(general_cfg.get("models_dir", "models"))
+    if os.path.commonpath([real_path, models_dir]) == models_dir:
+        return True
+    return any(
+        os.path.realpath(model_cfg["path"]) == real_path
+        for model_cfg in general_cfg.get("models", {}).values()
+    )
+
+
+def create_router(
+    default: str,
+    list_models: Callable[[], dict],
+    load: Callable[..., dict],
+    logger: Logger,
+) -> APIRouter:
+    """
+    Creates the router for listing and replacing the loaded models.
+
+    Parameters
+    ----------
+    default : str
+        The name of the model of the tasks that do not choose one.
+    list_models : Callable[[], dict]
+        Returns the description and the metrics of the loaded models
+        by name (see `Detector.model_stats`).
+    load : Callable[..., dict]
+        Loads a model by name, path and thresholds, registers it and returns
+        its description and metrics (see `Detector.load_model`).
+    logger : Logger
+        A `Logger` instance for logging application events.
+
+    Returns
+    -------
+    APIRouter
+        The router.
+    """
+    router = APIRouter()
+
+    @router.get("/api/models")
+    async def get_models() -> JSONResponse:
+        """
+        Collects the loaded models.
+
+        Returns
+        -------
+        response : :obj:`JSONResponse`
+            The response is in the form of json, which transmits the name
+            of the default model and the path, the thresholds and the runtime
+            metrics of every model.
+        """
+        return JSONResponse(
+            status_code=200,
+            content={"default": default, "models": list_models()},
+        )
+
+    @router.put("/api/models/{name}")
+    def load_model(name: str, request: Request, data: dict = Body(...)) -> JSONResponse:
+        """
+        Loads a model, or a new version of a loaded one, without interrupting
+        the running tasks: the tasks of the replaced model get the new one
+        for their next frame.
+
+        The endpoint is synchronous, so the loading runs in the thread pool
+        and does not block the other requests.
+
+        Parameters
+        ----------
+        name : str
+            The name the tasks choose the model by.
+        request : :obj:`Request`
+            A request with the path to the model file (`path`) and optionally
+            the confidence (`confTh`) and intersection over union (`iouTh`)
+            thresholds. The file must be allowed by `is_allowed_model_path`.
+
+        Returns
+        -------
+        response : :obj:`JSONResponse`
+            The response is in the form of json, which transmits the path,
+            the thresholds and the runtime metrics of the loaded model.
+            If the model cannot be loaded, by any of the worker processes
+            when they are enabled, an error is returned and the model
+            with this name is kept where it was not loaded.
+        """
+        if not data.get("path"):
+            raise HTTPException(status_code=400, detail="The path to the model is required")
+        if not is_allowed_model_path(data["path"]):
+            raise HTTPException(
+                status_code=400,
+                detail="The model must be in the models directory or declared in the config",
+            )
+        try:
+            stats = load(name, data["path"], data.get("confTh"), data.get("iouTh"))
+        except Exception as e:
+            logger.error(
+                '%s:%s - "%s %s" Model %s is not loaded: %s',
+                request.client.host,  # type: ignore
+                request.client.port,  # type: ignore
+                request.method,
+                request.url,
+                name,
+                e,
+            )
+            raise HTTPException(status_code=400, detail=f"Model {name} is not loaded: {e}")
+
+        logger.info(
+            '%s:%s - "%s %s" Model %s loaded.',
+            request.client.host,  # type: ignore
+            request.client.port,  # type: ignore
+            request.method,
+            request.url,
+            name,
+        )
+        return JSONResponse(status_code=200, content={"name": name, **stats})
+
+    return router
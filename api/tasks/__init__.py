@@ -10,7 +10,10 @@ from utils.dataclasses import StatusTask, TaskParameters
 
 
 def create_router(
-    task_params: dict[int, TaskParameters], func: Callable[..., Any], logger: Logger
+    task_params: dict[int, TaskParameters],
+    func: Callable[..., Any],
+    logger: Logger,
+    metrics: Callable[[], dict] | None = None,
 ) -> APIRouter:
     router = APIRouter()
 
@@ -63,6 +66,19 @@ def create_router(
                 A dictionary containing processed properties, including:
                 - `isRealtime` (bool): Indicates if the task is running in real-time.
                 - `corners` (list[int]): A list of integers representing corner coordinates.
+                - `sparseSampling` (bool): Indicates if only the analyzed frames
+                  of an uploaded file are decoded by seeking to them. Only present
+                  if it is in the request.
+                - `adaptiveFramerate` (bool): Indicates if the analysis frame rate
+                  follows the activity in the scene. Only present if it is in the request.
+                - `model` (str): The name of the model to detect objects with
+                  (see `/api/models`). Only present if it is in the request.
+                - `cascade` (bool): Indicates if a light model detects on most
+                  frames instead of the model of the task. Only present if it is
+                  in the request.
+                - `regions` (list): Additional regions of interest, each is either
+                  a rectangle [up, left, bottom, right] or a polygon given as
+                  a list of [x, y] vertices. Only present if it is in the request.
             """
             properties = {
                 "isRealtime": data.get("isRealtime", False),
@@ -72,6 +88,26 @@ def create_router(
                 properties["isRealtime"] = (
                     True if properties["isRealtime"].lower() == "true" else False
                 )
+            if "sparseSampling" in data:
+                properties["sparseSampling"] = data["sparseSampling"]
+                if isinstance(properties["sparseSampling"], str):
+                    properties["sparseSampling"] = (
+                        properties["sparseSampling"].lower() == "true"
+                    )
+            if "adaptiveFramerate" in data:
+                properties["adaptiveFramerate"] = data["adaptiveFramerate"]
+                if isinstance(properties["adaptiveFramerate"], str):
+                    properties["adaptiveFramerate"] = (
+                        properties["adaptiveFramerate"].lower() == "true"
+                    )
+            if data.get("model"):
+                properties["model"] = str(data["model"])
+            if "cascade" in data:
+                properties["cascade"] = data["cascade"]
+                if isinstance(properties["cascade"], str):
+                    properties["cascade"] = properties["cascade"].lower() == "true"
+            if data.get("regions"):
+                properties["regions"] = data["regions"]
             check_corners = ["cornerUp", "cornerLeft", "cornerBottom", "cornerRight"]
             # Check corner
             for check in check_corners:
@@ -164,7 +200,7 @@ def create_router(
             The response is in the form of json, which transmits
             the current status of the task (processing status,
             ID of the last processed frame, video processing progress,
-            timestamp of the last processed frame).
+            timestamp of the last processed frame, runtime metrics).
             If the task with the transmitted ID does not exist,
             it returns a message stating that there is no such task.
         """
@@ -198,9 +234,32 @@ def create_router(
                 "framesProcessed": task_params[task_id].frame_processed,
                 "progress": task_params[task_id].progress,
                 "tsLastFrame": task_params[task_id].ts_last_processed,
+                "metrics": task_params[task_id].metrics,
             },
         )
 
+    @router.get("/api/metrics")
+    async def get_metrics() -> JSONResponse:
+        """
+        Collects the runtime metrics of the whole service.
+
+        Returns
+        -------
+        response : :obj:`JSONResponse`
+            The response is in the form of json, which transmits the number
+            of running tasks and the metrics shared by the tasks
+            (for example, the batch sizes and queueing delays of inference).
+        """
+        content = {
+            "tasksRunning": sum(
+                params.inference_status == StatusTask.RUNNING
+                for params in task_params.values()
+            ),
+        }
+        if metrics is not None:
+            content.update(metrics())
+        return JSONResponse(status_code=200, content=content)
+
     @router.delete("/api/inference/{task_id}")
     async def stop_inference(task_id: int, request: Request) -> JSONResponse:
         """
@@ -6,19 +6,17 @@ processing them and saving the results. It also has methods for other detectors
 that should be redefined for processing by a specific detector.
 """
 import os
-import queue
-import re
-import sys
 import glob
 import time
 import json
 from collections import defaultdict
+from functools import partial
 import traceback
 from abc import ABC, abstractmethod
 from logging import Logger
 from subprocess import Popen, TimeoutExpired
+from typing import Callable
 import threading
-from threading import Thread
 
 import cv2
 import ffmpeg
@@ -32,13 +30,34 @@ from config import general_cfg
 from logger import create_logger
 from schemas.inference_parameters import FFprobeParameters, InferenceCycleParameters
 from SFSORT import SFSORT
-from utils.dataclasses import StatusTask, TaskParameters
-from utils.validate import validate_unix_timestamp
+from utils.cascade import DetectorCascade
+from utils.dataclasses import (
+    FramePacket,
+    InferenceCycleContext,
+    LetterboxGeometry,
+    RegionOfInterest,
+    StatusTask,
+    TaskParameters,
+)
+from utils.frame_rate import AdaptiveFrameRate
+from utils.frame_source import (
+    FFmpegPipeSource,
+    FrameSource,
+    SeekSource,
+    get_frame_source,
+    probe_cached,
+)
+from utils.motion import MotionGate
+from utils.multiplexer import StreamMultiplexer, is_live
+from utils.nms import non_maximum_suppression
+from utils.pipeline import FramePipeline
+from utils.roi import covers_frame, draw_regions, inside_polygon, parse_regions
+from utils.tiling import TileSelector, make_tiles
+from utils.workers import WorkerPool
 
 
 list_of_animals = ["Медведь","Птица","Кот","Олень","Собака","Обезьяна","Тигр","Кабан"]
 
-import numpy as np
 from scipy.interpolate import splprep, splev
 
 def smooth_spline(points, window_size=general_cfg['framerate']//2):
@@ -156,6 +175,9 @@ class Base(ABC):
             """Останавливает периодическое обновление."""
             self.timer.cancel()
 
+    IOU_TH = 0.3
+    """The default threshold of intersection over union for merging the detections of overlapping regions."""
+
     def __init__(self):
         self.logger: Logger = create_logger(self.__class__.__name__)
         """A logger for displaying various information."""
@@ -163,13 +185,88 @@ class Base(ABC):
         """It stores all the parameters for each running task."""
         self.trackers: dict[int, SFSORT] = {}
         """It stores all the object trackers in the video for each running task."""
-        self.timestamps: dict[int, queue.Queue] = {}
-        """It stores all timestamps of the last processed frame for each running task."""
+        self.multiplexer = StreamMultiplexer()
+        """It shares the decoding of a stream between the tasks that process it."""
         self.app: FastAPI = create_app(
-            self.task_params, self._perform_inference_async, self.logger
+            self.task_params,
+            self._perform_inference_async,
+            self.logger,
+            self.service_metrics,
         )
         """The application object for communication with the video analytics manager."""
         self.data_loggers = {}
+        self.workers: WorkerPool | None = None
+        """It runs the tasks in worker processes, if they are enabled."""
+        if general_cfg.get("workers", 0) > 0:
+            self.workers = WorkerPool(general_cfg["workers"], self.task_params, self.logger)
+            # The workers are started when the detector is fully created
+            self.app.router.on_startup.append(
+                lambda: self.workers.start(self.worker_factory())
+            )
+            self.app.router.on_shutdown.append(self.workers.close)
+
+    def worker_factory(self) -> Callable[[], "Base"]:
+        """
+        Returns a picklable callable that creates the same detector
+        in a worker process (see `WorkerPool`).
+
+        Returns
+        -------
+        Callable[[], Base]
+            The constructor of the detector with its arguments.
+        """
+        raise NotImplementedError(
+            f"{self.__class__.__name__} does not support worker processes"
+        )
+
+    def service_metrics(self) -> dict:
+        """
+        Collects the runtime metrics shared by all tasks for `/api/metrics`.
+
+        Returns
+        -------
+        dict
+            The number of tasks on each shared stream and the metrics
+            of the worker processes, detectors add their own metrics
+            (e.g. of batching).
+        """
+        metrics = {"sharedStreams": self.multiplexer.streams()}
+        if self.workers is not None:
+            metrics["workers"] = self.workers.stats()
+        return metrics
+
+    def select_model(self, name: str | None) -> None:
+        """
+        Chooses the neural network for the detections made in the current
+        thread. The base detector has one network, detectors with several
+        of them override this method.
+
+        Parameters
+        ----------
+        name : str | None
+            The name of the network chosen by the task, None for the default one.
+
+        Raises
+        ------
+        KeyError
+            If there is no network with this name.
+        """
+        if name is not None:
+            raise KeyError(f"Unknown model: {name}")
+
+    def merge_iou_th(self) -> float:
+        """
+        Returns the threshold of intersection over union for merging
+        the detections of overlapping parts of the frame, so they are
+        suppressed like the detections within one part.
+
+        Returns
+        -------
+        float
+            The threshold of the network chosen in the current thread,
+            `IOU_TH` for the base detector.
+        """
+        return self.IOU_TH
 
     @abstractmethod
     def pre_process(
@@ -193,6 +290,11 @@ class Base(ABC):
             to the original one.
         dwdh : tuple[float, float]
             It contains paddings in width and height, respectively.
+
+        Notes
+        -----
+        The returned image may be a buffer that is reused for the next
+        frame prepared in the same thread.
         """
         raise NotImplementedError("Subclasses must implement pre_process")
 
@@ -210,6 +312,11 @@ class Base(ABC):
         -------
         output : ndarray
             The results of image processing by a neural network.
+
+        Notes
+        -----
+        The returned array may be a buffer that is overwritten by the next
+        inference in the same thread.
         """
         raise NotImplementedError("Subclasses must implement inference")
 
@@ -240,43 +347,51 @@ class Base(ABC):
         """
         raise NotImplementedError("Subclasses must implement post_process")
 
-    @staticmethod
-    def draw_ROI(
-        img: np.ndarray,
-        corners: list[int],
-    ) -> np.ndarray:
+    def model_input_geometry(
+        self, width: int, height: int
+    ) -> LetterboxGeometry | None:
         """
-        Highlights the region of interest by coordinates
+        Describes how a frame of the given size is fitted into the input
+        of the neural network. Detectors that return it can receive frames
+        already resized and padded by the ffmpeg read process
+        (see `pre_process_letterboxed`).
 
         Parameters
         ----------
-        img : ndarray
-            The original image.
-        cornerUp : int
-            The coordinate of the upper-left corner in height
-        cornerLeft : int
-            The coordinate of the upper-left corner in width
-        cornerBottom : int
-            The coordinate of the lower-right corner in height
-        cornerRight : int
-            The coordinate of the lower-right corner in width
+        width : int
+            The width of the original frame.
+        height : int
+            The height of the original frame.
 
         Returns
         -------
-        inf_img : ndarray
-            An image with the selected region of interest
+        LetterboxGeometry | None
+            The resize and padding, or None if the detector does not support it.
         """
-        inf_img = img.copy()
-        mask = np.zeros(inf_img.shape[:2], np.uint8)
+        return None
 
-        cornerUp = corners[0]
-        cornerLeft = corners[1]
-        cornerBottom = corners[2]
-        cornerRight = corners[3]
+    def pre_process_letterboxed(
+        self, input_img: np.ndarray, geometry: LetterboxGeometry
+    ) -> tuple[np.ndarray, float, tuple[float, float]]:
+        """
+        Prepares an RGB image that was already resized and padded
+        according to `model_input_geometry` for processing.
 
-        mask[cornerUp:cornerBottom, cornerLeft:cornerRight] = 255
-        inf_img = cv2.bitwise_and(inf_img, inf_img, mask=mask)
-        return inf_img
+        Parameters
+        ----------
+        input_img : ndarray
+            The resized and padded RGB image.
+        geometry : LetterboxGeometry
+            The resize and padding applied to the original image.
+
+        Returns
+        -------
+        img, ratio, dwdh
+            The same as in `pre_process`.
+        """
+        raise NotImplementedError(
+            "Subclasses must implement pre_process_letterboxed"
+        )
 
     @staticmethod
     def draw_results(img: np.ndarray, dets: list) -> np.ndarray:
@@ -386,61 +501,196 @@ class Base(ABC):
         if saved_files:
             self.logger.info(f"Saved objects this batch: {', '.join(saved_files)}")
 
-    def _get_timestamp(self, process: Popen, task_id: str) -> None:
+    def detect(
+        self, img: np.ndarray, geometry: LetterboxGeometry | None = None
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray] | tuple[None, None, None]:
         """
-        A loop that takes and records timestamps from the ffmpeg process
-        for each received frame.
+        Runs preprocessing, the neural network and postprocessing on the given image.
 
         Parameters
         ----------
-        process : :obj:`Popen`
-            An ffmpeg process that reads frames from a video stream and text data.
-        task_id : str
-            The ID of the video processing task.
+        img : np.ndarray
+            The input image for object detection, represented as a NumPy array.
+        geometry : LetterboxGeometry | None, optional
+            If set, `img` is an RGB image already letterboxed with this geometry.
+
+        Returns
+        -------
+        boxes, classes, scores : np.ndarray | None
+            The results of `post_process`. None if no objects are detected.
         """
-        sei = False
-        zero_is_twice = False
+        if geometry is not None:
+            pre_img, ratio, dwdh = self.pre_process_letterboxed(img, geometry)
+        else:
+            pre_img, ratio, dwdh = self.pre_process(img)
 
-        while self.task_params[task_id].inference_status == StatusTask.RUNNING:
-            while self.task_params[task_id].frame_processed <= 0 and not sei:
-                err_line = process.stderr.readline()  # type: ignore
-                if not err_line:
-                    break
-                msg: str = err_line.decode().strip()
-
-                match = re.search(r"SEI.*ts: (\d+)", msg)
-                if match:
-                    timestamp = int(match.group(1))
-                    sei = validate_unix_timestamp(timestamp)
-                    if sei:
-                        self.timestamps[task_id].put(timestamp)
-                        break
+        outputs = self.inference(pre_img)
+        if outputs is None:
+            return None, None, None
+        return self.post_process(outputs, dwdh, ratio)
 
-                match = re.search(r"pts_time:\s*([-+]?\d*\.\d+|\d+)", msg)
-                if match:
-                    if not int(float(match.group(1)) * 1000):
-                        if zero_is_twice:
-                            continue
-                        zero_is_twice = True
-                    timestamp = int(float(match.group(1)) * 1000)
-                    self.timestamps[task_id].put(timestamp)
-
-            err_line = process.stderr.readline()  # type: ignore
-            if not err_line:
-                break
-            msg: str = err_line.decode().strip()
-
-            if sei:
-                match = re.search(r"SEI.*ts: (\d+)", msg)
-                if match:
-                    timestamp = int(match.group(1))
-            else:
-                match = re.search(r"pts_time:\s*([-+]?\d*\.\d+|\d+)", msg)
-                if match:
-                    timestamp = int(float(match.group(1)) * 1000)
-            if timestamp not in self.timestamps[task_id].queue:
-                self.timestamps[task_id].put(timestamp)
-                
+    def detect_batch(
+        self, imgs: list[np.ndarray]
+    ) -> list[tuple[np.ndarray, np.ndarray, np.ndarray] | tuple[None, None, None]]:
+        """
+        Runs `detect` on several images. Detectors may override it
+        to process the images with one run of the neural network.
+
+        Parameters
+        ----------
+        imgs : list[np.ndarray]
+            The images for object detection.
+
+        Returns
+        -------
+        list[tuple[np.ndarray, np.ndarray, np.ndarray] | tuple[None, None, None]]
+            The results of `detect` for each image.
+        """
+        return [self.detect(img) for img in imgs]
+
+    def detect_tiles(
+        self, img: np.ndarray, tiles: list[tuple[int, int, int, int]]
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray] | tuple[None, None, None]:
+        """
+        Detects objects in the whole frame and in its tiles at once,
+        so small objects are seen at a higher resolution, and merges
+        the results in the coordinates of the frame.
+
+        Parameters
+        ----------
+        img : np.ndarray
+            The original frame.
+        tiles : list[tuple[int, int, int, int]]
+            The left, top, right and bottom edges of the tiles.
+
+        Returns
+        -------
+        boxes, classes, scores : np.ndarray | None
+            The merged results. None if no objects are detected.
+        """
+        crops = [img] + [img[up:bottom, left:right] for left, up, right, bottom in tiles]
+        results = self.detect_batch(crops)
+        detections = [results[0]]
+        for (left, up, _, _), (boxes, classes, scores) in zip(tiles, results[1:]):
+            if boxes is not None:
+                offset = np.array([left, up, left, up], dtype=boxes.dtype)
+                detections.append((boxes + offset, classes, scores))
+        return self.merge_detections(detections)
+
+    def detect_regions(
+        self, img: np.ndarray, regions: list[RegionOfInterest]
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray] | tuple[None, None, None]:
+        """
+        Runs `detect` on the crop of each region of interest, so the model
+        sees the region at its full input resolution, and maps the results
+        back to the coordinates of the frame.
+
+        Parameters
+        ----------
+        img : np.ndarray
+            The original frame.
+        regions : list[RegionOfInterest]
+            The regions of interest. Only objects with the center inside
+            a polygon region are kept.
+
+        Returns
+        -------
+        boxes, classes, scores : np.ndarray | None
+            The results of all regions. None if no objects are detected.
+        """
+        detections = []
+        for region in regions:
+            left, up, right, bottom = region.box
+            boxes, classes, scores = self.detect(img[up:bottom, left:right])
+            if boxes is None:
+                continue
+            boxes = boxes + np.array([left, up, left, up], dtype=boxes.dtype)
+            if region.polygon is not None:
+                inside = inside_polygon(boxes, region.polygon)
+                boxes, classes, scores = boxes[inside], classes[inside], scores[inside]
+            detections.append((boxes, classes, scores))
+        return self.merge_detections(detections)
+
+    def merge_detections(
+        self, detections: list[tuple[np.ndarray, np.ndarray, np.ndarray]]
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray] | tuple[None, None, None]:
+        """
+        Joins the detections of several parts of the frame. An object
+        found in overlapping parts is kept once by non-maximum suppression
+        with the threshold of `merge_iou_th`.
+
+        Parameters
+        ----------
+        detections : list[tuple[np.ndarray, np.ndarray, np.ndarray]]
+            The boxes, classes and scores of each part in frame coordinates,
+            None for the parts without objects.
+
+        Returns
+        -------
+        boxes, classes, scores : np.ndarray | None
+            The joined results. None if there are no objects.
+        """
+        detections = [
+            detection
+            for detection in detections
+            if detection[0] is not None and len(detection[0])
+        ]
+        if not detections:
+            return None, None, None
+        if len(detections) == 1:
+            return detections[0]
+
+        boxes, classes, scores = (np.concatenate(arrays) for arrays in zip(*detections))
+        indices = non_maximum_suppression(boxes, scores, self.merge_iou_th())
+        return boxes[indices], classes[indices], scores[indices]
+
+    def track(
+        self,
+        boxes: np.ndarray | None,
+        classes: np.ndarray | None,
+        scores: np.ndarray | None,
+        task_id: int,
+    ) -> list:
+        """
+        Passes the detections of a frame to the tracker of the task.
+
+        Parameters
+        ----------
+        boxes, classes, scores : np.ndarray | None
+            The results of `detect`.
+        task_id : int
+            The identifier for the current task, used to manage trackers for
+            multi-task scenarios.
+
+        Returns
+        -------
+        dets : list
+            A list of tracked objects in the format described in `run`.
+        """
+        dets = []
+        if boxes is None:
+            return dets
+
+        match general_cfg["tracker"]:
+            case "sfsort":
+                tracks = self.trackers[task_id].update(boxes, scores, classes)
+                if len(tracks):
+                    for track in tracks:
+                        x0, y0, x1, y1 = map(int, track[0])
+                        dets.append(
+                            [
+                                x0,
+                                y0,
+                                x1,
+                                y1,
+                                int(track[1]),  # Track ID
+                                int(track[2]),  # Class ID
+                                float(track[3]),# Confidence
+                                float(track[4]), #Time
+                                list(track[5]), # Snapshot of the trail
+                            ]
+                        )
+        return dets
 
     def run(self, img: np.ndarray, task_id: int) -> list:
         """
@@ -469,43 +719,21 @@ class Base(ABC):
             - score (float): The confidence score of the detection.
             Returns an empty list if no objects are detected.
         """
-        dets = []
-        pre_img, ratio, dwdh = self.pre_process(img)
-
-        outputs = self.inference(pre_img)
-        if outputs is not None:
+        boxes, classes, scores = self.detect(img)
+        return self.track(boxes, classes, scores, task_id)
 
-            boxes, classes, scores = self.post_process(outputs, dwdh, ratio)
-            if boxes is not None:
-
-                match general_cfg["tracker"]:
-                    case "sfsort":
-                        tracks = self.trackers[task_id].update(boxes, scores, classes)
-                        if len(tracks):
-                            for track in tracks:
-                                x0, y0, x1, y1 = map(int, track[0])
-                                dets.append(
-                                    [
-                                        x0,
-                                        y0,
-                                        x1,
-                                        y1,
-                                        int(track[1]),  # Track ID
-                                        int(track[2]),  # Class ID
-                                        float(track[3]),# Confidence
-                                        float(track[4]), #Time
-                                        track[5],
-                                    ]
-                                )
-        return dets
-
-    @staticmethod
-    def _ffprobe_read(video_url: str) -> FFprobeParameters:
+    def _probe_source(
+        self, frame_source: type[FrameSource], video_url: str
+    ) -> FFprobeParameters:
         """
-        Extracts video metadata using FFmpeg and returns relevant parameters.
+        Extracts video metadata with the frame source backend and returns
+        relevant parameters. The metadata of local files is cached
+        (see `probe_cached`).
 
         Parameters
         ----------
+        frame_source : type[FrameSource]
+            The frame source backend that will read the video.
         video_url : str
             The URL or file path of the video to probe.
 
@@ -515,42 +743,63 @@ class Base(ABC):
             An object containing video properties such as width, height, frame rate,
             frame interval, and duration.
         """
-        print(video_url)
-        try:
-            probe = ffmpeg.probe(video_url)
-        except ffmpeg.Error as e:
-            print("ffprobe stderr output:")
-            print(e.stderr.decode())
-            raise RuntimeError(e.stderr.decode())
-        video_info = next(s for s in probe["streams"] if s["codec_type"] == "video")
-        fps = video_info["r_frame_rate"].split("/")
-        fps = int(fps[0]) / int(fps[1])
-        
-        duration = (
-            float(video_info["duration"])
-            if "duration" in video_info
-            else general_cfg["working_time_sec"]
+        self.logger.debug("Probing %s", video_url)
+        return probe_cached(
+            frame_source,
+            video_url,
+            general_cfg["framerate"],
+            general_cfg["working_time_sec"],
+            timeout=general_cfg.get("probe_timeout_sec", 10),
         )
 
-        params = FFprobeParameters(
-            width=int(video_info["width"]),
-            height=int(video_info["height"]),
-            fps=fps,
-            frame_interval=fps / general_cfg["framerate"],
-            duration=duration,
-        )
+    def _open_stream(
+        self,
+        video_url: str,
+        pool_size: int,
+        duration: float,
+        task_id: int,
+    ) -> FFmpegPipeSource:
+        """
+        Opens a stream with full resolution frames. The ffmpeg read process
+        describes the stream itself, so the stream is not opened by ffprobe
+        beforehand.
 
-        return params
+        Parameters
+        ----------
+        video_url : str
+            The URL of the stream.
+        pool_size : int
+            The number of preallocated frames of the source.
+        duration : float
+            The time to read the stream for in seconds, 0 means no limit.
+        task_id : int
+            The ID of the video processing task.
 
-    @staticmethod
-    def _update_tracker(tracker: SFSORT, ffprobe_params: FFprobeParameters) -> None:
+        Returns
+        -------
+        FFmpegPipeSource
+            The opened source.
+        """
+        return FFmpegPipeSource.from_stream(
+            video_url,
+            pool_size,
+            general_cfg["framerate"],
+            duration,
+            task_id=task_id,
+            timeout=general_cfg.get("probe_timeout_sec", 10),
+            sei_timestamps=general_cfg.get("sei_timestamps", True),
+        )
+
+    def _update_tracker(self, task_id: int, ffprobe_params: FFprobeParameters) -> None:
         """
-        Updates tracker configuration based on FFmpeg probe parameters.
+        Creates the tracker of the task with the arguments from the general
+        config adjusted to the video. The adjusted arguments only belong
+        to the task and are not saved to the config file.
 
         Parameters
         ----------
-        tracker : SFSORT
-            The tracker instance to update.
+        task_id : int
+            The ID of the video processing task.
         ffprobe_params : FFprobeParameters
             The video parameters extracted from FFmpeg probe.
 
@@ -560,133 +809,365 @@ class Base(ABC):
         """
         match general_cfg["tracker"]:
             case "sfsort":
-                general_cfg["tracker_args_sfsort"].update(
-                    {
-                        "marginal_timeout": (7 * ffprobe_params.fps // 10),
-                        "central_timeout": ffprobe_params.fps,
-                        "horizontal_margin": ffprobe_params.width // 10,
-                        "vertical_margin": ffprobe_params.height // 10,
-                        "frame_width": ffprobe_params.width,
-                        "frame_height": ffprobe_params.height,
-                    }
-                )
-                general_cfg.upload()
-                # tracker.update_args(general_cfg["tracker_args_sfsort"])
+                tracker_args = {
+                    **general_cfg["tracker_args_sfsort"],
+                    "marginal_timeout": (7 * ffprobe_params.fps // 10),
+                    "central_timeout": ffprobe_params.fps,
+                    "horizontal_margin": ffprobe_params.width // 10,
+                    "vertical_margin": ffprobe_params.height // 10,
+                    "frame_width": ffprobe_params.width,
+                    "frame_height": ffprobe_params.height,
+                }
+                self.trackers[task_id] = SFSORT.SFSORT(tracker_args)
 
     @staticmethod
-    def _create_ffmpeg_processes(
-        video_url: str,
-        ffprobe_params: FFprobeParameters,
-        create_write_process: bool = True,
-        task_id: int = 0,
-    ) -> tuple[Popen, Popen | None]:
+    def _create_write_process(ffprobe_params: FFprobeParameters, task_id: int = 0) -> Popen:
         """
-        Creates FFmpeg processes for reading and optionally writing video data.
+        Creates the FFmpeg process that records the annotated video.
 
         Parameters
         ----------
-        video_url : str
-            The URL or file path of the video to process.
         ffprobe_params : FFprobeParameters
             The video parameters extracted from FFmpeg probe.
-        create_write_process : bool, optional
-            Flag to indicate whether a write process should be created (default is True).
         task_id : int, optional
             The task identifier used to name the output video file (default is 0).
 
         Returns
         -------
-        tuple[Popen, Popen | None]
-            A tuple containing the read process and the write process (if created).
+        Popen
+            The write process.
         """
-        read_process = (
+        # Prepare for save video results
+        video_dir = os.path.join(os.path.abspath(os.path.curdir), "videos")
+        if not os.path.exists(video_dir):
+            os.mkdir(video_dir)
+        video_file = os.path.join(video_dir, f"{task_id}.mp4")
+
+        write_process = (
             ffmpeg.input(
-                video_url,
-                t=ffprobe_params.duration,
-                r=ffprobe_params.fps,
-            )
-            .filter("showinfo")
-            .output(
                 "pipe:",
                 format="rawvideo",
                 pix_fmt="bgr24",
-                loglevel="trace",
-                r=ffprobe_params.fps,
+                s="{}x{}".format(ffprobe_params.width, ffprobe_params.height),
+                r=min(general_cfg["framerate"], ffprobe_params.fps),
             )
-            .run_async(pipe_stdout=True, pipe_stderr=True)
-        )
-
-        write_process = None
-        if create_write_process:
-            # Prepare for save video results
-            video_dir = os.path.join(os.path.abspath(os.path.curdir), "videos")
-            if not os.path.exists(video_dir):
-                os.mkdir(video_dir)
-            video_file = os.path.join(video_dir, f"{task_id}.mp4")
-
-            write_process = (
-                ffmpeg.input(
-                    "pipe:",
-                    format="rawvideo",
-                    pix_fmt="bgr24",
-                    s="{}x{}".format(ffprobe_params.width, ffprobe_params.height),
-                    r=min(general_cfg["framerate"], ffprobe_params.fps),
-                )
-                .output(
-                    video_file,
-                    pix_fmt="yuv420p",
-                    vcodec="libx264",
-                    r=min(general_cfg["framerate"], ffprobe_params.fps),
-                    loglevel="quiet",
-                )
-                .overwrite_output()
-                .run_async(pipe_stdin=True)
+            .output(
+                video_file,
+                pix_fmt="yuv420p",
+                vcodec="libx264",
+                r=min(general_cfg["framerate"], ffprobe_params.fps),
+                loglevel="quiet",
             )
+            .overwrite_output()
+            .run_async(pipe_stdin=True)
+        )
 
-        return read_process, write_process
+        return write_process
 
     @staticmethod
-    def _get_frame(read_process, ffprobe_params: FFprobeParameters):
+    def _sequential_features(ctx: InferenceCycleContext) -> list[str]:
         """
-        Retrieves a video frame from the FFmpeg read process.
+        Finds the features of a task that pass the objects tracked in a frame
+        to an earlier stage of the next frames. The stages of the pipeline
+        overlap, so with them the results would depend on the timing
+        of its threads, and the task runs its stages one after another.
 
         Parameters
         ----------
-        read_process : Popen
-            The FFmpeg read process from which to retrieve the frame.
-        ffprobe_params : FFprobeParameters
-            The video parameters extracted from FFmpeg probe.
+        ctx : InferenceCycleContext
+            The resources of the running inference cycle.
 
         Returns
         -------
-        np.ndarray | None
-            A NumPy array representing the video frame, or None if no frame is available.
+        list[str]
+            The config keys of these features, empty if the task
+            may run in the pipeline.
         """
-        # Get frame from stdout
-        in_bytes = read_process.stdout.read(
-            ffprobe_params.width * ffprobe_params.height * 3
+        features = []
+        if ctx.tiles is not None and ctx.tiles.adaptive:
+            # The tracked objects choose the tiles of the next frame
+            features.append("tile_adaptive")
+        if ctx.cascade is not None:
+            # The tracked objects decide whether the heavy model runs
+            features.append("cascade")
+        if ctx.frame_rate is not None:
+            # The tracked objects choose the next frame to decode
+            features.append("adaptive_framerate")
+        return features
+
+    def _decode_stage(self, ctx: InferenceCycleContext) -> FramePacket | None:
+        """
+        Takes frames from the frame source until one of them
+        falls on the analysis frame rate.
+
+        Parameters
+        ----------
+        ctx : InferenceCycleContext
+            The resources of the running inference cycle.
+
+        Returns
+        -------
+        FramePacket | None
+            The next frame to process, or None if the stream has ended.
+        """
+        task_id = ctx.task_id
+        params = ctx.params
+        while self.task_params[task_id].inference_status == StatusTask.RUNNING:
+            packet = ctx.source.read()
+            if packet is None:
+                self.logger.warning("End of frames or broken frame!")
+                self.task_params[task_id].inference_status = StatusTask.ERROR
+                return None
+            metrics = self.task_params[task_id].metrics
+            if "time_to_first_frame" not in metrics:
+                metrics["time_to_first_frame"] = round(time.time() - ctx.start_time, 3)
+            source_stats = ctx.source.stats()
+            if source_stats:
+                metrics["source"] = source_stats
+            # The frames that a shared live stream dropped still pass by
+            self.task_params[task_id].frame_processed += packet.skipped
+            # Setting the frame rate.
+            if self.task_params[task_id].frame_processed < params.current_frame:
+                self.task_params[task_id].frame_processed += 1
+                packet.release_frame()
+                packet.release_model_frame()
+                continue
+            self.task_params[task_id].frame_processed += 1
+            if ctx.frame_rate is not None:
+                params.current_frame += ctx.frame_rate.interval()
+            else:
+                params.current_frame += params.ffprobe_params.frame_interval
+
+            return packet
+        return None
+
+    def _inference_stage(self, ctx: InferenceCycleContext, packet: FramePacket) -> FramePacket:
+        """
+        Runs the detector on the frame of the packet. With the motion gate
+        a frame without changes gets the detections of the last processed one.
+        """
+        # The model is looked up for every frame to use its latest version
+        self.select_model(ctx.properties.get("model"))
+        if ctx.motion is not None:
+            image = packet.frame if packet.frame is not None else packet.model_frame
+            process = ctx.motion.check(image)
+            self.task_params[ctx.task_id].metrics["motion"] = ctx.motion.stats()
+            if not process:
+                packet.boxes, packet.classes, packet.scores = ctx.motion.detections
+                packet.release_model_frame()
+                return packet
+
+        if ctx.cascade is not None:
+            if packet.model_frame is not None:
+                image, geometry = packet.model_frame, ctx.geometry
+            else:
+                image, geometry = packet.frame, None
+            packet.boxes, packet.classes, packet.scores = self._detect_cascade(
+                ctx, image, geometry=geometry
+            )
+            packet.release_model_frame()
+        elif packet.model_frame is not None:
+            packet.boxes, packet.classes, packet.scores = self.detect(
+                packet.model_frame, geometry=ctx.geometry
+            )
+            packet.release_model_frame()
+        elif ctx.regions:
+            packet.boxes, packet.classes, packet.scores = self.detect_regions(
+                packet.frame, ctx.regions
+            )
+        elif ctx.tiles is not None:
+            tiles = ctx.tiles.select()
+            self.task_params[ctx.task_id].metrics["tiles"] = len(tiles)
+            packet.boxes, packet.classes, packet.scores = self.detect_tiles(
+                packet.frame, tiles
+            )
+        else:
+            packet.boxes, packet.classes, packet.scores = self.detect(packet.frame)
+        if ctx.motion is not None:
+            ctx.motion.detections = packet.boxes, packet.classes, packet.scores
+        return packet
+
+    def _detect_cascade(
+        self,
+        ctx: InferenceCycleContext,
+        image: np.ndarray,
+        geometry: LetterboxGeometry | None = None,
+    ) -> tuple:
+        """
+        Detects objects with the light model of the cascade and, if its
+        detections are not reliable enough, again with the model of the task,
+        whose detections then replace them.
+
+        Parameters
+        ----------
+        ctx : InferenceCycleContext
+            The state of the task.
+        image : np.ndarray
+            The frame, or the frame letterboxed for the model.
+        geometry : LetterboxGeometry | None, optional
+            The letterbox of the frame, if it is already letterboxed.
+
+        Returns
+        -------
+        tuple
+            The boxes, classes and scores as returned by `detect`.
+        """
+        start = time.perf_counter()
+        self.select_model(ctx.cascade.light)
+        detections = self.detect(image, geometry=geometry)
+        light_sec = time.perf_counter() - start
+
+        reason = ctx.cascade.escalate(detections[0], detections[2])
+        heavy_sec = None
+        if reason is not None:
+            start = time.perf_counter()
+            self.select_model(ctx.properties.get("model"))
+            detections = self.detect(image, geometry=geometry)
+            heavy_sec = time.perf_counter() - start
+        ctx.cascade.record(light_sec, heavy_sec)
+        self.task_params[ctx.task_id].metrics["cascade"] = ctx.cascade.stats()
+        return detections
+
+    def _tracking_stage(self, ctx: InferenceCycleContext, packet: FramePacket) -> FramePacket:
+        """
+        Passes the detections of the packet to the tracker of the task.
+        """
+        packet.result = self.track(
+            packet.boxes, packet.classes, packet.scores, ctx.task_id
         )
-        if not in_bytes or sys.getsizeof(in_bytes) < (
-            ffprobe_params.width * ffprobe_params.height * 3
-        ):
-            return None
-        # Convert frame from bytes to numpy array
-        frame = (
-            np.frombuffer(in_bytes, np.uint8)
-            .reshape([ffprobe_params.height, ffprobe_params.width, 3])
-            .copy()
+        if ctx.tiles is not None:
+            ctx.tiles.update(packet.result)
+        if ctx.cascade is not None:
+            ctx.cascade.update(packet.result)
+        if ctx.frame_rate is not None:
+            rate = ctx.frame_rate.update(packet.boxes is not None or bool(packet.result))
+            self.task_params[ctx.task_id].metrics["analysis_rate"] = round(rate, 2)
+        return packet
+
+    def _output_stage(self, ctx: InferenceCycleContext, packet: FramePacket) -> None:
+        """
+        Saves the results of the frame, draws them, records the annotated frame
+        and sends it in realtime mode.
+        """
+        task_id = ctx.task_id
+        params = ctx.params
+        frame = packet.frame
+        result = packet.result
+        current_timestamp = packet.timestamp
+
+        if frame is not None and general_cfg.get("save_snapshots", True):
+            self.save_detected_objects(frame, result)
+        self.data_loggers[task_id].update_json()
+        converted_dets = []
+        for det in result:
+            bbox = det[0:3]
+            track_id = det[4]
+            class_id = det[5]
+            scores = det[6] 
+            duration = det[7]
+            # print(len(det))
+            converted_dets.append({
+                'track': track_id,
+                'score': scores,
+                'class': class_id,
+                'bbox': bbox,
+                'time': duration
+            })
+        #Передаем данные в логгер
+        if task_id in self.data_loggers:
+            self.data_loggers[task_id].process_detections(converted_dets)
+        params.results[f"{current_timestamp}"] = result[:-1]
+        if frame is None:
+            # Nobody needs the annotated frame (see `_needs_full_frame`)
+            self._update_progress(ctx, current_timestamp)
+            return
+
+        inf_img = self.draw_results(frame, result)
+        draw_regions(inf_img, ctx.regions)
+        # The snapshots and the overlay are done with the decoded frame
+        packet.release_frame()
+         # Расчет и отображение FPS
+        ctx.fps_counter += 1
+        fps_end_time = time.time()
+        fps = ctx.fps_counter / (fps_end_time - ctx.fps_start_time)
+        cv2.putText(
+            inf_img,
+            f"FPS: {round(fps)}",
+            (10, 30),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            1,
+            (0, 0, 255),
+            2
         )
 
-        return frame
+        if fps_end_time - ctx.fps_start_time >= 1.0:
+            ctx.fps_counter = 0
+            ctx.fps_start_time = time.time()
+
+        if ctx.write_process is not None:
+            ctx.write_process.stdin.write(
+                np.ascontiguousarray(inf_img, dtype=np.uint8).data
+            )
+
+        # Sending data to the sending queue
+        if params.is_realtime:
+            data_frame = {
+                "fps": params.ffprobe_params.fps,
+                "duration": params.ffprobe_params.duration,
+                "timestamp": current_timestamp,
+                "result": result[:-1],
+            }
+            ctx.session.put(cv2.cvtColor(inf_img, cv2.COLOR_BGR2RGB), data_frame)
+
+        self._update_progress(ctx, current_timestamp)
+
+    def _update_progress(self, ctx: InferenceCycleContext, current_timestamp: int) -> None:
+        """
+        Updates the progress of the task after a frame was output.
+        """
+        task_id = ctx.task_id
+        metrics = self.task_params[task_id].metrics
+        if "time_to_first_result" not in metrics:
+            metrics["time_to_first_result"] = round(time.time() - ctx.start_time, 3)
+        self.task_params[task_id].progress = (
+            self.task_params[task_id].frame_processed
+        ) / (ctx.params.total_frame)
+        self.logger.debug(
+            "%s\t\t%s\t%s",
+            self.task_params[task_id].frame_processed,
+            current_timestamp,
+            self.task_params[task_id].progress,
+        )
+        self.task_params[task_id].ts_last_processed = current_timestamp
+
+    @staticmethod
+    def _needs_full_frame(params: InferenceCycleParameters) -> bool:
+        """
+        Checks whether any consumer of the task needs full resolution frames:
+        video recording, saving snapshots of objects or realtime preview.
+        """
+        return (
+            general_cfg.get("record_video", True)
+            or general_cfg.get("save_snapshots", True)
+            or params.is_realtime
+        )
 
     def _inference_cycle(self, video_url: str, task_id: int, properties: dict) -> dict:
         """
         The main processing cycle of the video stream. It takes frames
-        using the ffmpeg reading process, runs them through
+        from the frame source selected by `frame_source` in the general
+        config (see `utils.frame_source`), runs them through
         preprocess-inference-postprocess and saves the results,
         as well as records video with annotated frames
         using the ffmpeg recording process.
 
+        If `pipeline_mode` is enabled in the general config, the decode,
+        inference, tracking and output stages run in separate threads
+        connected by bounded queues (see `FramePipeline`), otherwise
+        they run one after another for each frame. The tasks with features
+        that need the previous frame to be tracked before the next one is
+        detected always run sequentially (see `_sequential_features`).
+
         Parameters
         ----------
         video_url : str
@@ -702,158 +1183,300 @@ class Base(ABC):
             An excerpt with all the saved results
             of an excerpt from an RTSP video stream.
         """
-        params = InferenceCycleParameters(
-            is_realtime=properties.get("isRealtime", False),
-            ffprobe_params=self._ffprobe_read(video_url),
+        start_time = time.time()
+        # An unknown model fails the task before the stream is opened
+        self.select_model(properties.get("model"))
+        frame_source = get_frame_source(
+            general_cfg.get("frame_source", "ffmpeg"), video_url
         )
-
-        self._update_tracker(
-            tracker=self.trackers[task_id], ffprobe_params=params.ffprobe_params
+        # Uploaded files may be sampled sparsely by seeking to the analyzed frames
+        sparse_sampling = (
+            properties.get("sparseSampling", general_cfg.get("sparse_sampling", False))
+            and os.path.isfile(video_url)
+            and not properties.get("isRealtime", False)
         )
-
-        read_process, write_process = self._create_ffmpeg_processes(
-            video_url=video_url,
-            ffprobe_params=params.ffprobe_params,
-            create_write_process=True,
-            task_id=task_id,
+        if sparse_sampling:
+            frame_source = SeekSource
+
+        # Every stage may hold a frame while its queue is full, so the pools
+        # must outlast the whole pipeline to never block decoding for good.
+        pool_size = 2
+        if general_cfg.get("pipeline_mode", False):
+            pool_size += 3 * (general_cfg.get("pipeline_queue_size", 2) + 1)
+
+        # Tasks on the same stream may share its decoding (see `StreamMultiplexer`)
+        shared_decode = (
+            not os.path.exists(video_url) and general_cfg.get("shared_decode", False)
         )
+        source = None
+        write_process = None
+        session = None
+        # The stream, the recording and the sending are released however
+        # the cycle ends, a shared stream must not outlive its tasks
+        try:
+            ffprobe_params = None
+            if shared_decode:
+                # Another task that decodes the stream already knows its parameters
+                ffprobe_params = self.multiplexer.params(video_url)
+            if ffprobe_params is None:
+                if (
+                    frame_source is FFmpegPipeSource
+                    and general_cfg.get("stream_header_probe", True)
+                    and not os.path.exists(video_url)
+                ):
+                    # A shared stream is decoded without a time limit until
+                    # its last task stops, the frame pools grow for every task
+                    source = self._open_stream(
+                        video_url,
+                        1 if shared_decode else pool_size,
+                        0 if shared_decode else general_cfg["working_time_sec"],
+                        task_id,
+                    )
+                    ffprobe_params = source.params
+                else:
+                    ffprobe_params = self._probe_source(frame_source, video_url)
+            if not ffprobe_params.duration:
+                ffprobe_params = ffprobe_params.model_copy(
+                    update={"duration": general_cfg["working_time_sec"]}
+                )
+            params = InferenceCycleParameters(
+                is_realtime=properties.get("isRealtime", False),
+                ffprobe_params=ffprobe_params,
+            )
 
-        session = RequestPostData(
-            url_frame=f"http://{self.task_params[task_id].host_ip}:{general_cfg['manager_port']}/task/stream/{task_id}",
-            url_data=f"http://{self.task_params[task_id].host_ip}:{general_cfg['manager_port']}/task/data/{task_id}",
-            logger=self.logger,
-        )
-        
-        # Start session
-        if params.is_realtime:
-            session.start()
+            self._update_tracker(task_id, params.ffprobe_params)
+
+            # Let the source drop the frames that are not analyzed instead of
+            # reading and skipping them, the cycle then sees the reduced stream.
+            source_params = params.ffprobe_params
+            output_fps = None
+            if (
+                (general_cfg.get("decode_subsample", False) or sparse_sampling)
+                and frame_source.supports_subsample
+                and params.ffprobe_params.fps > general_cfg["framerate"]
+            ):
+                output_fps = general_cfg["framerate"]
+                params = InferenceCycleParameters(
+                    is_realtime=params.is_realtime,
+                    ffprobe_params=source_params.model_copy(
+                        update={"fps": output_fps, "frame_interval": 1.0}
+                    ),
+                )
 
-        timestamp_thread = Thread(
-            target=self._get_timestamp, args=(read_process, task_id)
-        )
-        timestamp_thread.start()
+            # Only the crops of the regions of interest are passed to the model
+            regions = parse_regions(properties, source_params.width, source_params.height)
+            if covers_frame(regions, source_params.width, source_params.height):
+                regions = []
+            # Small objects are also searched for in the tiles of the whole frame
+            tiles = None
+            if general_cfg.get("tiling", False) and not regions:
+                framerate = general_cfg["framerate"]
+                tiles = TileSelector(
+                    make_tiles(
+                        source_params.width,
+                        source_params.height,
+                        general_cfg.get("tile_grid", [2, 2]),
+                        general_cfg.get("tile_overlap", 0.2),
+                    ),
+                    adaptive=general_cfg.get("tile_adaptive", False),
+                    track_frames=round(general_cfg.get("tile_track_sec", 1) * framerate),
+                    scan_frames=round(general_cfg.get("tile_scan_sec", 2) * framerate),
+                )
 
-        fps_start_time = time.time()
-        fps_counter = 0
+            # The analysis rate rises while there are objects and falls on empty scenes
+            frame_rate = None
+            if properties.get("adaptiveFramerate", general_cfg.get("adaptive_framerate", False)):
+                frame_rate = AdaptiveFrameRate(
+                    params.ffprobe_params.fps,
+                    min_rate=general_cfg.get("min_framerate", 1),
+                    max_rate=general_cfg.get("max_framerate") or general_cfg["framerate"],
+                    hold_sec=general_cfg.get("framerate_hold_sec", 5),
+                    decay_sec=general_cfg.get("framerate_decay_sec", 2),
+                )
 
-        self.logger.debug("frame_id\tframe_timestamp\tprogress")
-        while self.task_params[task_id].inference_status == StatusTask.RUNNING:
-            frame = self._get_frame(read_process, params.ffprobe_params)
-            if frame is None:
-                self.logger.warning("End of frames or broken frame!")
-                self.task_params[task_id].inference_status = StatusTask.ERROR
-                break
-            if "corners" in properties and len(properties["corners"]):
-                frame = self.draw_ROI(img=frame, corners=properties["corners"])
-            # Get frame's timestamp
-            current_timestamp = self.timestamps[task_id].get()
+            # Static frames skip the neural network, the tracks coast on
+            # the last detections
+            motion = None
+            if general_cfg.get("motion_gate", False):
+                motion = MotionGate(
+                    threshold=general_cfg.get("motion_threshold", 25),
+                    min_area=general_cfg.get("motion_min_area", 0.002),
+                    width=general_cfg.get("motion_width", 160),
+                    force_frames=round(
+                        general_cfg.get("motion_force_sec", 2) * general_cfg["framerate"]
+                    ),
+                )
 
-            # Setting the frame rate.
-            if self.task_params[task_id].frame_processed < params.current_frame:
-                self.task_params[task_id].frame_processed += 1
-                continue
-            self.task_params[task_id].frame_processed += 1
-            params.current_frame += params.ffprobe_params.frame_interval
+            # A light model detects on every frame, the model of the task
+            # only on the frames where the light one is not reliable enough
+            cascade = None
+            if (
+                properties.get("cascade", general_cfg.get("cascade", False))
+                and not regions
+                and tiles is None
+            ):
+                light = general_cfg.get("cascade_light_model", "light")
+                # An unknown light model fails the task like an unknown model
+                self.select_model(light)
+                cascade = DetectorCascade(
+                    light,
+                    accept_th=general_cfg.get("cascade_accept_th", 0.6),
+                    refresh_frames=round(
+                        general_cfg.get("cascade_refresh_sec", 2) * general_cfg["framerate"]
+                    ),
+                )
 
-            # Get results
-            result = self.run(frame, task_id)
-            self.save_detected_objects(frame, result)
-            self.data_loggers[task_id].update_json()
-            converted_dets = []
-            for det in result:
-                bbox = det[0:3]
-                track_id = det[4]
-                class_id = det[5]
-                scores = det[6] 
-                duration = det[7]
-                # print(len(det))
-                converted_dets.append({
-                    'track': track_id,
-                    'score': scores,
-                    'class': class_id,
-                    'bbox': bbox,
-                    'time': duration
-                })
-            #Передаем данные в логгер
-            if task_id in self.data_loggers:
-                self.data_loggers[task_id].process_detections(converted_dets)
-            inf_img = self.draw_results(frame, result)
-             # Расчет и отображение FPS
-            fps_counter += 1
-            fps_end_time = time.time()
-            fps = fps_counter / (fps_end_time - fps_start_time)
-            cv2.putText(
-                inf_img,
-                f"FPS: {round(fps)}",
-                (10, 30),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                1,
-                (0, 0, 255),
-                2
+            # Let ffmpeg letterbox the frames for the model, preprocessing
+            # then only has to normalize them.
+            geometry = None
+            if (
+                general_cfg.get("decode_model_branch", False)
+                and frame_source.supports_model_branch
+                and not regions
+                and tiles is None
+            ):
+                geometry = self.model_input_geometry(
+                    source_params.width, source_params.height
+                )
+            # Camera timestamps are parsed from the SEI of the H.264 stream itself
+            sei_timestamps = (
+                general_cfg.get("sei_timestamps", True)
+                and frame_source.supports_sei
+                and source_params.codec == "h264"
             )
 
-            if fps_end_time - fps_start_time >= 1.0:
-                fps_counter = 0
-                fps_start_time = time.time()
-
-            if write_process is not None:
-                write_process.stdin.write(inf_img.astype(np.uint8).tobytes())
-            params.results[f"{current_timestamp}"] = result[:-1]
+            source_options = {
+                "output_fps": output_fps,
+                "geometry": geometry,
+                "full_frame": geometry is None or self._needs_full_frame(params),
+                "sei_timestamps": sei_timestamps,
+            }
+            if source is not None and not source.has_options(**source_options):
+                # The stream needs another read process after all
+                source.close()
+                source = None
+            if shared_decode:
+                # Only the tasks that decode the stream with the same options share it
+                opened = source
+                stream_params = source_params
+                if is_live(video_url):
+                    stream_params = source_params.model_copy(update={"duration": 0})
+                source = self.multiplexer.subscribe(
+                    video_url,
+                    source_options,
+                    (lambda: opened)
+                    if opened is not None
+                    else partial(
+                        frame_source, video_url, stream_params, 1, task_id=task_id, **source_options
+                    ),
+                    params.ffprobe_params,
+                    pool_size,
+                    general_cfg.get("shared_decode_queue_size", 4),
+                    task_id=task_id,
+                )
+                if opened is not None and opened is not source.stream.source:
+                    # Another task has opened the same stream meanwhile
+                    opened.close()
+            elif source is None:
+                source = frame_source(
+                    video_url, source_params, pool_size, task_id=task_id, **source_options
+                )
+            if general_cfg.get("record_video", True):
+                write_process = self._create_write_process(source_params, task_id)
 
-            # Sending data to the sending queue
-            if params.is_realtime:
-                data_frame = {
-                    "fps": params.ffprobe_params.fps,
-                    "duration": params.ffprobe_params.duration,
-                    "timestamp": current_timestamp,
-                    "result": result[:-1],
-                }
-                session.put(cv2.cvtColor(inf_img, cv2.COLOR_BGR2RGB), data_frame)
-
-            self.task_params[task_id].progress = (
-                self.task_params[task_id].frame_processed
-            ) / (params.total_frame)
-            self.logger.debug(
-                "%s\t\t%s\t%s",
-                self.task_params[task_id].frame_processed,
-                current_timestamp,
-                self.task_params[task_id].progress,
+            session = RequestPostData(
+                url_frame=f"http://{self.task_params[task_id].host_ip}:{general_cfg['manager_port']}/task/stream/{task_id}",
+                url_data=f"http://{self.task_params[task_id].host_ip}:{general_cfg['manager_port']}/task/data/{task_id}",
+                logger=self.logger,
             )
-            self.task_params[task_id].ts_last_processed = current_timestamp
-
-        self.task_params[task_id].progress = max(self.task_params[task_id].progress, 1)
-
-        try:
-            read_process.stdout.close()
-            read_process.stderr.close()
-            read_process.wait(timeout=5)
-        except TimeoutExpired:
-            read_process.kill()
-
         
-        if write_process is not None:
-            try:
-                write_process.stdin.close()
-                write_process.wait(timeout=5)
-            except TimeoutExpired:
-                write_process.kill()
+            # Start session
+            if params.is_realtime:
+                session.start()
+
+            ctx = InferenceCycleContext(
+                task_id=task_id,
+                properties=properties,
+                params=params,
+                source=source,
+                write_process=write_process,
+                session=session,
+                fps_start_time=time.time(),
+                geometry=geometry,
+                start_time=start_time,
+                regions=regions,
+                tiles=tiles,
+                frame_rate=frame_rate,
+                motion=motion,
+                cascade=cascade,
+            )
 
-        timestamp_thread.join()
+            self.logger.debug("frame_id\tframe_timestamp\tprogress")
+            pipeline_mode = general_cfg.get("pipeline_mode", False)
+            sequential_features = self._sequential_features(ctx)
+            if pipeline_mode and sequential_features:
+                self.logger.warning(
+                    "Task %s runs sequentially, the pipeline mode does not support %s",
+                    task_id,
+                    ", ".join(sequential_features),
+                )
+                pipeline_mode = False
+            if pipeline_mode:
+                pipeline = FramePipeline(
+                    source=partial(self._decode_stage, ctx),
+                    stages=[
+                        ("inference", partial(self._inference_stage, ctx)),
+                        ("tracking", partial(self._tracking_stage, ctx)),
+                        ("output", partial(self._output_stage, ctx)),
+                    ],
+                    queue_size=general_cfg.get("pipeline_queue_size", 2),
+                    is_running=lambda: (
+                        self.task_params[task_id].inference_status == StatusTask.RUNNING
+                    ),
+                    on_item=lambda depth: self.task_params[task_id].metrics.update(
+                        queue_depth=depth
+                    ),
+                    on_drop=FramePacket.release,
+                )
+                pipeline.run()
+            else:
+                while True:
+                    packet = self._decode_stage(ctx)
+                    if packet is None:
+                        break
+                    packet = self._inference_stage(ctx, packet)
+                    packet = self._tracking_stage(ctx, packet)
+                    self._output_stage(ctx, packet)
+            self.task_params[task_id].progress = max(self.task_params[task_id].progress, 1)
+        finally:
+            if source is not None:
+                source.close()
 
-        session.stop()
-        if session.is_alive():
-            session.join()
+            if write_process is not None:
+                try:
+                    write_process.stdin.close()
+                    write_process.wait(timeout=5)
+                except TimeoutExpired:
+                    write_process.kill()
+
+            if session is not None:
+                session.stop()
+                if session.is_alive():
+                    session.join()
         results = {"results": params.results}
         return results
 
     def _perform_inference_async(
         self, video_url: str, task_id: int, properties: dict = {}
-    ) -> None:
+    ) -> dict:
         """
         Starts the main processing cycle, receives the results from it,
         sends them to the video analytics manager and cleans up the data
         about the completed task.
 
+        With worker processes enabled the task runs in one of them,
+        and only its status is kept in this process.
+
         Parameters
         ----------
         video_url : str
@@ -862,13 +1485,27 @@ class Base(ABC):
             The ID of the video processing task.
         properties: dict
             Additional parameters for processing
+
+        Returns
+        -------
+        dict
+            The final status of the task with the results as sent to the manager.
         """
-        match general_cfg["tracker"]:
-            case "sfsort":
-                self.trackers[task_id] = SFSORT.SFSORT(general_cfg["tracker_args_sfsort"])
-        
-        self.timestamps[task_id] = queue.Queue()
+        if self.workers is not None:
+            self.task_params[task_id] = TaskParameters(host_ip=general_cfg['manager_host'])
+            self.task_params[task_id].inference_status = StatusTask.RUNNING
+            try:
+                response_content = self.workers.run(video_url, task_id, properties)
+            except Exception as e:
+                self.logger.error("%s:\n%s", e, traceback.format_exc())
+                response_content = {"state": StatusTask.ERROR, "success": False}
+            self.task_params[task_id].inference_status = response_content.get(
+                "state", StatusTask.ERROR
+            )
+            self.task_params.pop(task_id)
+            return response_content
 
+        # The tracker is created when the video parameters are known (see `_update_tracker`)
         self.data_loggers[task_id] = self.YOLODataLogger(task_id)
         
         self.task_params[task_id] = TaskParameters(host_ip=general_cfg['manager_host'])
@@ -896,8 +1533,7 @@ class Base(ABC):
             "tsLastFrame": self.task_params[task_id].ts_last_processed,
             "results": results,
         }
-        # print(results)
-        print(response_content["success"])
+        self.logger.debug("Task %s succeeded: %s", task_id, success)
 
         try:
             response = requests.post(
@@ -915,7 +1551,5 @@ class Base(ABC):
                 self.logger.error("Error while logging response: %s", str(e))
 
         self.task_params.pop(task_id)
-        self.trackers.pop(task_id)
-        while not self.timestamps[task_id].empty():
-            self.timestamps[task_id].get()
-        del self.timestamps[task_id]
\ No newline at end of file
+        self.trackers.pop(task_id, None)
+        return response_content
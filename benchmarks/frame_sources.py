@@ -0,0 +1,129 @@
+"""
+Benchmark of the frame source backends (see `utils.frame_source`).
+
+Every backend decodes the same videos into its frame pool, and the script
+reports the decode rate and the CPU time spent per frame, including the CPU
+time of the decoder subprocesses. The image directory backend reads frames
+extracted from the videos beforehand.
+
+Run from the root of the repository:
+
+    python -m benchmarks.frame_sources examples/sample*.mp4
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import tempfile
+import time
+
+from utils.frame_source import FRAME_SOURCES, ImageDirectorySource, OpenCVSource
+
+
+def cpu_time() -> float:
+    """
+    Returns the CPU time of the process and its finished subprocesses in seconds.
+    """
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def extract_images(video: str, directory: str) -> None:
+    """
+    Extracts all frames of a video into a directory of JPEG images.
+    """
+    subprocess.run(
+        [
+            "ffmpeg", "-v", "error", "-i", video, "-q:v", "2",
+            os.path.join(directory, "%06d.jpg"),
+        ],
+        check=True,
+    )
+
+
+def benchmark(name: str, url: str, params, max_frames: int, output_fps: float | None) -> dict:
+    """
+    Reads frames from a video with one backend.
+
+    Returns
+    -------
+    dict
+        The number of frames, the decode rate and the CPU time per frame.
+    """
+    source_class = FRAME_SOURCES[name]
+    if output_fps is not None and not source_class.supports_subsample:
+        output_fps = None
+
+    cpu_start = cpu_time()
+    start = time.perf_counter()
+    source = source_class(url, params, pool_size=2, output_fps=output_fps)
+    frames = 0
+    while frames < max_frames:
+        packet = source.read()
+        if packet is None:
+            break
+        packet.release_frame()
+        packet.release_model_frame()
+        frames += 1
+    source.close()
+    elapsed = time.perf_counter() - start
+    cpu = cpu_time() - cpu_start
+
+    return {
+        "source": name,
+        "video": url,
+        "frames": frames,
+        "fps": frames / elapsed if elapsed else 0.0,
+        "cpu_ms_per_frame": 1000 * cpu / frames if frames else 0.0,
+        "subsampled": output_fps is not None,
+    }
+
+
+parser = argparse.ArgumentParser(description="Benchmark the frame source backends")
+parser.add_argument(
+    "videos", nargs="*", default=sorted(glob.glob("examples/sample*.mp4")),
+    help="Paths to the videos (default is examples/sample*.mp4)",
+)
+parser.add_argument(
+    "--sources", nargs="+", default=list(FRAME_SOURCES), choices=list(FRAME_SOURCES),
+    help="The backends to measure (default is all of them)",
+)
+parser.add_argument(
+    "--frames", type=int, default=1000,
+    help="The maximum number of frames read from each video (default is 1000)",
+)
+parser.add_argument(
+    "--subsample", type=float, default=None,
+    help="Output frame rate for the backends that subsample frames themselves",
+)
+parser.add_argument("--json", type=str, default=None, help="Path to save the results")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    results = []
+    for video in args.videos:
+        # The same parameters for every backend, so that only decoding is compared
+        params = OpenCVSource.probe(video, framerate=10, default_duration=0)
+        with tempfile.TemporaryDirectory() as images:
+            if ImageDirectorySource.name in args.sources:
+                extract_images(video, images)
+            for name in args.sources:
+                url = images if name == ImageDirectorySource.name else video
+                result = benchmark(name, url, params, args.frames, args.subsample)
+                result["video"] = video
+                results.append(result)
+                print(
+                    f"{os.path.basename(video):<20} {name:<8} "
+                    f"{result['frames']:>6} frames  {result['fps']:>8.1f} fps  "
+                    f"{result['cpu_ms_per_frame']:>7.2f} ms CPU/frame"
+                )
+
+    if args.json is not None:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
@@ -0,0 +1,167 @@
+"""
+Benchmark of the non-maximum suppression of `Detector` (see `utils.nms`).
+
+The vectorized NMS is compared with the loop it replaces and with
+`cv2.dnn.NMSBoxes` on crowded frames with 10 to 5000 candidate boxes,
+gathered in groups like a herd (many candidates per object, most of them
+suppressed) or a flock (small objects, most candidates kept). The script
+also checks that the vectorized NMS keeps exactly the same boxes as the
+loop, and how many of the boxes kept by OpenCV it keeps too (OpenCV does
+not add the pixel to the sizes of the boxes). The class-aware mode and Soft-NMS are measured
+as well.
+
+Run from the root of the repository:
+
+    python -m benchmarks.nms
+"""
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from detector import Detector
+from utils.nms import non_maximum_suppression, soft_nms
+
+COUNTS = [10, 50, 100, 500, 1000, 2000, 5000]
+CLASSES = 8
+SCENES = {
+    # A herd: about 10 candidates around each large object
+    "herd": {"per_object": 10, "size": (15, 80), "jitter": 4},
+    # A flock: about 2 candidates around each small object, most are kept
+    "flock": {"per_object": 2, "size": (6, 20), "jitter": 2},
+}
+
+
+def reference(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """
+    The non-maximum suppression as a loop over the remaining boxes.
+    """
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        xx1 = np.maximum(x1[i], x1[order[1:]])
+        yy1 = np.maximum(y1[i], y1[order[1:]])
+        xx2 = np.minimum(x2[i], x2[order[1:]])
+        yy2 = np.minimum(y2[i], y2[order[1:]])
+        intersection = np.maximum(0, xx2 - xx1 + 1) * np.maximum(0, yy2 - yy1 + 1)
+        iou = intersection / (areas[i] + areas[order[1:]] - intersection)
+        order = order[np.where(iou <= iou_threshold)[0] + 1]
+    return np.array(keep, dtype=int)
+
+
+def opencv(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """
+    The non-maximum suppression of OpenCV, it takes the boxes as [x, y, w, h].
+    """
+    xywh = boxes.copy()
+    xywh[:, 2:] -= xywh[:, :2]
+    return np.array(cv2.dnn.NMSBoxes(xywh.tolist(), scores.tolist(), 0.0, iou_threshold)).flatten()
+
+
+def crowded_frame(count: int, scene: str, rng: np.random.Generator) -> tuple:
+    """
+    Generates candidate boxes gathered in groups around objects,
+    as the detector outputs them before NMS.
+    """
+    height, width = Detector.INPUT_SHAPE
+    params = SCENES[scene]
+    objects = max(1, count // params["per_object"])
+    centers = rng.uniform([0, 0], [width, height], (objects, 2))
+    sizes = rng.uniform(*params["size"], (objects, 2))
+    owner = rng.integers(0, objects, count)
+    center = centers[owner] + rng.normal(0, params["jitter"], (count, 2))
+    size = sizes[owner] * rng.uniform(0.8, 1.2, (count, 2))
+    boxes = np.concatenate([center - size / 2, center + size / 2], axis=1)
+    scores = rng.uniform(0.25, 1.0, count).astype(np.float32)
+    classes = rng.integers(0, CLASSES, objects)[owner]
+    return boxes.round().astype(np.int32), scores, classes
+
+
+def measure(function, repeat: int) -> float:
+    """
+    Returns the median time of a call in milliseconds.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return 1000 * float(np.median(times))
+
+
+parser = argparse.ArgumentParser(description="Benchmark the non-maximum suppression")
+parser.add_argument(
+    "--counts", nargs="+", type=int, default=COUNTS,
+    help="The numbers of candidate boxes to measure (default is 10 to 5000)",
+)
+parser.add_argument(
+    "--scenes", nargs="+", default=list(SCENES), choices=list(SCENES),
+    help="The kinds of crowded frames to measure (default is all of them)",
+)
+parser.add_argument(
+    "--iou", type=float, default=Detector.IOU_TH,
+    help="The IoU threshold (default is the one of Detector)",
+)
+parser.add_argument(
+    "--sigma", type=float, default=0.5,
+    help="The width of the Gaussian decay of Soft-NMS (default is 0.5)",
+)
+parser.add_argument(
+    "--repeat", type=int, default=20,
+    help="The number of calls measured for each count (default is 20)",
+)
+parser.add_argument("--json", type=str, default=None, help="Path to save the results")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    results = []
+    for scene in args.scenes:
+        for count in args.counts:
+            boxes, scores, classes = crowded_frame(count, scene, rng)
+            expected = reference(boxes, scores, args.iou)
+            kept = non_maximum_suppression(boxes, scores, args.iou)
+            kept_opencv = opencv(boxes, scores, args.iou)
+
+            result = {
+                "scene": scene,
+                "boxes": count,
+                "kept": len(kept),
+                "reference_ms": measure(lambda: reference(boxes, scores, args.iou), args.repeat),
+                "vectorized_ms": measure(
+                    lambda: non_maximum_suppression(boxes, scores, args.iou), args.repeat
+                ),
+                "opencv_ms": measure(lambda: opencv(boxes, scores, args.iou), args.repeat),
+                "class_aware_ms": measure(
+                    lambda: non_maximum_suppression(boxes, scores, args.iou, classes=classes),
+                    args.repeat,
+                ),
+                "soft_ms": measure(
+                    lambda: soft_nms(boxes, scores, args.sigma, 0.25), args.repeat
+                ),
+                "identical": bool(np.array_equal(kept, expected)),
+                "opencv_agreement": len(np.intersect1d(kept, kept_opencv))
+                / max(1, len(np.union1d(kept, kept_opencv))),
+            }
+            result["speedup"] = result["reference_ms"] / result["vectorized_ms"]
+            results.append(result)
+            print(
+                f"{scene:<5} {count:>5} boxes  reference {result['reference_ms']:>8.2f} ms  "
+                f"vectorized {result['vectorized_ms']:>7.2f} ms  "
+                f"opencv {result['opencv_ms']:>7.2f} ms  "
+                f"class-aware {result['class_aware_ms']:>7.2f} ms  "
+                f"soft {result['soft_ms']:>8.2f} ms  "
+                f"x{result['speedup']:.2f}  identical: {result['identical']}  "
+                f"opencv agreement: {result['opencv_agreement']:.2f}"
+            )
+
+    if args.json is not None:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
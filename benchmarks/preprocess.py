@@ -0,0 +1,99 @@
+"""
+Benchmark of the frame preprocessing of `Detector` (see `utils.preprocess`).
+
+The fused preprocessor is compared with the sequence of operations it
+replaces on random frames of common resolutions. The script also checks
+that both produce exactly the same tensor. The uint8 preprocessor for
+models with the preprocessing in their graph is measured as well.
+
+Run from the root of the repository:
+
+    python -m benchmarks.preprocess
+"""
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from detector import Detector
+from utils.preprocess import LetterboxPreprocessor
+
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080), "4K": (3840, 2160)}
+
+
+def reference(img: np.ndarray, input_shape: tuple[int, int]) -> np.ndarray:
+    """
+    The preprocessing as a sequence of separate operations.
+    """
+    img = img.copy()
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    img, _, _ = Detector.letterbox(img, new_shape=input_shape, auto=False)
+    img = np.expand_dims(img, axis=0).astype("float32") / 255.0
+    return np.transpose(img, [0, 3, 1, 2])
+
+
+def measure(function, img: np.ndarray, repeat: int) -> float:
+    """
+    Returns the median time of a call in milliseconds.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(img)
+        times.append(time.perf_counter() - start)
+    return 1000 * float(np.median(times))
+
+
+parser = argparse.ArgumentParser(description="Benchmark the frame preprocessing")
+parser.add_argument(
+    "--resolutions", nargs="+", default=list(RESOLUTIONS), choices=list(RESOLUTIONS),
+    help="The frame resolutions to measure (default is all of them)",
+)
+parser.add_argument(
+    "--repeat", type=int, default=100,
+    help="The number of calls measured for each resolution (default is 100)",
+)
+parser.add_argument("--json", type=str, default=None, help="Path to save the results")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    input_shape = Detector.INPUT_SHAPE
+    rng = np.random.default_rng(0)
+
+    results = []
+    for name in args.resolutions:
+        width, height = RESOLUTIONS[name]
+        img = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        geometry = Detector.letterbox_geometry((height, width), input_shape, auto=False)
+        preprocessor = LetterboxPreprocessor(geometry)
+        raw_preprocessor = LetterboxPreprocessor(geometry, raw=True)
+
+        expected = reference(img, input_shape)
+        fused = preprocessor(img)
+        identical = (
+            fused.shape == expected.shape
+            and fused.dtype == expected.dtype
+            and fused.tobytes() == np.ascontiguousarray(expected).tobytes()
+        )
+
+        result = {
+            "resolution": name,
+            "reference_ms": measure(lambda x: reference(x, input_shape), img, args.repeat),
+            "fused_ms": measure(preprocessor, img, args.repeat),
+            "uint8_ms": measure(raw_preprocessor, img, args.repeat),
+            "identical": identical,
+        }
+        result["speedup"] = result["reference_ms"] / result["fused_ms"]
+        results.append(result)
+        print(
+            f"{name:<6} reference {result['reference_ms']:>7.2f} ms  "
+            f"fused {result['fused_ms']:>7.2f} ms  "
+            f"uint8 {result['uint8_ms']:>7.2f} ms  "
+            f"x{result['speedup']:.2f}  identical: {identical}"
+        )
+
+    if args.json is not None:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
@@ -0,0 +1,194 @@
+"""
+Benchmark of the data the worker processes exchange (see `utils.workers`).
+
+A worker decodes and analyses the frames of its tasks itself and only
+sends the status of the tasks to the main process. The script compares
+the amount of this data with the frames a shared memory handoff between
+a decoding and an inference process would have to move, and measures
+the cost of moving one frame both ways. It also runs the same GIL bound
+tasks in threads and in processes to show how they scale on this host.
+
+Run from the root of the repository:
+
+    python -m benchmarks.workers --tasks 1 4 16
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from utils.dataclasses import StatusTask, TaskParameters
+from utils.workers import STATUS_INTERVAL
+
+
+def status_event(tasks: int) -> tuple:
+    """
+    Builds a status event of a worker with the given number of running tasks.
+    """
+    params = {}
+    for task_id in range(tasks):
+        task = TaskParameters(
+            host_ip="127.0.0.1",
+            inference_status=StatusTask.RUNNING,
+            frame_processed=123456,
+            progress=42.5,
+            ts_last_processed=1700000000.0,
+            metrics={
+                "time_to_first_frame": 0.071,
+                "time_to_first_result": 0.188,
+                "queues": {"decode": 2, "infer": 1, "track": 0, "write": 0},
+                "dropped": {"decode": 0, "infer": 3},
+                "fps": 9.98,
+            },
+        )
+        params[task_id] = asdict(task)
+    streams = {f"rtsp://camera-{task_id}/stream": 1 for task_id in range(tasks)}
+    return ("status", 0, params, {"sharedStreams": streams})
+
+
+def timed(function, repeat: int) -> float:
+    """
+    Returns the mean duration of a call in milliseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return 1000 * (time.perf_counter() - start) / repeat
+
+
+def frame_cost(width: int, height: int, repeat: int) -> dict:
+    """
+    Measures the time to move one frame through a process queue
+    and to copy it into shared memory.
+
+    Returns
+    -------
+    dict
+        The size of the frame and the milliseconds per frame of each way.
+    """
+    frame = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    queue = mp.get_context("spawn").Queue()
+
+    def through_queue() -> None:
+        queue.put(frame)
+        queue.get()
+
+    memory = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+    try:
+        shared = np.ndarray(frame.shape, dtype=frame.dtype, buffer=memory.buf)
+        # The receiving side copies the frame out, the pool buffer is reused
+        received = np.empty_like(frame)
+
+        def through_memory() -> None:
+            np.copyto(shared, frame)
+            np.copyto(received, shared)
+
+        result = {
+            "frame_bytes": frame.nbytes,
+            "queue_ms_per_frame": timed(through_queue, repeat),
+            "shared_memory_ms_per_frame": timed(through_memory, repeat),
+        }
+        del shared
+    finally:
+        memory.close()
+        memory.unlink()
+        queue.close()
+    return result
+
+
+def busy_task(iterations: int) -> int:
+    """
+    Pure Python work that holds the GIL, like the tracking and the
+    post-processing of the detections.
+    """
+    total = 0
+    for i in range(iterations):
+        total += i * i % 7
+    return total
+
+
+def scaling(tasks: int, iterations: int) -> dict:
+    """
+    Runs the same tasks in threads and in processes.
+
+    Returns
+    -------
+    dict
+        The wall time of both ways in seconds.
+    """
+    result = {"tasks": tasks}
+    for name, executor in (
+        ("threads", ThreadPoolExecutor(tasks)),
+        ("processes", ProcessPoolExecutor(tasks, mp_context=mp.get_context("spawn"))),
+    ):
+        with executor:
+            # Starts the processes before the measurement
+            list(executor.map(busy_task, [1] * tasks))
+            start = time.perf_counter()
+            list(executor.map(busy_task, [iterations] * tasks))
+            result[f"{name}_sec"] = time.perf_counter() - start
+    return result
+
+
+parser = argparse.ArgumentParser(description="Benchmark the data exchanged by the worker processes")
+parser.add_argument(
+    "--tasks", type=int, nargs="+", default=[1, 4, 16],
+    help="The numbers of concurrent tasks (default is 1 4 16)",
+)
+parser.add_argument(
+    "--fps", type=float, default=10,
+    help="The analysed frames per second of each task (default is 10)",
+)
+parser.add_argument(
+    "--size", type=int, nargs=2, default=[1920, 1080], metavar=("WIDTH", "HEIGHT"),
+    help="The frame size (default is 1920 1080)",
+)
+parser.add_argument(
+    "--repeat", type=int, default=50,
+    help="The number of frames moved to measure the cost per frame (default is 50)",
+)
+parser.add_argument(
+    "--iterations", type=int, default=2_000_000,
+    help="The size of a synthetic task for the scaling test (default is 2000000)",
+)
+parser.add_argument("--json", type=str, default=None, help="Path to save the results")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    width, height = args.size
+
+    cost = frame_cost(width, height, args.repeat)
+    print(
+        f"cores: {os.cpu_count()}, {width}x{height} frame of {cost['frame_bytes'] / 1e6:.1f} MB: "
+        f"{cost['queue_ms_per_frame']:.2f} ms through a queue, "
+        f"{cost['shared_memory_ms_per_frame']:.2f} ms through shared memory"
+    )
+
+    results = {"cores": os.cpu_count(), "frame": cost, "tasks": []}
+    for tasks in args.tasks:
+        status_bytes = len(pickle.dumps(status_event(tasks))) / STATUS_INTERVAL
+        frame_bytes = cost["frame_bytes"] * args.fps * tasks
+        handoff_ms = cost["shared_memory_ms_per_frame"] * args.fps * tasks
+        result = {
+            "status_bytes_per_sec": status_bytes,
+            "frame_bytes_per_sec": frame_bytes,
+            "handoff_ms_per_sec": handoff_ms,
+            **scaling(tasks, args.iterations),
+        }
+        results["tasks"].append(result)
+        print(
+            f"{tasks:>3} tasks: status {status_bytes / 1e3:>8.1f} kB/s, "
+            f"frames {frame_bytes / 1e6:>8.1f} MB/s ({handoff_ms:>6.1f} ms of copies per second), "
+            f"threads {result['threads_sec']:>6.2f} s, processes {result['processes_sec']:>6.2f} s"
+        )
+
+    if args.json is not None:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
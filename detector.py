@@ -6,12 +6,19 @@ to the video analytics manager in the form of a json file and an annotated video
 """
 
 import threading
+from functools import partial
+from typing import Callable
+
 import cv2
 import numpy as np
-import onnxruntime as ort
 
+from api.models import create_router as create_models_router
 from base import Base
-from utils.nms import non_maximum_suppression
+from config import general_cfg
+from utils.dataclasses import LetterboxGeometry
+from utils.models import ModelRegistry, OnnxModel
+from utils.nms import non_maximum_suppression, soft_nms
+from utils.preprocess import LetterboxPreprocessor
 
 
 class Detector(Base):
@@ -26,22 +33,195 @@ class Detector(Base):
     """
 
     CONF_TH = 0.6
-    """The confidence threshold for the results of the onnx model."""
+    """The confidence threshold for the results of the onnx models by default."""
     IOU_TH = 0.3
-    """The threshold of intersection over union for the results of the onnx model."""
+    """The threshold of intersection over union for the results of the onnx models by default."""
+    INPUT_SHAPE = (640, 640)
+    """The height and width of the onnx model input."""
+
+    DEFAULT_MODEL = "default"
+    """The name of the model given to the constructor."""
 
     def __init__(self, model_path: str):
         super().__init__()
-        self.session = ort.InferenceSession(
-            model_path, providers=["CUDAExecutionProvider", "CPUExecutionProvider"]
+        self.model_path = model_path
+        """The model given to the constructor, for creating the detector in the workers."""
+        self.models = ModelRegistry(self.DEFAULT_MODEL)
+        """The loaded models, each task chooses one of them by name."""
+        # With worker processes only they run the tasks and load the models
+        if self.workers is None:
+            self.load_model(self.DEFAULT_MODEL, model_path)
+            for name, model_cfg in general_cfg.get("models", {}).items():
+                self.load_model(
+                    name, model_cfg["path"], model_cfg.get("conf_th"), model_cfg.get("iou_th")
+                )
+        self._local = threading.local()
+        """The preprocessors and the model of the thread, each task detects in its own threads."""
+        self.app.include_router(
+            create_models_router(
+                self.DEFAULT_MODEL, self.model_stats, self.load_model, self.logger
+            )
         )
-        """An onnx session to launch the model."""
 
-        self.input_name: str = self.session.get_inputs()[0].name
-        """The name of the input metadata."""
-        self.output_name: list[str] = [self.session.get_outputs()[0].name]
-        """The name of the output metadata."""
-        self.lock = threading.Lock()
+    def load_model(
+        self,
+        name: str,
+        model_path: str,
+        conf_th: float | None = None,
+        iou_th: float | None = None,
+    ) -> dict:
+        """
+        Loads a model and makes it available to the tasks under a name.
+        A model with the same name is replaced without interrupting
+        the tasks, they get the new one for their next frame.
+
+        With worker processes the model is only loaded by each of them.
+
+        Parameters
+        ----------
+        name : str
+            The name of the model.
+        model_path : str
+            Filename or serialized ONNX or ORT format model in a byte string.
+        conf_th : float | None, optional
+            The confidence threshold (default is `CONF_TH`).
+        iou_th : float | None, optional
+            The threshold of intersection over union (default is `IOU_TH`).
+
+        Returns
+        -------
+        dict
+            The description and the metrics of the loaded model
+            (see `OnnxModel.stats`), with worker processes the ones
+            of the first worker.
+
+        Raises
+        ------
+        RuntimeError
+            If any worker process failed to load the model.
+        """
+        if self.workers is not None:
+            # A restarted worker loads the model again
+            return self.workers.call(
+                "load_model", name, model_path, conf_th, iou_th, replay=True
+            )[0]
+
+        model = OnnxModel(
+            name,
+            model_path,
+            self.INPUT_SHAPE,
+            self.CONF_TH if conf_th is None else conf_th,
+            self.IOU_TH if iou_th is None else iou_th,
+            self.logger,
+        )
+        replaced = self.models.add(model)
+        self.logger.info(
+            "Model %s %s from %s: %s",
+            name,
+            "replaced" if replaced is not None else "loaded",
+            model.path,
+            model.startup,
+        )
+        return model.stats()
+
+    def worker_factory(self) -> Callable[[], "Detector"]:
+        return partial(type(self), self.model_path)
+
+    def select_model(self, name: str | None) -> None:
+        self._local.model = self.models.get(name)
+
+    def model(self) -> OnnxModel:
+        """
+        Returns the model chosen in the current thread (see `select_model`),
+        or the default one.
+
+        Returns
+        -------
+        OnnxModel
+            The model.
+        """
+        model = getattr(self._local, "model", None)
+        return model if model is not None else self.models.get()
+
+    def merge_iou_th(self) -> float:
+        return self.model().iou_th
+
+    def model_stats(self) -> dict:
+        """
+        Returns the description and the metrics of every loaded model.
+
+        Returns
+        -------
+        dict
+            The models by name (see `ModelRegistry.stats`). With worker
+            processes, the ones last reported by the first worker
+            that has loaded its models.
+        """
+        if self.workers is None:
+            return self.models.stats()
+        for worker in self.workers.stats():
+            if worker["ready"] and "models" in worker:
+                return worker["models"]
+        return {}
+
+    def service_metrics(self) -> dict:
+        metrics = super().service_metrics()
+        if self.workers is None:
+            # Otherwise every worker reports its own models
+            metrics["models"] = self.models.stats()
+        return metrics
+
+    @staticmethod
+    def letterbox_geometry(
+        shape: tuple[int, int],
+        new_shape=(640, 640),
+        auto=True,
+        scaleup=True,
+        stride=32,
+    ) -> LetterboxGeometry:
+        """
+        Computes how an image of the given shape is resized and padded
+        by `letterbox`.
+
+        Parameters
+        ----------
+        shape : tuple[int, int]
+            The shape (height, width) of the input image.
+        new_shape, auto, scaleup, stride
+            The same as in `letterbox`.
+
+        Returns
+        -------
+        LetterboxGeometry
+            The scaling ratio, the size of the resized image and the padding.
+        """
+        if isinstance(new_shape, int):
+            new_shape = (new_shape, new_shape)
+
+        # Scale ratio (new / old)
+        r = min(new_shape[0] / shape[0], new_shape[1] / shape[1])
+        if not scaleup:  # only scale down, do not scale up (for better val mAP)
+            r = min(r, 1.0)
+
+        # Compute padding
+        new_unpad = int(round(shape[1] * r)), int(round(shape[0] * r))
+        dw, dh = new_shape[1] - new_unpad[0], new_shape[0] - new_unpad[1]  # wh padding
+
+        if auto:  # minimum rectangle
+            dw, dh = np.mod(dw, stride), np.mod(dh, stride)  # wh padding
+
+        dw /= 2  # divide padding into 2 sides
+        dh /= 2
+
+        top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+        left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+        return LetterboxGeometry(
+            ratio=r,
+            new_unpad=new_unpad,
+            dwdh=(dw, dh),
+            border=(top, bottom, left, right),
+            new_shape=tuple(new_shape),
+        )
 
     @staticmethod
     def letterbox(
@@ -78,55 +258,144 @@ class Detector(Base):
         """
 
         shape = im.shape[:2]  # current shape [height, width]
-        if isinstance(new_shape, int):
-            new_shape = (new_shape, new_shape)
+        geometry = Detector.letterbox_geometry(shape, new_shape, auto, scaleup, stride)
 
-        # Scale ratio (new / old)
-        r = min(new_shape[0] / shape[0], new_shape[1] / shape[1])
-        if not scaleup:  # only scale down, do not scale up (for better val mAP)
-            r = min(r, 1.0)
+        if shape[::-1] != geometry.new_unpad:  # resize
+            im = cv2.resize(im, geometry.new_unpad, interpolation=cv2.INTER_LINEAR)
+        top, bottom, left, right = geometry.border
+        im = cv2.copyMakeBorder(
+            im, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color
+        )  # add border
+        return im, geometry.ratio, geometry.dwdh
 
-        # Compute padding
-        new_unpad = int(round(shape[1] * r)), int(round(shape[0] * r))
-        dw, dh = new_shape[1] - new_unpad[0], new_shape[0] - new_unpad[1]  # wh padding
+    def model_input_geometry(self, width: int, height: int) -> LetterboxGeometry:
+        return self.letterbox_geometry(
+            (height, width), new_shape=self.INPUT_SHAPE, auto=False
+        )
 
-        if auto:  # minimum rectangle
-            dw, dh = np.mod(dw, stride), np.mod(dh, stride)  # wh padding
+    def preprocessor(
+        self, key: tuple[int, int] | LetterboxGeometry
+    ) -> LetterboxPreprocessor:
+        """
+        Returns the preprocessor for the frames of a stream in the current
+        thread, creating it for the first frame.
 
-        dw /= 2  # divide padding into 2 sides
-        dh /= 2
+        Parameters
+        ----------
+        key : tuple[int, int] | LetterboxGeometry
+            The height and width of the original frames,
+            or the geometry of the already letterboxed ones.
 
-        if shape[::-1] != new_unpad:  # resize
-            im = cv2.resize(im, new_unpad, interpolation=cv2.INTER_LINEAR)
-        top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
-        left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
-        im = cv2.copyMakeBorder(
-            im, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color
-        )  # add border
-        return im, r, (dw, dh)
+        Returns
+        -------
+        LetterboxPreprocessor
+            The preprocessor with its own input tensor.
+        """
+        preprocessors = getattr(self._local, "preprocessors", None)
+        if preprocessors is None:
+            preprocessors = self._local.preprocessors = {}
+        raw = self.model().raw_input
+        preprocessor = preprocessors.get((key, raw))
+        if preprocessor is None:
+            if isinstance(key, LetterboxGeometry):
+                geometry = key
+            else:
+                geometry = self.model_input_geometry(key[1], key[0])
+            preprocessor = preprocessors[(key, raw)] = LetterboxPreprocessor(
+                geometry, raw=raw
+            )
+        return preprocessor
 
     def pre_process(
         self, input_img: np.ndarray
     ) -> tuple[np.ndarray, float, tuple[float, float]]:
-        img = input_img.copy()
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        img, ratio, dwdh = self.letterbox(img, new_shape=(640,640), auto=False)
-        img = np.expand_dims(img, axis=0).astype("float32") / 255.0
-        img = np.transpose(img, [0, 3, 1, 2])
+        preprocessor = self.preprocessor(input_img.shape[:2])
+        img = preprocessor(input_img)
+        return img, preprocessor.geometry.ratio, preprocessor.geometry.dwdh
 
-        return img, ratio, dwdh
+    def pre_process_letterboxed(
+        self, input_img: np.ndarray, geometry: LetterboxGeometry
+    ) -> tuple[np.ndarray, float, tuple[float, float]]:
+        img = self.preprocessor(geometry).letterboxed(input_img)
+        return img, geometry.ratio, geometry.dwdh
+
+    def detect_batch(
+        self, imgs: list[np.ndarray]
+    ) -> list[tuple[np.ndarray, np.ndarray, np.ndarray] | tuple[None, None, None]]:
+        raw = self.model().raw_input
+        batch = getattr(self._local, "batch", None)
+        if (
+            batch is None
+            or len(batch) < len(imgs)
+            or batch.dtype != (np.uint8 if raw else np.float32)
+        ):
+            height, width = self.INPUT_SHAPE
+            if raw:
+                batch = np.empty((len(imgs), height, width, 3), dtype=np.uint8)
+            else:
+                batch = np.empty((len(imgs), 3, height, width), dtype=np.float32)
+            self._local.batch = batch
+            self._local.slots = {}
+        slots: dict[int, tuple[tuple[int, int], LetterboxPreprocessor]] = self._local.slots
+
+        # Each image of the batch has its own preprocessor writing into its slot,
+        # it is replaced only if the size of the images in the slot changes
+        geometries = []
+        for index, img in enumerate(imgs):
+            shape = img.shape[:2]
+            if index not in slots or slots[index][0] != shape:
+                slots[index] = shape, LetterboxPreprocessor(
+                    self.model_input_geometry(shape[1], shape[0]),
+                    raw=raw,
+                    tensor=batch[index : index + 1],
+                )
+            preprocessor = slots[index][1]
+            preprocessor(img)
+            geometries.append(preprocessor.geometry)
+
+        outputs = self.inference_batch(batch[: len(imgs)])
+        return [
+            self.post_process(outputs[index : index + 1], geometry.dwdh, geometry.ratio)
+            for index, geometry in enumerate(geometries)
+        ]
 
     def inference(self, img: np.ndarray) -> np.ndarray:
-        with self.lock:
-            return self.session.run(self.output_name, {self.input_name: img})[0]
+        return self.model().run(img)
+
+    def inference_batch(self, batch: np.ndarray) -> np.ndarray:
+        """
+        Processes a batch of images with one run of the model if it takes
+        batches, or image by image otherwise.
+
+        Parameters
+        ----------
+        batch : np.ndarray
+            The prepared images.
+
+        Returns
+        -------
+        np.ndarray
+            The outputs of the model for all images.
+        """
+        if self.model().batch_input or len(batch) == 1:
+            return self.inference(batch)
+        # The outputs are copied at once, `inference` may return the same buffer
+        outputs = None
+        for index in range(len(batch)):
+            output = self.inference(batch[index : index + 1])
+            if outputs is None:
+                outputs = np.empty((len(batch), *output.shape[1:]), dtype=output.dtype)
+            outputs[index] = output[0]
+        return outputs
 
     def post_process(
         self, output: np.ndarray, dwdh: tuple, ratio: float
     ) -> tuple[np.ndarray, np.ndarray, np.ndarray] | tuple[None, None, None]:
+        model = self.model()
         outputs = np.transpose(np.squeeze(output))
         classes_scores = outputs[:, 4:]
         max_scores = np.amax(classes_scores, axis=1)  # Max score for each prediction
-        conf_indices = np.where(max_scores >= self.CONF_TH)[0]  # Filter based on CONF_TH
+        conf_indices = np.where(max_scores >= model.conf_th)[0]  # Filter based on the confidence threshold
 
         if len(conf_indices) == 0:  # Early exit if no valid detections
             return None, None, None
@@ -157,8 +426,19 @@ class Detector(Base):
         boxes = boxes.round().astype(np.int32)
 
         # Perform Non-Maximum Suppression
-        indices = non_maximum_suppression(boxes, scores, self.IOU_TH)
-        # indices = cv2.dnn.NMSBoxes(boxes.tolist(), scores.tolist(), self.CONF_TH, self.IOU_TH)
+        nms_classes = class_ids if general_cfg.get("nms_class_aware", False) else None
+        top_k = general_cfg.get("nms_top_k", 0)
+        soft_sigma = general_cfg.get("nms_soft_sigma")
+        if soft_sigma:
+            # The overlapping boxes are kept with decayed scores
+            indices, scores = soft_nms(
+                boxes, scores, soft_sigma, model.conf_th, classes=nms_classes, top_k=top_k
+            )
+        else:
+            indices = non_maximum_suppression(
+                boxes, scores, model.iou_th, classes=nms_classes, top_k=top_k
+            )
+            scores = scores[indices]
 
         if isinstance(indices, tuple) or len(indices) == 0:  # No detections after NMS
             return None, None, None
@@ -166,6 +446,5 @@ class Detector(Base):
         indices = np.array(indices).flatten()  # Flatten indices
         boxes = boxes[indices]
         classes = class_ids[indices]
-        scores = scores[indices]
 
         return boxes, classes, scores
@@ -1,17 +1,86 @@
 import argparse
 from ultralytics import YOLO
 
+
+def bake_preprocessing(onnx_path: str) -> None:
+    """
+    Moves the preprocessing of the input into the graph of an ONNX model.
+
+    The model takes a letterboxed uint8 BGR image of shape (N, H, W, 3)
+    instead of a normalized float32 RGB tensor of shape (N, 3, H, W):
+    the transpose, the channel reversal, the cast and the division by 255
+    are done by the first nodes of the graph in the same order and with
+    the same precision as in `Detector.pre_process`. `Detector` recognizes
+    such a model by the type of its input.
+
+    Parameters
+    ----------
+    onnx_path : str
+        Path to the ONNX model, which is overwritten.
+    """
+    import onnx
+    from onnx import TensorProto, helper
+
+    model = onnx.load(onnx_path)
+    graph = model.graph
+    graph_input = graph.input[0]
+    name = graph_input.name
+    batch, _, height, width = graph_input.type.tensor_type.shape.dim
+
+    # The original input becomes the output of the preprocessing nodes
+    raw_name = f"{name}_uint8"
+    nodes = [
+        helper.make_node("Transpose", [raw_name], [f"{name}_chw"], perm=[0, 3, 1, 2]),
+        helper.make_node("Gather", [f"{name}_chw", f"{name}_rgb_index"], [f"{name}_rgb"], axis=1),
+        helper.make_node("Cast", [f"{name}_rgb"], [f"{name}_float"], to=TensorProto.FLOAT),
+        helper.make_node("Div", [f"{name}_float", f"{name}_divisor"], [name]),
+    ]
+    graph.initializer.extend(
+        [
+            helper.make_tensor(f"{name}_rgb_index", TensorProto.INT64, [3], [2, 1, 0]),
+            helper.make_tensor(f"{name}_divisor", TensorProto.FLOAT, [], [255.0]),
+        ]
+    )
+    for node in reversed(nodes):
+        graph.node.insert(0, node)
+
+    raw_input = helper.make_tensor_value_info(raw_name, TensorProto.UINT8, None)
+    for dim in (batch, height, width):
+        raw_input.type.tensor_type.shape.dim.append(dim)
+    raw_input.type.tensor_type.shape.dim.add().dim_value = 3
+    graph.input.remove(graph_input)
+    graph.input.insert(0, raw_input)
+
+    onnx.checker.check_model(model)
+    onnx.save(model, onnx_path)
+
+
 # Создаем парсер для аргументов командной строки
 parser = argparse.ArgumentParser(description="Export YOLO model to ONNX format")
 parser.add_argument("model_path", type=str, help="Path to the YOLO .pt model file")
+parser.add_argument(
+    "--dynamic-batch",
+    action="store_true",
+    help="Export with dynamic input axes, so the model takes batches of images",
+)
+parser.add_argument(
+    "--uint8-input",
+    action="store_true",
+    help="Take uint8 BGR images (N, H, W, 3) and do the preprocessing inside the model",
+)
+
+if __name__ == "__main__":
+    # Парсим аргументы
+    args = parser.parse_args()
 
-# Парсим аргументы
-args = parser.parse_args()
+    # Загружаем модель с указанного пути
+    model = YOLO(args.model_path)
 
-# Загружаем модель с указанного пути
-model = YOLO(args.model_path)
+    # Экспортируем модель в формат ONNX
+    onnx_path = model.export(format="onnx", dynamic=args.dynamic_batch)
 
-# Экспортируем модель в формат ONNX
-model.export(format="onnx")
+    # Встраиваем подготовку изображения в граф модели
+    if args.uint8_input:
+        bake_preprocessing(onnx_path)
 
-print(f"Model {args.model_path} exported to ONNX format.")
+    print(f"Model {args.model_path} exported to ONNX format.")
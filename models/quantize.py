@@ -0,0 +1,461 @@
+"""
+Static INT8 quantization of an ONNX model for CPU deployments.
+
+The model from `models/convert.py` is calibrated on frames sampled evenly
+from local videos and saved in the QDQ or QOperator format. Then both models
+run on the same frames on CPU, and a report of their latency, throughput
+and agreement of detections is printed and saved next to the INT8 model.
+The quantized model has the same inputs and outputs, so `Detector` loads it
+like the original one.
+
+Run from the root of the repository:
+
+    python -m models.quantize model.onnx examples/sample*.mp4
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+import onnx
+import onnxruntime as ort
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    CalibrationMethod,
+    QuantFormat,
+    QuantType,
+    quantize_static,
+)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+
+from config import general_cfg
+from detector import Detector
+from utils.preprocess import LetterboxPreprocessor
+from utils.sessions import make_session_options
+
+CALIBRATION_METHODS = {
+    "minmax": CalibrationMethod.MinMax,
+    "entropy": CalibrationMethod.Entropy,
+    "percentile": CalibrationMethod.Percentile,
+}
+HEAD_STOP_OPS = {"Conv", "ConvTranspose", "MatMul", "Gemm"}
+"""The operations where the search for the postprocessing nodes of the model stops."""
+
+
+def sample_frames(videos: list[str], count: int) -> list[np.ndarray]:
+    """
+    Reads frames evenly spaced over the videos.
+
+    Parameters
+    ----------
+    videos : list[str]
+        Paths to the videos.
+    count : int
+        The total number of frames, split equally between the videos.
+
+    Returns
+    -------
+    list[np.ndarray]
+        The BGR frames.
+    """
+    frames = []
+    per_video = max(1, count // len(videos))
+    for video in videos:
+        cap = cv2.VideoCapture(video)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        for index in np.linspace(0, max(total - 1, 0), per_video).round().astype(int):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+            ok, frame = cap.read()
+            if ok:
+                frames.append(frame)
+        cap.release()
+    return frames
+
+
+def prepare(frames: list[np.ndarray], raw: bool) -> list[np.ndarray]:
+    """
+    Turns frames into model inputs the same way as `Detector.pre_process`.
+
+    Parameters
+    ----------
+    frames : list[np.ndarray]
+        The BGR frames.
+    raw : bool
+        Whether the model takes uint8 images (see `convert.py --uint8-input`).
+
+    Returns
+    -------
+    list[np.ndarray]
+        The inputs of the model.
+    """
+    inputs = []
+    preprocessors: dict[tuple[int, int], LetterboxPreprocessor] = {}
+    for frame in frames:
+        shape = frame.shape[:2]
+        if shape not in preprocessors:
+            geometry = Detector.letterbox_geometry(shape, Detector.INPUT_SHAPE, auto=False)
+            preprocessors[shape] = LetterboxPreprocessor(geometry, raw=raw)
+        # The preprocessor reuses its tensor for the next frame
+        inputs.append(preprocessors[shape](frame).copy())
+    return inputs
+
+
+class FrameCalibrationReader(CalibrationDataReader):
+    """
+    Feeds the prepared frames to the calibration of `quantize_static`.
+
+    Parameters
+    ----------
+    input_name : str
+        The name of the model input.
+    inputs : list[np.ndarray]
+        The prepared frames.
+    """
+
+    def __init__(self, input_name: str, inputs: list[np.ndarray]) -> None:
+        self.input_name = input_name
+        self.inputs = inputs
+        self._iterator = iter(inputs)
+
+    def get_next(self) -> dict | None:
+        img = next(self._iterator, None)
+        return None if img is None else {self.input_name: img}
+
+    def rewind(self) -> None:
+        self._iterator = iter(self.inputs)
+
+
+def head_nodes(model: onnx.ModelProto) -> list[str]:
+    """
+    Finds the postprocessing nodes between the last convolutions and
+    the outputs of the model.
+
+    In YOLOv8 they decode the boxes and the class scores and join them into
+    one tensor, whose values of very different ranges lose their precision
+    with a common quantization scale, so they are left in float32.
+
+    Parameters
+    ----------
+    model : onnx.ModelProto
+        The model.
+
+    Returns
+    -------
+    list[str]
+        The names of the nodes.
+    """
+    producers = {output: node for node in model.graph.node for output in node.output}
+    names = []
+    visited = set()
+    pending = [output.name for output in model.graph.output]
+    while pending:
+        node = producers.get(pending.pop())
+        if node is None or id(node) in visited or node.op_type in HEAD_STOP_OPS:
+            continue
+        visited.add(id(node))
+        names.append(node.name)
+        pending.extend(node.input)
+    return names
+
+
+def rename_reserved(model: onnx.ModelProto) -> None:
+    """
+    Renames the initializers that take the names of the quantization
+    parameters of a tensor, `<tensor>_scale` and `<tensor>_zero_point`.
+
+    The quantizer would reuse such an initializer instead of creating
+    the parameter, e.g. a constant named `images_scale` would become
+    the scale of the input `images`.
+
+    Parameters
+    ----------
+    model : onnx.ModelProto
+        The model changed in place.
+    """
+    graph = model.graph
+    tensors = {name for node in graph.node for name in node.input}
+    tensors.update(name for node in graph.node for name in node.output)
+    reserved = {f"{name}{suffix}" for name in tensors for suffix in ("_scale", "_zero_point")}
+    for initializer in graph.initializer:
+        if initializer.name not in reserved:
+            continue
+        old, initializer.name = initializer.name, f"{initializer.name}_value"
+        for node in graph.node:
+            for index, name in enumerate(node.input):
+                if name == old:
+                    node.input[index] = initializer.name
+
+
+def quantize(
+    model_path: str,
+    output_path: str,
+    inputs: list[np.ndarray],
+    quant_format: str = "qdq",
+    method: str = "minmax",
+    per_channel: bool = True,
+    quantize_head: bool = False,
+) -> None:
+    """
+    Quantizes the weights and activations of a model to INT8.
+
+    Parameters
+    ----------
+    model_path : str
+        Path to the float32 ONNX model.
+    output_path : str
+        Path to save the quantized model.
+    inputs : list[np.ndarray]
+        The prepared frames for the calibration of activations.
+    quant_format : str, optional
+        "qdq" inserts QuantizeLinear/DequantizeLinear pairs around
+        the operations, "qoperator" replaces them with quantized ones
+        (default is "qdq").
+    method : str, optional
+        The calibration method: "minmax", "entropy" or "percentile"
+        (default is "minmax").
+    per_channel : bool, optional
+        Whether to quantize the weights per output channel (default is True).
+    quantize_head : bool, optional
+        Whether to quantize the postprocessing nodes of the model too
+        (see `head_nodes`, default is False).
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        # Shape inference and graph cleanup recommended before quantization,
+        # the shapes of a convolutional network need no symbolic inference
+        prepared_path = os.path.join(directory, "prepared.onnx")
+        quant_pre_process(model_path, prepared_path, skip_symbolic_shape=True)
+
+        # The nodes are excluded by name, so the unnamed ones get a name
+        model = onnx.load(prepared_path)
+        for index, node in enumerate(model.graph.node):
+            node.name = node.name or f"{node.op_type}_{index}"
+        rename_reserved(model)
+        onnx.save(model, prepared_path)
+
+        quantize_static(
+            prepared_path,
+            output_path,
+            FrameCalibrationReader(model.graph.input[0].name, inputs),
+            quant_format=QuantFormat.QDQ if quant_format == "qdq" else QuantFormat.QOperator,
+            per_channel=per_channel,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            nodes_to_exclude=[] if quantize_head else head_nodes(model),
+            calibrate_method=CALIBRATION_METHODS[method],
+        )
+
+
+def box_iou(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+    """
+    Computes the intersection over union of every pair of boxes.
+    """
+    left_top = np.maximum(boxes1[:, None, :2], boxes2[None, :, :2])
+    right_bottom = np.minimum(boxes1[:, None, 2:], boxes2[None, :, 2:])
+    intersection = np.prod(np.clip(right_bottom - left_top, 0, None), axis=2)
+    area1 = np.prod(boxes1[:, 2:] - boxes1[:, :2], axis=1)
+    area2 = np.prod(boxes2[:, 2:] - boxes2[:, :2], axis=1)
+    return intersection / np.maximum(area1[:, None] + area2[None, :] - intersection, 1e-9)
+
+
+def match(reference: tuple, result: tuple, iou_threshold: float) -> tuple[int, list[float]]:
+    """
+    Greedily matches the detections of two models on a frame,
+    the most confident reference detections first.
+
+    Returns
+    -------
+    tuple[int, list[float]]
+        The number of matches of the same class with IoU above the threshold
+        and their IoU.
+    """
+    boxes, classes, scores = reference
+    other_boxes, other_classes, _ = result
+    if boxes is None or other_boxes is None:
+        return 0, []
+    iou = box_iou(boxes.astype(np.float32), other_boxes.astype(np.float32))
+    iou[classes[:, None] != other_classes[None, :]] = 0
+    matched = []
+    free = np.ones(len(other_boxes), dtype=bool)
+    for index in np.argsort(-scores):
+        candidates = np.where(free, iou[index], 0)
+        best = int(np.argmax(candidates))
+        if candidates[best] >= iou_threshold:
+            free[best] = False
+            matched.append(float(candidates[best]))
+    return len(matched), matched
+
+
+def measure(
+    detector: Detector,
+    model_path: str,
+    inputs: list[np.ndarray],
+    geometries: list,
+    repeat: int,
+) -> tuple[dict, list]:
+    """
+    Runs a model on CPU with the configured session options.
+
+    Returns
+    -------
+    tuple[dict, list]
+        The median and 90th percentile latency of a frame in milliseconds,
+        the frames per second, and the detections of every frame.
+    """
+    session = ort.InferenceSession(
+        model_path,
+        sess_options=make_session_options(general_cfg.get("session_options", {})),
+        providers=["CPUExecutionProvider"],
+    )
+    input_name = session.get_inputs()[0].name
+    output_name = [session.get_outputs()[0].name]
+    session.run(output_name, {input_name: inputs[0]})  # warm up
+
+    times = []
+    detections = []
+    for _ in range(repeat):
+        detections = []
+        for img, geometry in zip(inputs, geometries):
+            start = time.perf_counter()
+            output = session.run(output_name, {input_name: img})[0]
+            times.append(time.perf_counter() - start)
+            detections.append(detector.post_process(output, geometry.dwdh, geometry.ratio))
+    return {
+        "latency_p50_ms": round(1000 * float(np.median(times)), 2),
+        "latency_p90_ms": round(1000 * float(np.percentile(times, 90)), 2),
+        "throughput_fps": round(len(times) / sum(times), 2),
+    }, detections
+
+
+def report(
+    model_path: str,
+    quantized_path: str,
+    frames: list[np.ndarray],
+    inputs: list[np.ndarray],
+    repeat: int,
+    iou_threshold: float,
+) -> dict:
+    """
+    Compares the quantized model with the original one on the same frames.
+
+    Returns
+    -------
+    dict
+        The latency and the throughput of both models on CPU, and the share
+        of the original detections found by the quantized model (recall),
+        of the quantized detections found by the original one (precision),
+        and the mean IoU of the matched detections.
+    """
+    detector = Detector(model_path)
+    geometries = [
+        Detector.letterbox_geometry(frame.shape[:2], Detector.INPUT_SHAPE, auto=False)
+        for frame in frames
+    ]
+    fp32, reference = measure(detector, model_path, inputs, geometries, repeat)
+    int8, results = measure(detector, quantized_path, inputs, geometries, repeat)
+
+    def count(detections: tuple) -> int:
+        return 0 if detections[0] is None else len(detections[0])
+
+    matched = 0
+    ious: list[float] = []
+    for expected, result in zip(reference, results):
+        frame_matched, frame_ious = match(expected, result, iou_threshold)
+        matched += frame_matched
+        ious.extend(frame_ious)
+    total_fp32 = sum(count(detections) for detections in reference)
+    total_int8 = sum(count(detections) for detections in results)
+
+    return {
+        "frames": len(frames),
+        "fp32": {**fp32, "size_mb": round(os.path.getsize(model_path) / 2**20, 2)},
+        "int8": {**int8, "size_mb": round(os.path.getsize(quantized_path) / 2**20, 2)},
+        "speedup": round(fp32["latency_p50_ms"] / int8["latency_p50_ms"], 2),
+        "agreement": {
+            "fp32_detections": total_fp32,
+            "int8_detections": total_int8,
+            "recall": round(matched / total_fp32, 4) if total_fp32 else 1.0,
+            "precision": round(matched / total_int8, 4) if total_int8 else 1.0,
+            "mean_iou": round(float(np.mean(ious)), 4) if ious else None,
+        },
+    }
+
+
+parser = argparse.ArgumentParser(description="Quantize an ONNX model to INT8 for CPU")
+parser.add_argument("model_path", type=str, help="Path to the float32 ONNX model")
+parser.add_argument("videos", nargs="+", help="The videos to sample the calibration frames from")
+parser.add_argument(
+    "-o", "--output", type=str, default=None,
+    help="Path to the quantized model (default is <model>_int8.onnx)",
+)
+parser.add_argument(
+    "--format", choices=["qdq", "qoperator"], default="qdq",
+    help="The format of the quantized model (default is qdq)",
+)
+parser.add_argument(
+    "--method", choices=list(CALIBRATION_METHODS), default="minmax",
+    help="The calibration method (default is minmax)",
+)
+parser.add_argument(
+    "--frames", type=int, default=100,
+    help="The number of calibration frames (default is 100)",
+)
+parser.add_argument(
+    "--eval-frames", type=int, default=100,
+    help="The number of other frames for the report (default is 100)",
+)
+parser.add_argument(
+    "--repeat", type=int, default=3,
+    help="The number of passes over the report frames (default is 3)",
+)
+parser.add_argument(
+    "--iou", type=float, default=0.5,
+    help="The IoU of matching detections of the two models (default is 0.5)",
+)
+parser.add_argument(
+    "--per-tensor", action="store_true",
+    help="Quantize the weights per tensor instead of per channel",
+)
+parser.add_argument(
+    "--quantize-head", action="store_true",
+    help="Quantize the box decoding at the end of the model too",
+)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    output = args.output or f"{os.path.splitext(args.model_path)[0]}_int8.onnx"
+    raw = ort.InferenceSession(
+        args.model_path, providers=["CPUExecutionProvider"]
+    ).get_inputs()[0].type == "tensor(uint8)"
+
+    # The report frames lie between the calibration ones in the videos
+    frames = sample_frames(args.videos, args.frames + args.eval_frames)
+    is_eval = np.zeros(len(frames), dtype=bool)
+    is_eval[np.linspace(1, len(frames) - 1, args.eval_frames).round().astype(int)] = True
+    calibration_frames = [frame for frame, flag in zip(frames, is_eval) if not flag]
+    eval_frames = [frame for frame, flag in zip(frames, is_eval) if flag]
+
+    quantize(
+        args.model_path,
+        output,
+        prepare(calibration_frames, raw),
+        quant_format=args.format,
+        method=args.method,
+        per_channel=not args.per_tensor,
+        quantize_head=args.quantize_head,
+    )
+    print(f"Model {args.model_path} quantized to {output}.")
+
+    results = report(
+        args.model_path,
+        output,
+        eval_frames,
+        prepare(eval_frames, raw),
+        args.repeat,
+        args.iou,
+    )
+    print(json.dumps(results, indent=4))
+    with open(f"{os.path.splitext(output)[0]}_report.json", "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4)
@@ -17,12 +17,15 @@ class FFprobeParameters(BaseModel):
         The interval between frames, calculated as REAL_FPS / DESIRED_FPS.
     duration : float
         The total duration of the video in seconds.
+    codec : str
+        The name of the video codec. Defaults to an empty string.
     """
     width: int
     height: int
     fps: float
     frame_interval: float
     duration: float
+    codec: str = ""
 
 
 class InferenceCycleParameters(BaseModel):
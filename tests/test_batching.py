@@ -0,0 +1,137 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from utils.batching import BatchScheduler
+
+
+class Model:
+    """
+    Records the batches and returns the images multiplied by 10.
+    """
+
+    def __init__(self, gate=None):
+        self.batches = []
+        self.gate = gate
+
+    def __call__(self, batch):
+        self.batches.append(batch[:, 0].tolist())
+        if self.gate is not None:
+            self.gate.wait(5)
+        return batch * 10
+
+
+def images(*values):
+    return np.array(values, dtype=np.float32).reshape(-1, 1)
+
+
+def submit_all(scheduler, requests):
+    """
+    Submits every request from its own thread and returns the outputs.
+    """
+    outputs = [None] * len(requests)
+
+    def submit(i, values, key):
+        outputs[i] = scheduler.submit(images(*values), key).ravel().tolist()
+
+    threads = [
+        threading.Thread(target=submit, args=(i, values, key))
+        for i, (values, key) in enumerate(requests)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads, outputs
+
+
+def test_concurrent_requests_get_their_own_outputs():
+    model = Model()
+    scheduler = BatchScheduler(model, max_batch_size=4, max_wait_ms=50)
+    requests = [((i, i + 0.5), i) for i in range(10)]
+
+    threads, outputs = submit_all(scheduler, requests)
+    for thread in threads:
+        thread.join()
+    scheduler.close()
+
+    assert outputs == [[10 * i, 10 * i + 5] for i in range(10)]
+    assert all(len(batch) <= 4 for batch in model.batches)
+    assert sum(len(batch) for batch in model.batches) == 20
+    assert scheduler.stats()["images"] == 20
+
+
+def test_large_request_runs_alone():
+    model = Model()
+    scheduler = BatchScheduler(model, max_batch_size=2, max_wait_ms=1)
+
+    output = scheduler.submit(images(1, 2, 3, 4, 5))
+    scheduler.close()
+
+    assert output.ravel().tolist() == [10, 20, 30, 40, 50]
+    assert model.batches == [[1, 2, 3, 4, 5]]
+
+
+def test_lone_request_waits_at_most_max_wait():
+    scheduler = BatchScheduler(Model(), max_batch_size=8, max_wait_ms=50)
+
+    start = time.perf_counter()
+    scheduler.submit(images(1))
+    elapsed = time.perf_counter() - start
+    scheduler.close()
+
+    assert 0.04 <= elapsed < 1
+
+
+def test_busy_caller_does_not_push_out_the_others():
+    gate = threading.Event()
+    model = Model(gate)
+    scheduler = BatchScheduler(model, max_batch_size=2, max_wait_ms=1)
+
+    # The first batch holds the model while the others queue up
+    threads, _ = submit_all(scheduler, [((0,), "busy")])
+    while not model.batches:
+        time.sleep(0.001)
+    more, _ = submit_all(scheduler, [((i,), "busy") for i in range(1, 5)])
+    while scheduler._pending < 4:
+        time.sleep(0.001)
+    quiet, _ = submit_all(scheduler, [((100,), "quiet")])
+    while scheduler._pending < 5:
+        time.sleep(0.001)
+    gate.set()
+    for thread in threads + more + quiet:
+        thread.join()
+    scheduler.close()
+
+    assert 100 in model.batches[1]
+
+
+def test_error_reaches_every_request_of_the_batch():
+    def fail(batch):
+        raise ValueError("model failed")
+
+    scheduler = BatchScheduler(fail, max_batch_size=4, max_wait_ms=50)
+    errors = []
+
+    def submit():
+        try:
+            scheduler.submit(images(1))
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=submit) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    scheduler.close()
+
+    assert len(errors) == 3
+
+
+def test_closed_scheduler_rejects_requests():
+    scheduler = BatchScheduler(Model(), max_batch_size=2, max_wait_ms=1)
+    scheduler.close()
+
+    with pytest.raises(RuntimeError):
+        scheduler.submit(images(1))
@@ -0,0 +1,91 @@
+import io
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from utils.frame_pool import FramePool
+
+
+def test_buffer_returns_to_the_pool_after_the_last_release():
+    pool = FramePool((2, 3), 2)
+    buffer = pool.acquire()
+    buffer.retain()
+    assert pool.free == 1
+
+    buffer.release()
+    assert pool.free == 1
+    buffer.release()
+    assert pool.free == 2
+
+
+def test_released_buffer_cannot_be_used_again():
+    pool = FramePool((2, 3), 1)
+    buffer = pool.acquire()
+    buffer.release()
+
+    with pytest.raises(RuntimeError):
+        buffer.release()
+    with pytest.raises(RuntimeError):
+        buffer.retain()
+
+
+def test_memory_is_reused():
+    pool = FramePool((2, 3), 1)
+    buffer = pool.acquire()
+    array = buffer.array
+    buffer.release()
+
+    assert pool.acquire().array is array
+
+
+def test_acquire_times_out_when_no_buffer_is_released():
+    pool = FramePool((2, 3), 1)
+    pool.acquire()
+
+    start = time.monotonic()
+    with pytest.raises(RuntimeError, match="all 1 are in use"):
+        pool.acquire(timeout=0.1)
+    assert time.monotonic() - start < 1
+
+
+def test_acquire_waits_for_a_release():
+    pool = FramePool((2, 3), 1)
+    buffer = pool.acquire()
+    timer = threading.Timer(0.05, buffer.release)
+    timer.start()
+
+    assert pool.acquire(timeout=5).array is buffer.array
+    timer.join()
+
+
+def test_grow_and_shrink():
+    pool = FramePool((2, 3), 2)
+    pool.grow(2)
+    assert pool.size == pool.free == 4
+
+    buffers = [pool.acquire() for _ in range(3)]
+    # Only one buffer is free, the others leave the pool when released
+    pool.shrink(3)
+    assert pool.size == 1
+    assert pool.free == 0
+    for buffer in buffers:
+        buffer.release()
+    assert pool.free == 1
+
+
+def test_readinto_reads_whole_frames():
+    frames = np.arange(2 * 2 * 3 * 2, dtype=np.uint8).reshape(2, 2, 3, 2)
+    # A partial frame at the end of the stream is dropped
+    pipe = io.BufferedReader(io.BytesIO(frames.tobytes() + b"\x01\x02"), buffer_size=5)
+    pool = FramePool((2, 3, 2), 2)
+
+    first = pool.readinto(pipe)
+    np.testing.assert_array_equal(first.array, frames[0])
+    second = pool.readinto(pipe)
+    np.testing.assert_array_equal(second.array, frames[1])
+    first.release()
+
+    assert pool.readinto(pipe) is None
+    assert pool.free == 1
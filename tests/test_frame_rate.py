@@ -0,0 +1,49 @@
+import pytest
+
+from utils.frame_rate import AdaptiveFrameRate
+
+
+def idle_rates(frame_rate, count):
+    return [frame_rate.update(False) for _ in range(count)]
+
+
+def test_rate_holds_then_halves_every_decay_period():
+    frame_rate = AdaptiveFrameRate(fps=25, min_rate=1, max_rate=5, hold_sec=2, decay_sec=1)
+
+    # At 5 fps every idle frame covers 0.2 s of the stream
+    rates = idle_rates(frame_rate, 10)
+    assert rates == [5] * 10
+    frame_rate.update(False)
+    assert frame_rate.rate < 5
+
+    frame_rate = AdaptiveFrameRate(fps=25, min_rate=0.1, max_rate=5, hold_sec=0, decay_sec=1)
+    idle = 0.0
+    for _ in range(20):
+        idle += frame_rate.interval() / 25
+        rate = frame_rate.update(False)
+        assert rate == pytest.approx(max(0.1, 5 * 0.5**idle))
+
+
+def test_rate_does_not_fall_below_the_minimum():
+    frame_rate = AdaptiveFrameRate(fps=25, min_rate=1, max_rate=5, hold_sec=0, decay_sec=0.5)
+
+    assert idle_rates(frame_rate, 100)[-1] == 1
+    assert frame_rate.interval() == 25
+
+
+def test_activity_restores_the_maximum_at_once():
+    frame_rate = AdaptiveFrameRate(fps=25, min_rate=1, max_rate=5, hold_sec=1, decay_sec=0.5)
+    idle_rates(frame_rate, 100)
+
+    assert frame_rate.update(True) == 5
+    assert frame_rate.interval() == 5
+    # The hold period starts again after the activity
+    assert frame_rate.update(False) == 5
+
+
+def test_rates_are_limited_by_the_source():
+    frame_rate = AdaptiveFrameRate(fps=4, min_rate=10, max_rate=30, hold_sec=1, decay_sec=1)
+
+    assert frame_rate.max_rate == frame_rate.min_rate == 4
+    assert frame_rate.interval() == 1
+    assert idle_rates(frame_rate, 50)[-1] == 4
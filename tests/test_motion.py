@@ -0,0 +1,52 @@
+import numpy as np
+
+from utils.motion import MotionGate
+
+
+def frame(square_at=None):
+    img = np.full((120, 160, 3), 60, dtype=np.uint8)
+    if square_at is not None:
+        x, y = square_at
+        img[y : y + 30, x : x + 30] = 250
+    return img
+
+
+def test_first_frame_is_processed():
+    gate = MotionGate(threshold=20, min_area=0.01, width=64, force_frames=100)
+
+    assert gate.check(frame())
+
+
+def test_still_frames_are_skipped_and_motion_is_not():
+    gate = MotionGate(threshold=20, min_area=0.01, width=64, force_frames=100)
+    gate.check(frame((10, 10)))
+
+    assert not gate.check(frame((10, 10)))
+    assert gate.check(frame((100, 60)))
+    assert gate.stats() == {"frames": 3, "skipped": 1, "forced": 0, "skip_ratio": 0.333}
+
+
+def test_small_changes_add_up_against_the_last_processed_frame():
+    gate = MotionGate(threshold=20, min_area=0.01, width=64, force_frames=100)
+    brightness = range(60, 120, 5)
+    decisions = [
+        gate.check(np.full((120, 160, 3), value, dtype=np.uint8)) for value in brightness
+    ]
+
+    # Each step of 5 is too small, the frame 25 brighter than the reference is not
+    assert decisions == [True, False, False, False, False] * 2 + [True, False]
+
+
+def test_processing_is_forced_after_too_many_skips():
+    gate = MotionGate(threshold=20, min_area=0.01, width=64, force_frames=3)
+    decisions = [gate.check(frame()) for _ in range(9)]
+
+    assert decisions == [True, False, False, False, True, False, False, False, True]
+    assert gate.stats()["forced"] == 2
+
+
+def test_size_change_resets_the_reference():
+    gate = MotionGate(threshold=20, min_area=0.01, width=64, force_frames=100)
+    gate.check(frame())
+
+    assert gate.check(np.full((90, 160, 3), 60, dtype=np.uint8))
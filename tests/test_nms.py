@@ -0,0 +1,175 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from utils.nms import CHUNK_SIZE, box_iou, non_maximum_suppression, soft_nms
+
+
+def reference_nms(boxes, scores, iou_threshold):
+    """
+    The box by box greedy NMS the vectorized one replaced.
+    """
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        xx1 = np.maximum(x1[i], x1[order[1:]])
+        yy1 = np.maximum(y1[i], y1[order[1:]])
+        xx2 = np.minimum(x2[i], x2[order[1:]])
+        yy2 = np.minimum(y2[i], y2[order[1:]])
+        w = np.maximum(0, xx2 - xx1 + 1)
+        h = np.maximum(0, yy2 - yy1 + 1)
+        intersection = w * h
+        iou = intersection / (areas[i] + areas[order[1:]] - intersection)
+        order = order[np.where(iou <= iou_threshold)[0] + 1]
+    return np.array(keep, dtype=int)
+
+
+def reference_class_nms(boxes, scores, iou_threshold, classes):
+    """
+    The reference NMS run for each class separately.
+    """
+    keep = []
+    for cls in np.unique(classes):
+        members = np.flatnonzero(classes == cls)
+        keep.extend(members[reference_nms(boxes[members], scores[members], iou_threshold)])
+    keep = np.array(keep, dtype=int)
+    return keep[np.argsort(-scores[keep], kind="stable")]
+
+
+def random_boxes(rng, count, extent, size):
+    corners = rng.uniform(0, extent, (count, 2))
+    sizes = rng.uniform(*size, (count, 2))
+    return np.concatenate([corners, corners + sizes], axis=1)
+
+
+@pytest.mark.parametrize("count", [1, 7, CHUNK_SIZE, CHUNK_SIZE + 1, 5 * CHUNK_SIZE + 3])
+@pytest.mark.parametrize("iou_threshold", [0.1, 0.3, 0.5, 0.9])
+def test_matches_reference_on_random_boxes(count, iou_threshold):
+    rng = np.random.default_rng(count)
+    boxes = random_boxes(rng, count, 640, (5, 120))
+    scores = rng.permutation(count) / count
+
+    expected = reference_nms(boxes, scores, iou_threshold)
+    np.testing.assert_array_equal(
+        non_maximum_suppression(boxes, scores, iou_threshold), expected
+    )
+
+
+@pytest.mark.parametrize("iou_threshold", [1 / 3, 0.25, 0.5, 0.6])
+def test_matches_reference_at_edge_ratios(iou_threshold):
+    # Small integer boxes make many overlaps exactly equal to the threshold
+    rng = np.random.default_rng(1)
+    count = 3 * CHUNK_SIZE
+    corners = rng.integers(0, 12, (count, 2))
+    sizes = rng.choice([1, 3, 4, 5, 7, 9], (count, 2))
+    boxes = np.concatenate([corners, corners + sizes], axis=1).astype(np.float64)
+    scores = rng.permutation(count) / count
+
+    expected = reference_nms(boxes, scores, iou_threshold)
+    np.testing.assert_array_equal(
+        non_maximum_suppression(boxes, scores, iou_threshold), expected
+    )
+
+
+def test_box_at_the_threshold_is_kept():
+    boxes = np.array([[0, 0, 9, 9], [0, 0, 9, 4]], dtype=np.float32)
+    scores = np.array([0.9, 0.8])
+
+    np.testing.assert_array_equal(non_maximum_suppression(boxes, scores, 0.5), [0, 1])
+    np.testing.assert_array_equal(non_maximum_suppression(boxes, scores, 0.49), [0])
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.int32])
+def test_matches_reference_on_other_types(dtype):
+    rng = np.random.default_rng(2)
+    boxes = random_boxes(rng, 2 * CHUNK_SIZE, 4000, (10, 300)).astype(dtype)
+    scores = (rng.permutation(len(boxes)) / len(boxes)).astype(np.float32)
+
+    expected = reference_nms(boxes, scores, 0.45)
+    np.testing.assert_array_equal(non_maximum_suppression(boxes, scores, 0.45), expected)
+
+
+@pytest.mark.parametrize("extent", [640, 8000])
+def test_class_aware_matches_per_class_reference(extent):
+    # Large frames with many classes push the class offsets far beyond
+    # the precision of float32
+    rng = np.random.default_rng(extent)
+    count = 4 * CHUNK_SIZE + 17
+    boxes = random_boxes(rng, count, extent, (extent / 60, extent / 6))
+    boxes += rng.uniform(0, 1, boxes.shape)
+    scores = rng.permutation(count) / count
+    classes = rng.integers(0, 80, count)
+
+    expected = reference_class_nms(boxes, scores, 0.3, classes)
+    np.testing.assert_array_equal(
+        non_maximum_suppression(boxes, scores, 0.3, classes=classes), expected
+    )
+
+
+def test_class_aware_keeps_sub_pixel_precision():
+    # Pairs of boxes shifted a few hundredths of a pixel away from an IoU
+    # of exactly 0.5 in the last class of a 4K frame, where the class offset
+    # leaves float32 a resolution of 1/16 pixel
+    shifts = 100 / 3 + np.array([-0.02, -0.01, 0.01, 0.02])
+    positions = 3700 + np.arange(10) / 10
+    boxes, classes = [], []
+    for i, (shift, left) in enumerate(itertools.product(shifts, positions)):
+        top = 100.0 * i
+        boxes += [[left, top, left + 99, top + 99], [left + shift, top, left + shift + 99, top + 99]]
+        classes += [79, 79]
+    boxes = np.array(boxes)
+    classes = np.array(classes)
+    # A box of the first class spreads the extent over the whole frame
+    boxes = np.vstack([boxes, [[0, 0, 3839, 2159]]])
+    classes = np.append(classes, 0)
+    scores = np.linspace(1, 0.5, len(boxes))
+
+    expected = reference_class_nms(boxes, scores, 0.5, classes)
+    np.testing.assert_array_equal(
+        non_maximum_suppression(boxes, scores, 0.5, classes=classes), expected
+    )
+
+
+def test_top_k_keeps_only_the_best_boxes():
+    boxes = np.array([[i * 20, 0, i * 20 + 9, 9] for i in range(5)], dtype=np.float32)
+    scores = np.array([0.1, 0.5, 0.3, 0.9, 0.7])
+
+    np.testing.assert_array_equal(
+        non_maximum_suppression(boxes, scores, 0.5, top_k=3), [3, 4, 1]
+    )
+
+
+def test_empty_input():
+    assert len(non_maximum_suppression(np.empty((0, 4)), np.empty(0), 0.5)) == 0
+    keep, kept_scores = soft_nms(np.empty((0, 4)), np.empty(0), 0.5, 0.1)
+    assert len(keep) == 0 and len(kept_scores) == 0
+
+
+def test_soft_nms_decays_overlapping_scores():
+    boxes = np.array([[0, 0, 9, 9], [0, 0, 9, 4], [100, 100, 109, 109]], dtype=np.float32)
+    scores = np.array([0.9, 0.8, 0.7], dtype=np.float32)
+
+    keep, kept_scores = soft_nms(boxes, scores, sigma=0.5, score_threshold=0.1)
+
+    np.testing.assert_array_equal(keep, [0, 2, 1])
+    np.testing.assert_allclose(kept_scores, [0.9, 0.7, 0.8 * np.exp(-0.25 / 0.5)], rtol=1e-6)
+
+
+def test_soft_nms_removes_scores_below_the_threshold():
+    boxes = np.array([[0, 0, 9, 9], [0, 0, 9, 9]], dtype=np.float32)
+    scores = np.array([0.9, 0.5], dtype=np.float32)
+
+    keep, _ = soft_nms(boxes, scores, sigma=0.1, score_threshold=0.2)
+
+    np.testing.assert_array_equal(keep, [0])
+
+
+def test_box_iou_uses_inclusive_pixels():
+    iou = box_iou(np.array([[0, 0, 9, 9]]), np.array([[0, 0, 9, 4], [10, 10, 19, 19]]))
+
+    np.testing.assert_allclose(iou, [[0.5, 0.0]])
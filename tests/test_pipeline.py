@@ -0,0 +1,127 @@
+import random
+import threading
+import time
+
+import pytest
+
+from utils.pipeline import FramePipeline
+
+
+def counter(count):
+    items = iter(range(count))
+    return lambda: next(items, None)
+
+
+def jitter(func):
+    # Random delays make the stages overlap differently on every item
+    def stage(item):
+        time.sleep(random.uniform(0, 0.002))
+        return func(item)
+
+    return stage
+
+
+def test_items_pass_every_stage_in_order():
+    results = []
+    seen = {"double": [], "inc": []}
+
+    def double(x):
+        seen["double"].append(x)
+        return 2 * x
+
+    def inc(x):
+        seen["inc"].append(x)
+        return x + 1
+
+    pipeline = FramePipeline(
+        counter(200),
+        [("double", jitter(double)), ("inc", jitter(inc)), ("collect", results.append)],
+        queue_size=2,
+        is_running=lambda: True,
+    )
+    pipeline.run()
+
+    assert seen["double"] == list(range(200))
+    assert seen["inc"] == [2 * x for x in range(200)]
+    assert results == [2 * x + 1 for x in range(200)]
+
+
+def test_stage_error_is_raised_and_every_item_is_accounted_for():
+    done, dropped = [], []
+    lock = threading.Lock()
+
+    def fail_on_50(x):
+        if x == 50:
+            raise ValueError("bad frame")
+        return x
+
+    def drop(item):
+        with lock:
+            dropped.append(item)
+
+    pipeline = FramePipeline(
+        counter(1000),
+        [("check", fail_on_50), ("slow", jitter(lambda x: x)), ("done", done.append)],
+        queue_size=3,
+        is_running=lambda: True,
+        on_drop=drop,
+    )
+    with pytest.raises(ValueError, match="bad frame"):
+        pipeline.run()
+
+    # The produced items are either processed or dropped, exactly once
+    assert 50 in dropped
+    produced = sorted(done + dropped)
+    assert produced == list(range(len(produced)))
+    assert done == sorted(done)
+    assert all(q.qsize() == 0 for q in pipeline.queues.values())
+
+
+def test_source_error_is_raised():
+    items = iter(range(10))
+
+    def source():
+        item = next(items)
+        if item == 5:
+            raise OSError("stream lost")
+        return item
+
+    results = []
+    pipeline = FramePipeline(source, [("collect", results.append)], 2, lambda: True)
+    with pytest.raises(OSError, match="stream lost"):
+        pipeline.run()
+    assert results == sorted(results)
+
+
+def test_stops_when_not_running():
+    produced = []
+
+    def source():
+        produced.append(len(produced))
+        return produced[-1]
+
+    results = []
+    pipeline = FramePipeline(
+        source, [("collect", results.append)], 2, is_running=lambda: len(produced) < 10
+    )
+    pipeline.run()
+
+    assert results == list(range(10))
+
+
+def test_on_item_reports_queue_depths():
+    depths = []
+    gate = threading.Event()
+    pipeline = FramePipeline(
+        counter(3),
+        [("wait", lambda x: gate.wait(5)), ("end", lambda x: x)],
+        queue_size=5,
+        is_running=lambda: True,
+        on_item=depths.append,
+    )
+    threading.Timer(0.2, gate.set).start()
+    pipeline.run()
+
+    assert len(depths) == 3
+    assert all(set(d) == {"wait", "end"} for d in depths)
+    assert depths[-1]["wait"] >= 1
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from utils.roi import covers_frame, inside_polygon, parse_regions
+
+
+def test_no_regions_means_the_whole_frame():
+    assert parse_regions({}, 640, 480) == []
+    assert covers_frame([], 640, 480)
+
+
+def test_corners_are_up_left_bottom_right():
+    (region,) = parse_regions({"corners": [10, 20, 110, 220]}, 640, 480)
+
+    assert region.box == (20, 10, 220, 110)
+    assert region.polygon is None
+    assert not covers_frame([region], 640, 480)
+
+
+def test_regions_are_clipped_and_empty_ones_skipped():
+    regions = parse_regions(
+        {
+            "corners": [-5, -5, 1000, 1000],
+            "regions": [[500, 700, 600, 800], [[-10, -10], [50, 0], [0, 50]]],
+        },
+        640,
+        480,
+    )
+
+    assert [region.box for region in regions] == [(0, 0, 640, 480), (0, 0, 51, 51)]
+    assert covers_frame(regions, 640, 480)
+
+
+def test_polygon_box_includes_its_last_pixels():
+    (region,) = parse_regions({"regions": [[[10, 20], [30, 20], [30, 40], [10, 40]]]}, 640, 480)
+
+    assert region.box == (10, 20, 31, 41)
+    np.testing.assert_array_equal(region.polygon, [[10, 20], [30, 20], [30, 40], [10, 40]])
+
+
+@pytest.mark.parametrize("shape", [[1, 2, 3], [[1, 2], [3, 4]], [[1, 2, 3], [4, 5, 6], [7, 8, 9]]])
+def test_invalid_regions_are_rejected(shape):
+    with pytest.raises(ValueError):
+        parse_regions({"regions": [shape]}, 640, 480)
+
+
+def test_boxes_inside_polygon_by_center():
+    triangle = np.array([[0, 0], [100, 0], [0, 100]], dtype=np.int32)
+    boxes = np.array(
+        [[10, 10, 30, 30], [60, 60, 80, 80], [40, 40, 60, 60], [-20, -20, 10, 10]],
+        dtype=np.float32,
+    )
+
+    np.testing.assert_array_equal(inside_polygon(boxes, triangle), [True, False, True, False])
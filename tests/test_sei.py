@@ -0,0 +1,176 @@
+import io
+
+import pytest
+
+from utils.sei import (
+    NAL_HEAD_SIZE,
+    SEITimestampReader,
+    parse_sei_timestamp,
+    unescape_rbsp,
+)
+
+START_CODE = b"\x00\x00\x00\x01"
+IDR_HEADER = b"\x65"
+SLICE_HEADER = b"\x41"
+SEI_HEADER = b"\x06"
+FIRST_SLICE = b"\x88\x84"
+"""Slice data starting with first_mb_in_slice = 0, i.e. ue(v) "1"."""
+NEXT_SLICE = b"\x30\x84"
+"""Slice data starting with first_mb_in_slice = 5, i.e. ue(v) "00110"."""
+
+
+def escape(rbsp: bytes) -> bytes:
+    """
+    Inserts the emulation prevention bytes an encoder writes.
+    """
+    out = bytearray()
+    zeros = 0
+    for byte in rbsp:
+        if zeros >= 2 and byte <= 3:
+            out.append(3)
+            zeros = 0
+        out.append(byte)
+        zeros = zeros + 1 if byte == 0 else 0
+    return bytes(out)
+
+
+def sei(timestamp: int) -> bytes:
+    payload = timestamp.to_bytes(8, "little", signed=True)
+    return START_CODE + SEI_HEADER + escape(b"\x05" + bytes([len(payload)]) + payload + b"\x80")
+
+
+def slice_nal(first: bool = True, idr: bool = False, size: int = 200) -> bytes:
+    header = IDR_HEADER if idr else SLICE_HEADER
+    data = FIRST_SLICE if first else NEXT_SLICE
+    return START_CODE + header + data + bytes(range(1, 256))[:size]
+
+
+def read_all(stream: bytes, pictures: int, chunk_size: int = 1 << 16) -> list:
+    """
+    Requests the timestamps of the pictures in order, like the decoded frames do.
+    """
+    reader = SEITimestampReader(io.BufferedReader(io.BytesIO(stream)), chunk_size)
+    timestamps = [reader.timestamp(picture, timeout=5) for picture in range(pictures)]
+    reader.close()
+    return timestamps
+
+
+def test_unescape_removes_emulation_prevention_bytes():
+    escaped = b"\x06\x00\x00\x03\x01\x00\x00\x03\x00"
+    assert unescape_rbsp(escaped) == b"\x06\x00\x00\x01\x00\x00\x00"
+    assert unescape_rbsp(b"\x06\x01\x02\x03") == b"\x06\x01\x02\x03"
+
+
+def test_parse_timestamp():
+    assert parse_sei_timestamp(sei(1_700_000_000)[4:]) == 1_700_000_000
+
+
+def test_parse_timestamp_with_emulation_prevention():
+    # The little-endian bytes 01 00 00 00 03 00 00 00 contain zero runs
+    # the encoder must escape
+    timestamp = (3 << 32) + 1
+    nal = sei(timestamp)[4:]
+    assert b"\x00\x00\x03" in nal
+
+    assert parse_sei_timestamp(nal) == timestamp
+
+
+@pytest.mark.parametrize(
+    "nal",
+    [
+        SEI_HEADER,
+        SEI_HEADER + b"\x05\x02\x01\x02\x80",
+        SEI_HEADER + b"\x05\x08" + (-1).to_bytes(8, "little", signed=True),
+        SEI_HEADER + b"\x05\x08" + (10**12).to_bytes(8, "little", signed=True),
+    ],
+    ids=["empty", "short", "negative", "far-future"],
+)
+def test_parse_no_timestamp(nal):
+    assert parse_sei_timestamp(nal) is None
+
+
+def test_reader_assigns_timestamps_to_pictures():
+    stream = (
+        sei(1_700_000_000) + slice_nal(idr=True)
+        + sei(1_700_000_001) + slice_nal()
+        + sei(1_700_000_002) + slice_nal()
+    )
+
+    assert read_all(stream, 3) == [1_700_000_000, 1_700_000_001, 1_700_000_002]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 64])
+def test_reader_handles_any_chunk_boundaries(chunk_size):
+    timestamp = (3 << 32) + 1
+    stream = sei(timestamp) + slice_nal(idr=True) + sei(timestamp + 1) + slice_nal()
+
+    assert read_all(stream, 2, chunk_size) == [timestamp, timestamp + 1]
+
+
+def test_reader_counts_multi_slice_pictures_once():
+    stream = (
+        sei(1_700_000_000)
+        + slice_nal(idr=True)
+        + slice_nal(first=False, idr=True)
+        + slice_nal(first=False, idr=True)
+        + sei(1_700_000_001)
+        + slice_nal()
+        + slice_nal(first=False)
+    )
+
+    assert read_all(stream, 2) == [1_700_000_000, 1_700_000_001]
+
+
+def test_picture_without_sei_keeps_the_last_timestamp():
+    stream = sei(1_700_000_000) + slice_nal(idr=True) + slice_nal() + slice_nal()
+
+    assert read_all(stream, 3) == [1_700_000_000] * 3
+
+
+def test_sei_without_timestamp_keeps_the_last_timestamp():
+    stream = (
+        sei(1_700_000_000) + slice_nal(idr=True)
+        + START_CODE + SEI_HEADER + b"\x05\x02\x01\x02\x80" + slice_nal()
+    )
+
+    assert read_all(stream, 2) == [1_700_000_000, 1_700_000_000]
+
+
+def test_pictures_before_the_first_timestamp_have_none():
+    stream = slice_nal(idr=True) + sei(1_700_000_000) + slice_nal()
+
+    assert read_all(stream, 2) == [None, 1_700_000_000]
+
+
+def test_large_slices_are_parsed_from_their_head():
+    stream = (
+        sei(1_700_000_000) + slice_nal(idr=True, size=10 * NAL_HEAD_SIZE)
+        + sei(1_700_000_001) + slice_nal(size=10 * NAL_HEAD_SIZE)
+    )
+
+    timestamps = read_all(stream, 2, chunk_size=NAL_HEAD_SIZE // 2)
+    assert timestamps == [1_700_000_000, 1_700_000_001]
+
+
+def test_pictures_are_numbered_in_decoding_order():
+    # The documented limitation: with B-frames the decoding order I P B
+    # differs from the display order I B P, and the reader still numbers
+    # the pictures as they are coded, so the display order gets
+    # the timestamps of P and B swapped
+    i_time, p_time, b_time = 1_700_000_000, 1_700_000_002, 1_700_000_001
+    stream = (
+        sei(i_time) + slice_nal(idr=True)
+        + sei(p_time) + slice_nal()
+        + sei(b_time) + slice_nal()
+    )
+
+    assert read_all(stream, 3) == [i_time, p_time, b_time]
+
+
+def test_picture_after_the_end_has_none():
+    stream = sei(1_700_000_000) + slice_nal(idr=True)
+    reader = SEITimestampReader(io.BufferedReader(io.BytesIO(stream)))
+
+    assert reader.timestamp(0, timeout=5) == 1_700_000_000
+    assert reader.timestamp(5, timeout=0.1) is None
+    reader.close()
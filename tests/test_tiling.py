@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from utils.tiling import TileSelector, make_tiles
+
+
+@pytest.mark.parametrize("width, height", [(1920, 1080), (3840, 2160), (1001, 777)])
+@pytest.mark.parametrize("grid", [(2, 2), (3, 2), (4, 3)])
+@pytest.mark.parametrize("overlap", [0.0, 0.1, 0.25])
+def test_tiles_cover_the_frame_with_the_overlap(width, height, grid, overlap):
+    tiles = make_tiles(width, height, grid, overlap)
+    columns, rows = grid
+
+    assert len(tiles) == columns * rows
+    assert len({(right - left, bottom - top) for left, top, right, bottom in tiles}) == 1
+    lefts = sorted({tile[0] for tile in tiles})
+    rights = sorted({tile[2] for tile in tiles})
+    assert lefts[0] == 0 and rights[-1] == width
+    assert max(tile[3] for tile in tiles) == height
+    tile_width = rights[0] - lefts[0]
+    for right, next_left in zip(rights, lefts[1:]):
+        assert right - next_left >= overlap * tile_width - 1
+
+
+def test_single_tile_is_the_frame():
+    assert make_tiles(640, 480, (1, 1), 0.2) == [(0, 0, 640, 480)]
+
+
+TILES = make_tiles(200, 100, (2, 1), 0.0)
+
+
+def test_all_tiles_without_adaptive():
+    selector = TileSelector(TILES, adaptive=False, track_frames=2, scan_frames=10)
+
+    assert [selector.select() for _ in range(3)] == [TILES] * 3
+
+
+def test_adaptive_selects_the_tiles_of_recent_objects():
+    selector = TileSelector(TILES, adaptive=True, track_frames=2, scan_frames=10)
+
+    # The first frame scans every tile, nothing is known yet after it
+    assert selector.select() == TILES
+    assert selector.select() == []
+
+    selector.update([[140, 20, 160, 40, 1, 0.9]])
+    assert selector.select() == [TILES[1]]
+    selector.update([])
+    assert selector.select() == [TILES[1]]
+    selector.update([])
+    # The object left the last `track_frames` frames
+    assert selector.select() == []
+
+
+def test_adaptive_scans_every_tile_periodically():
+    selector = TileSelector(TILES, adaptive=True, track_frames=1, scan_frames=3)
+    selected = []
+    for _ in range(7):
+        selected.append(selector.select())
+        selector.update([])
+
+    assert [tiles == TILES for tiles in selected] == [True, False, False] * 2 + [True]
+
+
+def test_object_on_the_border_belongs_to_the_tile_of_its_center():
+    selector = TileSelector(TILES, adaptive=True, track_frames=1, scan_frames=10)
+    selector.select()
+    selector.update(np.array([[90, 0, 130, 10]]))
+
+    assert selector.select() == [TILES[1]]
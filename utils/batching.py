@@ -0,0 +1,204 @@
+import time
+from collections import OrderedDict, deque
+from threading import Condition, Thread, get_ident
+from typing import Callable, Hashable
+
+import numpy as np
+
+from utils.dataclasses import BatchRequest
+
+
+class BatchScheduler:
+    """
+    Gathers the images that the running tasks pass to the neural network
+    into batches, so the model runs once for all of them.
+
+    A batch is started as soon as it has `max_batch_size` images or
+    the oldest waiting request has waited for `max_wait_ms`. Requests are
+    taken from the callers in turn, one request per caller in a round,
+    and the callers served last go first in the next batch, so a busy task
+    does not push the others out of the batches. The images of one request
+    always go into the same batch.
+
+    Parameters
+    ----------
+    run : Callable[[np.ndarray], np.ndarray]
+        Runs the model on a batch and returns its outputs in the same order.
+    max_batch_size : int
+        The maximum number of images in a batch (a larger request
+        is run alone).
+    max_wait_ms : float
+        The maximum time a request waits for other ones in milliseconds.
+    """
+
+    def __init__(
+        self,
+        run: Callable[[np.ndarray], np.ndarray],
+        max_batch_size: int,
+        max_wait_ms: float,
+    ) -> None:
+        self.run = run
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._queues: OrderedDict[Hashable, deque[BatchRequest]] = OrderedDict()
+        self._pending = 0
+        self._closed = False
+        self._condition = Condition()
+        self._buffer: np.ndarray | None = None
+
+        self._batches = 0
+        self._images = 0
+        self._delay_total = 0.0
+        self._delay_max = 0.0
+        self._last_batch_size = 0
+
+        self._thread = Thread(target=self._serve, name="batch-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, images: np.ndarray, key: Hashable | None = None) -> np.ndarray:
+        """
+        Passes images to the model in the next batch and waits for the outputs.
+
+        Parameters
+        ----------
+        images : np.ndarray
+            The prepared images. They must not be changed until the call returns.
+        key : Hashable | None, optional
+            The caller the request is fair to, e.g. a task
+            (default is the calling thread).
+
+        Returns
+        -------
+        np.ndarray
+            The outputs of the model for the images.
+        """
+        request = BatchRequest(images=images, submitted=time.perf_counter())
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The batch scheduler is closed")
+            key = get_ident() if key is None else key
+            self._queues.setdefault(key, deque()).append(request)
+            self._pending += len(images)
+            self._condition.notify_all()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.output
+
+    def stats(self) -> dict:
+        """
+        Returns the batch sizes and the queueing delays so far.
+
+        Returns
+        -------
+        dict
+            The number of batches and images, the mean and the last batch size,
+            the mean and the maximum time a request waited in milliseconds.
+        """
+        with self._condition:
+            batches = self._batches
+            return {
+                "batches": batches,
+                "images": self._images,
+                "mean_batch_size": round(self._images / batches, 2) if batches else 0,
+                "last_batch_size": self._last_batch_size,
+                "mean_queue_delay_ms": (
+                    round(1000 * self._delay_total / batches, 2) if batches else 0
+                ),
+                "max_queue_delay_ms": round(1000 * self._delay_max, 2),
+            }
+
+    def close(self) -> None:
+        """
+        Stops the scheduler after the waiting requests are served.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout=5)
+
+    def _collect(self) -> list[BatchRequest]:
+        with self._condition:
+            self._condition.wait_for(lambda: self._pending or self._closed)
+            if not self._pending:
+                return []
+            oldest = min(queue[0].submitted for queue in self._queues.values() if queue)
+            deadline = oldest + self.max_wait
+            while self._pending < self.max_batch_size and not self._closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            requests: list[BatchRequest] = []
+            size = 0
+            taken = True
+            while taken:
+                taken = False
+                for key in list(self._queues):
+                    queue = self._queues[key]
+                    if not queue:
+                        del self._queues[key]
+                        continue
+                    count = len(queue[0].images)
+                    if requests and size + count > self.max_batch_size:
+                        continue
+                    requests.append(queue.popleft())
+                    size += count
+                    taken = True
+                    # The caller goes to the end of the turn
+                    self._queues.move_to_end(key)
+                    if size >= self.max_batch_size:
+                        break
+                if size >= self.max_batch_size:
+                    break
+            self._pending -= size
+            return requests
+
+    def _batch(self, requests: list[BatchRequest]) -> np.ndarray:
+        if len(requests) == 1:
+            return requests[0].images
+        size = sum(len(request.images) for request in requests)
+        shape = (size, *requests[0].images.shape[1:])
+        dtype = requests[0].images.dtype
+        buffer = self._buffer
+        if (
+            buffer is None
+            or len(buffer) < size
+            or buffer.shape[1:] != shape[1:]
+            or buffer.dtype != dtype
+        ):
+            buffer = self._buffer = np.empty(
+                (max(size, self.max_batch_size), *shape[1:]), dtype=dtype
+            )
+        return np.concatenate([request.images for request in requests], out=buffer[:size])
+
+    def _serve(self) -> None:
+        while True:
+            requests = self._collect()
+            if not requests:
+                return
+            start = time.perf_counter()
+            try:
+                outputs = self.run(self._batch(requests))
+            except BaseException as e:
+                for request in requests:
+                    request.error = e
+                    request.done.set()
+                continue
+
+            position = 0
+            delays = []
+            for request in requests:
+                count = len(request.images)
+                request.output = outputs[position : position + count]
+                position += count
+                delays.append(start - request.submitted)
+                request.done.set()
+
+            with self._condition:
+                self._batches += 1
+                self._images += position
+                self._last_batch_size = position
+                self._delay_total += sum(delays) / len(delays)
+                self._delay_max = max(self._delay_max, *delays)
@@ -0,0 +1,142 @@
+import numpy as np
+
+from utils.nms import box_iou
+
+
+class DetectorCascade:
+    """
+    Decides when the detections of a light model are not enough
+    and a heavy model has to process the frame again.
+
+    The heavy model is called when the light one finds an object with
+    a score below `accept_th` (its own confidence threshold is the lower
+    edge of this uncertainty band), when it finds an object that does
+    not overlap any tracked one, so that new tracks start from reliable
+    boxes, and every `refresh_frames` frames.
+
+    Parameters
+    ----------
+    light : str
+        The name of the light model.
+    accept_th : float
+        The score from which the detections of the light model are accepted.
+    refresh_frames : int
+        The maximum number of frames in a row without the heavy model.
+    new_object_iou : float, optional
+        The overlap with tracked objects below which a detection is
+        a new object (default is 0.3).
+    """
+
+    REASONS = ("uncertain", "new_object", "refresh")
+    """The reasons to call the heavy model."""
+
+    def __init__(
+        self,
+        light: str,
+        accept_th: float,
+        refresh_frames: int,
+        new_object_iou: float = 0.3,
+    ) -> None:
+        self.light = light
+        self.accept_th = accept_th
+        self.refresh_frames = max(1, refresh_frames)
+        self.new_object_iou = new_object_iou
+        self._tracked = np.empty((0, 4), dtype=np.float32)
+        self._light_frames = 0
+        self._frames = 0
+        self._reasons = dict.fromkeys(self.REASONS, 0)
+        self._light_sec = 0.0
+        self._heavy_sec = 0.0
+        self._heavy_frames = 0
+
+    def escalate(self, boxes: np.ndarray | None, scores: np.ndarray | None) -> str | None:
+        """
+        Checks the detections of the light model in a frame.
+
+        Parameters
+        ----------
+        boxes, scores : np.ndarray | None
+            The boxes [x_min, y_min, x_max, y_max] and the scores
+            of the light model, None if it found nothing.
+
+        Returns
+        -------
+        str | None
+            The reason to process the frame with the heavy model,
+            or None if the detections of the light model are accepted.
+        """
+        self._frames += 1
+        reason = None
+        if self._light_frames >= self.refresh_frames:
+            reason = "refresh"
+        elif boxes is not None and len(boxes):
+            if np.any(scores < self.accept_th):
+                reason = "uncertain"
+            elif not len(self._tracked) or np.any(
+                box_iou(boxes, self._tracked).max(axis=1)
+                < self.new_object_iou
+            ):
+                reason = "new_object"
+
+        if reason is None:
+            self._light_frames += 1
+        else:
+            self._light_frames = 0
+            self._reasons[reason] += 1
+        return reason
+
+    def record(self, light_sec: float, heavy_sec: float | None) -> None:
+        """
+        Remembers the time the models spent on a frame.
+
+        Parameters
+        ----------
+        light_sec : float
+            The time of the light model in seconds.
+        heavy_sec : float | None
+            The time of the heavy model in seconds, None if it did not run.
+        """
+        self._light_sec += light_sec
+        if heavy_sec is not None:
+            self._heavy_sec += heavy_sec
+            self._heavy_frames += 1
+
+    def update(self, result: list) -> None:
+        """
+        Remembers the objects tracked in a frame.
+
+        Parameters
+        ----------
+        result : list
+            The tracked objects, each starting with its box
+            [x_min, y_min, x_max, y_max].
+        """
+        self._tracked = np.array(
+            [det[:4] for det in result], dtype=np.float32
+        ).reshape(-1, 4)
+
+    def stats(self) -> dict:
+        """
+        Returns the escalations and the compute saved so far.
+
+        Returns
+        -------
+        dict
+            The number of frames, the frames processed by the heavy model
+            by reason, the share of them, and the share of the time the heavy
+            model would have spent on every frame that is saved, estimated
+            from the measured times of both models.
+        """
+        escalated = sum(self._reasons.values())
+        stats = {
+            "frames": self._frames,
+            "escalated": escalated,
+            **self._reasons,
+            "escalation_rate": round(escalated / self._frames, 3) if self._frames else 0,
+        }
+        if self._heavy_frames:
+            heavy_only = self._heavy_sec / self._heavy_frames * self._frames
+            stats["compute_saved"] = round(
+                1 - (self._light_sec + self._heavy_sec) / heavy_only, 3
+            )
+        return stats
@@ -1,5 +1,10 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import IntEnum
+from subprocess import Popen
+from threading import Event
+from typing import Any
+
+import numpy as np
 
 
 class StatusTask(IntEnum):
@@ -31,3 +36,128 @@ class TaskParameters:
     """The video processing progress of the running task."""
     ts_last_processed: float = 0
     """The timestamp of the last processed frame for the running task."""
+    metrics: dict[str, Any] = field(default_factory=dict)
+    """Runtime metrics of the running task (queue depths, timings and so on)."""
+
+
+@dataclass
+class FramePacket:
+    """A single frame passing through the stages of the inference cycle."""
+
+    frame: np.ndarray | None
+    """The decoded frame."""
+    timestamp: int
+    """The timestamp of the frame."""
+    boxes: np.ndarray | None = None
+    """The bounding boxes found by the detector."""
+    classes: np.ndarray | None = None
+    """The classes of the found objects."""
+    scores: np.ndarray | None = None
+    """The confidence of the found objects."""
+    result: list = field(default_factory=list)
+    """The tracked objects of the frame."""
+    model_frame: np.ndarray | None = None
+    """The frame already letterboxed to the model input by the frame source."""
+    frame_buffer: Any = None
+    """The `FrameBuffer` that holds `frame`, if it came from a frame pool."""
+    model_buffer: Any = None
+    """The `FrameBuffer` that holds `model_frame`, if it came from a frame pool."""
+    skipped: int = 0
+    """The number of frames of the source dropped right before this one."""
+
+    def release_frame(self) -> None:
+        """Returns the buffer of `frame` to its pool."""
+        if self.frame_buffer is not None:
+            self.frame_buffer.release()
+            self.frame_buffer = None
+        self.frame = None
+
+    def release_model_frame(self) -> None:
+        """Returns the buffer of `model_frame` to its pool."""
+        if self.model_buffer is not None:
+            self.model_buffer.release()
+            self.model_buffer = None
+        self.model_frame = None
+
+    def release(self) -> None:
+        """Returns all the buffers of the packet to their pools."""
+        self.release_frame()
+        self.release_model_frame()
+
+
+@dataclass(frozen=True)
+class LetterboxGeometry:
+    """The resize and padding that fit a frame into the model input."""
+
+    ratio: float
+    """The scaling ratio (new / old)."""
+    new_unpad: tuple[int, int]
+    """The width and height of the resized frame without padding."""
+    dwdh: tuple[float, float]
+    """The padding in width and height on each side."""
+    border: tuple[int, int, int, int]
+    """The top, bottom, left and right padding in pixels."""
+    new_shape: tuple[int, int]
+    """The height and width of the model input."""
+
+
+@dataclass
+class RegionOfInterest:
+    """A part of the frame where objects are detected."""
+
+    box: tuple[int, int, int, int]
+    """The left, top, right and bottom edges of the cropped rectangle."""
+    polygon: np.ndarray | None = None
+    """The vertices (x, y) of the region within the frame, if it is not the rectangle."""
+
+
+@dataclass
+class InferenceCycleContext:
+    """The resources of a running inference cycle shared by its stages."""
+
+    task_id: int
+    """The ID of the video processing task."""
+    properties: dict
+    """Additional parameters for processing."""
+    params: Any
+    """The `InferenceCycleParameters` of the task."""
+    source: Any
+    """The `FrameSource` that decodes the video stream."""
+    write_process: Popen | None = None
+    """The ffmpeg process that records the annotated video."""
+    session: Any = None
+    """The `RequestPostData` thread that sends frames in realtime mode."""
+    fps_start_time: float = 0
+    """The beginning of the current FPS measurement window."""
+    fps_counter: int = 0
+    """The number of frames output in the current FPS measurement window."""
+    geometry: LetterboxGeometry | None = None
+    """The letterbox of the model frames produced by the frame source."""
+    start_time: float = 0
+    """The time the inference cycle started, for the time to the first frame."""
+    regions: list[RegionOfInterest] = field(default_factory=list)
+    """The regions of interest, objects are detected only inside them."""
+    tiles: Any = None
+    """The `TileSelector` of the tiled detection mode, if it is enabled."""
+    frame_rate: Any = None
+    """The `AdaptiveFrameRate` of the task, if the analysis rate follows the scene."""
+    motion: Any = None
+    """The `MotionGate` of the task, if static frames skip the neural network."""
+    cascade: Any = None
+    """The `DetectorCascade` of the task, if a light model detects on most frames."""
+
+
+@dataclass
+class BatchRequest:
+    """The images of one caller waiting for `BatchScheduler`."""
+
+    images: np.ndarray
+    """The prepared images, the first axis is the batch."""
+    submitted: float
+    """The time the request was made (`time.perf_counter`)."""
+    done: Event = field(default_factory=Event)
+    """It is set when the output or the error is ready."""
+    output: np.ndarray | None = None
+    """The outputs of the model for the images."""
+    error: BaseException | None = None
+    """The error raised by the model."""
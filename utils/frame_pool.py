@@ -0,0 +1,212 @@
+from queue import Empty, Queue
+from threading import Lock
+from typing import BinaryIO
+
+import numpy as np
+
+ACQUIRE_TIMEOUT = 30.0
+"""The time in seconds to wait for a free buffer before giving up."""
+
+
+class FrameBuffer:
+    """
+    A preallocated frame owned by a `FramePool`.
+
+    A buffer is handed out with one reference. Every additional consumer
+    that keeps the frame beyond the current stage takes its own reference
+    with `retain` and gives it back with `release`. When the last
+    reference is released, the buffer returns to the pool and its memory
+    is reused for a new frame.
+
+    Parameters
+    ----------
+    pool : FramePool
+        The pool that owns the buffer.
+    array : np.ndarray
+        The preallocated memory of the frame.
+    """
+
+    def __init__(self, pool: "FramePool", array: np.ndarray) -> None:
+        self.pool = pool
+        self.array = array
+        """The frame data."""
+        self._refs = 0
+        self._lock = Lock()
+
+    def retain(self) -> "FrameBuffer":
+        """
+        Takes an additional reference to the buffer.
+
+        Returns
+        -------
+        FrameBuffer
+            The buffer itself.
+        """
+        with self._lock:
+            if self._refs <= 0:
+                raise RuntimeError("The frame buffer was already released")
+            self._refs += 1
+        return self
+
+    def release(self) -> None:
+        """
+        Gives back a reference to the buffer and returns it to the pool
+        when it was the last one.
+        """
+        with self._lock:
+            if self._refs <= 0:
+                raise RuntimeError("The frame buffer was already released")
+            self._refs -= 1
+            last = self._refs == 0
+        if last:
+            self.pool._recycle(self)
+
+    def _acquired(self) -> "FrameBuffer":
+        with self._lock:
+            self._refs = 1
+        return self
+
+
+class FramePool:
+    """
+    A fixed ring of preallocated frames. Frames are read straight into
+    the buffers of the pool, so decoding a stream does not allocate
+    memory per frame.
+
+    Parameters
+    ----------
+    shape : tuple[int, ...]
+        The shape of every frame, e.g. (height, width, 3).
+    size : int
+        The number of buffers. When all of them are in use, `acquire` waits
+        for one to be released, which also limits how far decoding can run
+        ahead of processing, and fails if none is released in time.
+    dtype : np.dtype, optional
+        The data type of the frames (default is np.uint8).
+    """
+
+    def __init__(self, shape: tuple[int, ...], size: int, dtype=np.uint8) -> None:
+        self.shape = tuple(shape)
+        self.dtype = dtype
+        self.size = 0
+        self._free: Queue[FrameBuffer] = Queue()
+        self._excess = 0
+        """The number of buffers in use to be discarded when they are released."""
+        self._lock = Lock()
+        self.grow(size)
+
+    def grow(self, count: int) -> None:
+        """
+        Adds buffers to the pool, e.g. for a new consumer of its frames.
+
+        Parameters
+        ----------
+        count : int
+            The number of buffers to add.
+        """
+        for _ in range(count):
+            self._free.put(FrameBuffer(self, np.empty(self.shape, dtype=self.dtype)))
+        with self._lock:
+            self.size += count
+
+    def shrink(self, count: int) -> None:
+        """
+        Removes buffers from the pool, e.g. when a consumer of its frames
+        leaves. The buffers that are in use are removed when they are released.
+
+        Parameters
+        ----------
+        count : int
+            The number of buffers to remove.
+        """
+        with self._lock:
+            self.size -= count
+            self._excess += count
+            while self._excess:
+                try:
+                    self._free.get_nowait()
+                except Empty:
+                    break
+                self._excess -= 1
+
+    def _recycle(self, buffer: FrameBuffer) -> None:
+        with self._lock:
+            if self._excess:
+                self._excess -= 1
+                return
+        self._free.put(buffer)
+
+    @property
+    def free(self) -> int:
+        """The number of buffers that are not in use."""
+        return self._free.qsize()
+
+    def acquire(self, timeout: float | None = ACQUIRE_TIMEOUT) -> FrameBuffer:
+        """
+        Takes a free buffer from the pool, waiting for one if necessary.
+
+        Parameters
+        ----------
+        timeout : float | None, optional
+            The maximum time to wait in seconds, None to wait forever
+            (default is `ACQUIRE_TIMEOUT`). The buffers are only held while
+            a frame is processed, so a pool that stays empty that long has
+            lost a buffer that was never released.
+
+        Returns
+        -------
+        FrameBuffer
+            The buffer holding one reference.
+
+        Raises
+        ------
+        RuntimeError
+            If no buffer was released within the timeout.
+        """
+        try:
+            buffer = self._free.get(timeout=timeout)
+        except Empty:
+            raise RuntimeError(
+                f"No frame buffer was released in {timeout} s, all {self.size} "
+                "are in use, a frame was probably not released"
+            ) from None
+        return buffer._acquired()
+
+    def readinto(
+        self, pipe: BinaryIO, timeout: float | None = ACQUIRE_TIMEOUT
+    ) -> FrameBuffer | None:
+        """
+        Reads the next frame from a pipe into a free buffer.
+
+        Parameters
+        ----------
+        pipe : BinaryIO
+            A binary stream of raw frames, e.g. the stdout of an ffmpeg process.
+        timeout : float | None, optional
+            The maximum time to wait for a free buffer (see `acquire`).
+
+        Returns
+        -------
+        FrameBuffer | None
+            The buffer holding the frame, or None if the stream ended
+            before a whole frame was read.
+
+        Raises
+        ------
+        RuntimeError
+            If no buffer was released within the timeout.
+        """
+        buffer = self.acquire(timeout)
+        view = memoryview(buffer.array).cast("B")
+        filled = 0
+        while filled < len(view):
+            count = pipe.readinto(view[filled:])
+            if not count:
+                break
+            filled += count
+        view.release()
+
+        if filled < buffer.array.nbytes:
+            buffer.release()
+            return None
+        return buffer
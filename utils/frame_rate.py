@@ -0,0 +1,77 @@
+class AdaptiveFrameRate:
+    """
+    Chooses the analysis frame rate of a task by the activity in the scene.
+
+    Any detection or tracked object raises the rate to `max_rate` at once.
+    After `hold_sec` seconds of the stream without them the rate halves
+    every `decay_sec` seconds down to `min_rate`, so a short occlusion does
+    not break the tracks, and an empty scene costs a few frames per second.
+    The time is counted in the stream, not in the wall clock, so files
+    processed faster than realtime behave like streams.
+
+    Parameters
+    ----------
+    fps : float
+        The frame rate of the frames read from the source.
+    min_rate : float
+        The analysis frame rate of an empty scene.
+    max_rate : float
+        The analysis frame rate while there are objects.
+    hold_sec : float
+        The time the rate stays at the maximum after the last object.
+    decay_sec : float
+        The time it takes the rate to halve after that.
+    """
+
+    def __init__(
+        self,
+        fps: float,
+        min_rate: float,
+        max_rate: float,
+        hold_sec: float,
+        decay_sec: float,
+    ) -> None:
+        self.fps = fps
+        self.max_rate = min(max_rate, fps)
+        self.min_rate = min(min_rate, self.max_rate)
+        self.hold_sec = hold_sec
+        self.decay_sec = max(decay_sec, 1e-3)
+        self.rate = self.max_rate
+        """The current analysis frame rate."""
+        self._idle_sec = 0.0
+
+    def interval(self) -> float:
+        """
+        Returns the number of source frames between the analyzed ones.
+
+        Returns
+        -------
+        float
+            The frame interval at the current rate, at least 1.
+        """
+        return max(1.0, self.fps / self.rate)
+
+    def update(self, active: bool) -> float:
+        """
+        Takes the activity in the last analyzed frame into account.
+
+        Parameters
+        ----------
+        active : bool
+            Whether there were detections or tracked objects in the frame.
+
+        Returns
+        -------
+        float
+            The analysis frame rate for the next frames.
+        """
+        if active:
+            self._idle_sec = 0.0
+            self.rate = self.max_rate
+            return self.rate
+
+        # The frame covered the stream time until the next analyzed one
+        self._idle_sec += self.interval() / self.fps
+        decay = max(0.0, self._idle_sec - self.hold_sec) / self.decay_sec
+        self.rate = max(self.min_rate, self.max_rate * 0.5**decay)
+        return self.rate
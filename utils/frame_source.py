@@ -0,0 +1,1052 @@
+import json
+import os
+import re
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_right
+from fractions import Fraction
+from subprocess import (
+    PIPE,
+    CalledProcessError,
+    Popen,
+    SubprocessError,
+    TimeoutExpired,
+    run,
+)
+
+import cv2
+import ffmpeg
+
+from schemas.inference_parameters import FFprobeParameters
+from utils.dataclasses import FramePacket, LetterboxGeometry
+from utils.frame_pool import FrameBuffer, FramePool
+from utils.sei import SEITimestampReader
+
+
+VIDEO_STREAM_RE = re.compile(r"Stream #\d+:\d+.*?: Video: (\w+).*")
+"""Matches the description of a video stream in the log of ffmpeg."""
+
+PROBE_CACHE_SIZE = 256
+"""The maximum number of files whose parameters are kept by `probe_cached`."""
+
+IMAGE_EXTENSIONS = (".bmp", ".jpeg", ".jpg", ".png", ".tif", ".tiff", ".webp")
+"""The file extensions read by `ImageDirectorySource`."""
+
+
+class FrameSource(ABC):
+    """
+    The source of the frames of the inference cycle.
+
+    A source decodes a video (or reads still images) straight into
+    the buffers of its frame pools and hands out the frames as
+    `FramePacket` objects with the frame, the frame letterboxed to
+    the model input (if requested) and the timestamp filled in.
+
+    The optional features are only requested from the backends
+    that declare them with the `supports_*` class attributes.
+
+    Parameters
+    ----------
+    url : str
+        The URL or path of the video.
+    params : FFprobeParameters
+        The parameters of the video returned by `probe`.
+    pool_size : int
+        The number of preallocated frames of each pool.
+    task_id : int, optional
+        The ID of the video processing task (default is 0).
+    output_fps : float | None, optional
+        If set, the source drops frames itself and only outputs frames
+        at this rate (default is None). Requires `supports_subsample`.
+    geometry : LetterboxGeometry | None, optional
+        If set, the source also outputs RGB frames resized and padded
+        to the model input with this geometry (default is None).
+        Requires `supports_model_branch`.
+    full_frame : bool, optional
+        Whether the source outputs full resolution bgr24 frames.
+        Only used together with `geometry` (default is True).
+    sei_timestamps : bool, optional
+        Whether to take the timestamps from the SEI of an H.264 stream
+        (default is False). Requires `supports_sei`.
+    """
+
+    name: str = ""
+    """The name of the backend in the `frame_source` option of the config."""
+    supports_subsample: bool = False
+    """Whether the source can drop frames itself (`output_fps`)."""
+    supports_model_branch: bool = False
+    """Whether the source can letterbox frames to the model input (`geometry`)."""
+    supports_sei: bool = False
+    """Whether the source can read SEI timestamps (`sei_timestamps`)."""
+
+    def __init__(
+        self,
+        url: str,
+        params: FFprobeParameters,
+        pool_size: int,
+        task_id: int = 0,
+        output_fps: float | None = None,
+        geometry: LetterboxGeometry | None = None,
+        full_frame: bool = True,
+        sei_timestamps: bool = False,
+    ) -> None:
+        if output_fps is not None and not self.supports_subsample:
+            raise ValueError(f"The {self.name} frame source can't subsample frames")
+        if geometry is not None and not self.supports_model_branch:
+            raise ValueError(f"The {self.name} frame source can't letterbox frames")
+        if sei_timestamps and not self.supports_sei:
+            raise ValueError(f"The {self.name} frame source can't read SEI timestamps")
+
+        self.url = url
+        self.params = params
+        self.task_id = task_id
+        self.output_fps = output_fps
+        self.geometry = geometry
+        self.full_frame = geometry is None or full_frame
+        self.sei_timestamps = sei_timestamps
+
+        self.frame_pool: FramePool | None = None
+        """The pool of full resolution bgr24 frames."""
+        if self.full_frame:
+            self.frame_pool = FramePool((params.height, params.width, 3), pool_size)
+        self.model_pool: FramePool | None = None
+        """The pool of RGB frames letterboxed to the model input."""
+        if geometry is not None:
+            self.model_pool = FramePool((*geometry.new_shape, 3), pool_size)
+
+    @staticmethod
+    def _make_params(
+        width: int,
+        height: int,
+        fps: float,
+        duration: float,
+        framerate: float,
+        codec: str = "",
+    ) -> FFprobeParameters:
+        return FFprobeParameters(
+            width=width,
+            height=height,
+            fps=fps,
+            frame_interval=fps / framerate,
+            duration=duration,
+            codec=codec,
+        )
+
+    @classmethod
+    @abstractmethod
+    def probe(
+        cls,
+        url: str,
+        framerate: float,
+        default_duration: float,
+        timeout: float | None = None,
+    ) -> FFprobeParameters:
+        """
+        Reads the parameters of the video.
+
+        Parameters
+        ----------
+        url : str
+            The URL or path of the video.
+        framerate : float
+            The desired analysis frame rate, used for the frame interval.
+        default_duration : float
+            The duration used if the video doesn't have one (e.g. a stream).
+        timeout : float | None, optional
+            The maximum time to open the video in seconds (default is no limit).
+
+        Raises
+        ------
+        RuntimeError
+            If the video can't be opened in time.
+
+        Returns
+        -------
+        FFprobeParameters
+            The parameters of the video.
+        """
+
+    @abstractmethod
+    def read(self) -> FramePacket | None:
+        """
+        Reads the next frame.
+
+        Returns
+        -------
+        FramePacket | None
+            The packet with the frame buffers and the timestamp,
+            or None if the video has ended or the frame is broken.
+            The caller must release the buffers of the packet.
+        """
+
+    @abstractmethod
+    def close(self) -> None:
+        """
+        Stops decoding and frees the resources of the source.
+        """
+
+    def stats(self) -> dict:
+        """
+        Returns the runtime statistics of the source for the task metrics.
+
+        Returns
+        -------
+        dict
+            The statistics, empty if the source has none.
+        """
+        return {}
+
+    def has_options(
+        self,
+        output_fps: float | None = None,
+        geometry: LetterboxGeometry | None = None,
+        full_frame: bool = True,
+        sei_timestamps: bool = False,
+    ) -> bool:
+        """
+        Checks whether the source outputs frames with these options.
+
+        Returns
+        -------
+        bool
+            True if the source was created with the same options.
+        """
+        return (
+            self.output_fps == output_fps
+            and self.geometry == geometry
+            and self.full_frame == (geometry is None or full_frame)
+            and self.sei_timestamps == sei_timestamps
+        )
+
+    def _packet(
+        self,
+        frame_buffer: FrameBuffer | None,
+        model_buffer: FrameBuffer | None,
+        timestamp: int,
+    ) -> FramePacket:
+        return FramePacket(
+            frame=frame_buffer.array if frame_buffer is not None else None,
+            timestamp=timestamp,
+            model_frame=model_buffer.array if model_buffer is not None else None,
+            frame_buffer=frame_buffer,
+            model_buffer=model_buffer,
+        )
+
+
+class FFmpegPipeSource(FrameSource):
+    """
+    Decodes the video in an ffmpeg subprocess that writes raw frames
+    to pipes. It supports every optional feature: ffmpeg drops frames
+    with the `fps` filter, letterboxes them with `scale` and `pad` and
+    copies the elementary stream for `SEITimestampReader`.
+
+    See `FrameSource` for the other parameters.
+
+    Parameters
+    ----------
+    process : Popen | None, optional
+        The read process that is already running (see `from_stream`).
+        By default the process is created from the parameters.
+    """
+
+    name = "ffmpeg"
+    supports_subsample = True
+    supports_model_branch = True
+    supports_sei = True
+
+    def __init__(
+        self,
+        url: str,
+        params: FFprobeParameters,
+        pool_size: int,
+        process: Popen | None = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(url, params, pool_size, **kwargs)
+        self.process = process if process is not None else self._create_read_process()
+        """The ffmpeg process that decodes the video stream."""
+
+    @classmethod
+    def from_stream(
+        cls,
+        url: str,
+        pool_size: int,
+        framerate: float,
+        default_duration: float,
+        task_id: int = 0,
+        timeout: float | None = None,
+        sei_timestamps: bool = False,
+    ) -> "FFmpegPipeSource":
+        """
+        Starts reading a stream without probing it first.
+
+        The read process prints the parameters of the input before
+        the first frame, so the stream is opened only once instead of
+        once by ffprobe and once more by the read process. The process
+        outputs full resolution frames at the rate of the stream, so a
+        source with other options has to be created anew
+        (see `has_options`).
+
+        The codec is only known from the header, so with `sei_timestamps`
+        the stream is copied for `SEITimestampReader` in advance
+        and opened again without the copy if it is not H.264.
+
+        Parameters
+        ----------
+        url : str
+            The URL of the stream.
+        pool_size : int
+            The number of preallocated frames of the pool.
+        framerate : float
+            The desired analysis frame rate, used for the frame interval.
+        default_duration : float
+            The time to read the stream for if it has no duration.
+        task_id : int, optional
+            The ID of the video processing task (default is 0).
+        timeout : float | None, optional
+            The maximum time to open the stream in seconds (default is no limit).
+        sei_timestamps : bool, optional
+            Whether to take the timestamps from the SEI of an H.264 stream
+            (default is False).
+
+        Returns
+        -------
+        FFmpegPipeSource
+            The source with the parameters of the stream.
+
+        Raises
+        ------
+        RuntimeError
+            If the stream can't be opened in time or has no video.
+        """
+        # -t 0 is no limit for the decoded frames, but it stops the stream copy
+        input_kwargs = {"t": default_duration} if default_duration else {}
+        source = ffmpeg.input(url, **input_kwargs)
+        timestamp_fd, timestamp_write_fd = os.pipe()
+        pass_fds = [timestamp_write_fd]
+        outputs = [
+            source.output(
+                "pipe:",
+                format="rawvideo",
+                pix_fmt="bgr24",
+                fps_mode="passthrough",
+                loglevel="info",
+                hide_banner=None,
+                nostats=None,
+                stats_enc_pre=f"pipe:{timestamp_write_fd}",
+                stats_enc_pre_fmt="{ni} {pts} {tb}",
+            )
+        ]
+        sei_fd = None
+        if sei_timestamps:
+            sei_fd, sei_write_fd = os.pipe()
+            pass_fds.append(sei_write_fd)
+            outputs.append(
+                source["v:0"].output(f"pipe:{sei_write_fd}", c="copy", format="h264")
+            )
+        process = Popen(
+            ffmpeg.merge_outputs(*outputs).compile(),
+            stdout=PIPE,
+            stderr=PIPE,
+            pass_fds=pass_fds,
+        )
+        for fd in pass_fds:
+            os.close(fd)
+        process.model_pipe = None
+        process.timestamp_pipe = os.fdopen(timestamp_fd, "rb")
+        process.sei_reader = None
+        if sei_fd is not None:
+            process.sei_reader = SEITimestampReader(os.fdopen(sei_fd, "rb"))
+
+        # A stream that doesn't answer is stopped, which ends the header
+        timer = threading.Timer(timeout, process.kill) if timeout else None
+        if timer is not None:
+            timer.start()
+        header = []
+        try:
+            while not VIDEO_STREAM_RE.search(header[-1] if header else ""):
+                line = process.stderr.readline()
+                if not line:
+                    cls._stop(process)
+                    raise RuntimeError(
+                        f"ffmpeg didn't open {url}:\n" + "".join(header).strip()
+                    )
+                header.append(line.decode(errors="ignore"))
+        finally:
+            if timer is not None:
+                timer.cancel()
+        try:
+            params = cls.parse_header("".join(header), framerate, default_duration)
+        except RuntimeError:
+            cls._stop(process)
+            raise
+        if sei_timestamps and params.codec != "h264":
+            cls._stop(process)
+            return cls.from_stream(
+                url, pool_size, framerate, default_duration, task_id, timeout
+            )
+
+        # The rest of the log goes to a file, so the pipe never fills up
+        threading.Thread(
+            target=cls._save_log,
+            args=(process.stderr, header, task_id),
+            name=f"ffmpeg-log-{task_id}",
+            daemon=True,
+        ).start()
+        return cls(
+            url,
+            params,
+            pool_size,
+            process=process,
+            task_id=task_id,
+            sei_timestamps=sei_timestamps,
+        )
+
+    @classmethod
+    def parse_header(
+        cls, header: str, framerate: float, default_duration: float
+    ) -> FFprobeParameters:
+        """
+        Takes the parameters of the first video stream from the input
+        description that ffmpeg prints.
+
+        Parameters
+        ----------
+        header : str
+            The log of ffmpeg up to the description of the video stream.
+        framerate : float
+            The desired analysis frame rate, used for the frame interval.
+        default_duration : float
+            The duration used if the input doesn't have one.
+
+        Returns
+        -------
+        FFprobeParameters
+            The parameters of the stream.
+        """
+        video = VIDEO_STREAM_RE.search(header)
+        if video is None:
+            raise RuntimeError("There is no video stream in the input")
+        size = re.search(r", (\d+)x(\d+)", video.group(0))
+        fps = re.search(r"([\d.]+) fps", video.group(0)) or re.search(
+            r"([\d.]+) tbr", video.group(0)
+        )
+        if size is None or fps is None:
+            raise RuntimeError(f"Can't parse the video stream: {video.group(0)}")
+
+        duration = default_duration
+        match = re.search(r"Duration: (\d+):(\d+):([\d.]+)", header)
+        if match:
+            hours, minutes, seconds = match.groups()
+            duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+        return cls._make_params(
+            width=int(size.group(1)),
+            height=int(size.group(2)),
+            fps=float(fps.group(1)),
+            duration=duration,
+            framerate=framerate,
+            codec=video.group(1),
+        )
+
+    @staticmethod
+    def _save_log(stderr, header: list[str], task_id: int) -> None:
+        os.makedirs("logs", exist_ok=True)
+        with open(os.path.join("logs", f"ffmpeg_task_{task_id}.log"), "wb") as log:
+            log.write("".join(header).encode())
+            shutil.copyfileobj(stderr, log)
+
+    @classmethod
+    def probe(
+        cls,
+        url: str,
+        framerate: float,
+        default_duration: float,
+        timeout: float | None = None,
+    ) -> FFprobeParameters:
+        try:
+            output = run(
+                [
+                    "ffprobe", "-v", "error", "-show_format", "-show_streams",
+                    "-of", "json", url,
+                ],
+                capture_output=True,
+                check=True,
+                timeout=timeout,
+            ).stdout
+        except CalledProcessError as e:
+            raise RuntimeError(e.stderr.decode(errors="ignore")) from e
+        except TimeoutExpired as e:
+            raise RuntimeError(f"ffprobe didn't open {url} in {timeout} s") from e
+        probe = json.loads(output)
+        video_info = next(s for s in probe["streams"] if s["codec_type"] == "video")
+        fps = video_info["r_frame_rate"].split("/")
+        fps = int(fps[0]) / int(fps[1])
+        duration = (
+            float(video_info["duration"])
+            if "duration" in video_info
+            else default_duration
+        )
+        return cls._make_params(
+            width=int(video_info["width"]),
+            height=int(video_info["height"]),
+            fps=fps,
+            duration=duration,
+            framerate=framerate,
+            codec=video_info.get("codec_name", ""),
+        )
+
+    def _create_read_process(self) -> Popen:
+        """
+        Creates the ffmpeg process that reads the video.
+
+        It writes full resolution bgr24 frames to stdout, the letterboxed
+        RGB frames to the `model_pipe` attribute of the process, the input
+        frame number and the time of every output frame to its
+        `timestamp_pipe` attribute (see `_read_timestamp`) and, with
+        `sei_timestamps`, the H.264 elementary stream to its `sei_reader`.
+
+        Returns
+        -------
+        Popen
+            The read process.
+        """
+        params = self.params
+        geometry = self.geometry
+        input_kwargs = {"t": params.duration} if params.duration else {}
+        source = ffmpeg.input(self.url, r=params.fps, **input_kwargs)
+        stream = source
+        if self.output_fps is not None:
+            stream = stream.filter("fps", fps=self.output_fps)
+        output_kwargs = {"format": "rawvideo", "r": self.output_fps or params.fps}
+
+        # The options of the first output also carry the global ones
+        first_kwargs = dict(output_kwargs)
+        # ffmpeg writes "<input frame number> <pts> <time base>"
+        # for every output frame to a dedicated pipe
+        timestamp_fd, timestamp_write_fd = os.pipe()
+        pass_fds = [timestamp_write_fd]
+        first_kwargs.update(
+            loglevel="error",
+            stats_enc_pre=f"pipe:{timestamp_write_fd}",
+            stats_enc_pre_fmt="{ni} {pts} {tb}",
+        )
+
+        model_fd = None
+        if geometry is None:
+            outputs = [stream.output("pipe:", pix_fmt="bgr24", **first_kwargs)]
+        else:
+            if self.full_frame:
+                split = stream.split()
+                full_stream, model_stream = split[0], split[1]
+            else:
+                model_stream = stream
+            top, _, left, _ = geometry.border
+            # Scale and pad in RGB, so the padding has exactly the letterbox color
+            model_stream = (
+                model_stream.filter("format", "rgb24")
+                .filter(
+                    "scale",
+                    geometry.new_unpad[0],
+                    geometry.new_unpad[1],
+                    flags="bilinear",
+                )
+                .filter(
+                    "pad",
+                    geometry.new_shape[1],
+                    geometry.new_shape[0],
+                    left,
+                    top,
+                    color="0x727272",
+                )
+            )
+
+            if self.full_frame:
+                model_fd, model_write_fd = os.pipe()
+                pass_fds.append(model_write_fd)
+                outputs = [
+                    full_stream.output("pipe:", pix_fmt="bgr24", **first_kwargs),
+                    model_stream.output(
+                        f"pipe:{model_write_fd}", pix_fmt="rgb24", **output_kwargs
+                    ),
+                ]
+            else:
+                outputs = [model_stream.output("pipe:", pix_fmt="rgb24", **first_kwargs)]
+
+        sei_fd = None
+        if self.sei_timestamps:
+            sei_fd, sei_write_fd = os.pipe()
+            pass_fds.append(sei_write_fd)
+            outputs.append(
+                source["v:0"].output(f"pipe:{sei_write_fd}", c="copy", format="h264")
+            )
+
+        # Nothing parses stderr, so it goes to a log file
+        # instead of a pipe that nobody drains.
+        os.makedirs("logs", exist_ok=True)
+        with open(os.path.join("logs", f"ffmpeg_task_{self.task_id}.log"), "wb") as stderr:
+            process = Popen(
+                ffmpeg.merge_outputs(*outputs).compile(),
+                stdout=PIPE,
+                stderr=stderr,
+                pass_fds=pass_fds,
+            )
+        for fd in pass_fds:
+            os.close(fd)
+
+        process.model_pipe = None
+        if geometry is not None:
+            process.model_pipe = (
+                os.fdopen(model_fd, "rb") if self.full_frame else process.stdout
+            )
+        process.timestamp_pipe = os.fdopen(timestamp_fd, "rb")
+        process.sei_reader = None
+        if sei_fd is not None:
+            process.sei_reader = SEITimestampReader(os.fdopen(sei_fd, "rb"))
+        return process
+
+    def _read_timestamp(self) -> int | None:
+        """
+        Retrieves the timestamp of the frame that was just read.
+
+        Returns
+        -------
+        int | None
+            The SEI timestamp of the frame if the stream carries them,
+            otherwise its presentation time in milliseconds.
+            None if the stream has ended.
+        """
+        line = self.process.timestamp_pipe.readline()
+        if not line:
+            return None
+        input_frame, pts, time_base = line.decode().split()
+        if self.process.sei_reader is not None and int(input_frame) >= 0:
+            timestamp = self.process.sei_reader.timestamp(int(input_frame))
+            if timestamp is not None:
+                return timestamp
+        # Exact arithmetic keeps the milliseconds equal to the truncated pts_time
+        return int(int(pts) * Fraction(time_base) * 1000)
+
+    def read(self) -> FramePacket | None:
+        frame_buffer = None
+        if self.full_frame:
+            frame_buffer = self.frame_pool.readinto(self.process.stdout)
+        model_buffer = None
+        if self.geometry is not None:
+            model_buffer = self.model_pool.readinto(self.process.model_pipe)
+        packet = self._packet(frame_buffer, model_buffer, 0)
+        if (self.full_frame and frame_buffer is None) or (
+            self.geometry is not None and model_buffer is None
+        ):
+            packet.release_frame()
+            packet.release_model_frame()
+            return None
+
+        timestamp = self._read_timestamp()
+        if timestamp is None:
+            packet.release_frame()
+            packet.release_model_frame()
+            return None
+        packet.timestamp = timestamp
+        return packet
+
+    def close(self) -> None:
+        self._stop(self.process)
+
+    @staticmethod
+    def _stop(process: Popen) -> None:
+        try:
+            if process.model_pipe not in (None, process.stdout):
+                process.model_pipe.close()
+            process.timestamp_pipe.close()
+            if process.sei_reader is not None:
+                process.sei_reader.close()
+            process.stdout.close()
+            process.wait(timeout=5)
+        except TimeoutExpired:
+            process.kill()
+
+
+class OpenCVSource(FrameSource):
+    """
+    Decodes the video in the current process with `cv2.VideoCapture`.
+    Frames are decoded straight into the buffers of the frame pool.
+    With `output_fps` the skipped frames are only grabbed, not converted
+    to bgr24.
+
+    See `FrameSource` for the parameters.
+    """
+
+    name = "opencv"
+    supports_subsample = True
+
+    def __init__(self, url: str, params: FFprobeParameters, pool_size: int, **kwargs) -> None:
+        super().__init__(url, params, pool_size, **kwargs)
+        self.capture = cv2.VideoCapture(url, cv2.CAP_FFMPEG)
+        """The OpenCV video capture."""
+        if not self.capture.isOpened():
+            raise RuntimeError(f"Can't open the video {url}")
+        self._position = 0
+        self._next_frame = 0.0
+        self._step = params.fps / self.output_fps if self.output_fps else 1.0
+
+    @classmethod
+    def probe(
+        cls,
+        url: str,
+        framerate: float,
+        default_duration: float,
+        timeout: float | None = None,
+    ) -> FFprobeParameters:
+        capture_params = []
+        if timeout is not None:
+            capture_params = [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, int(timeout * 1000)]
+        capture = cv2.VideoCapture(url, cv2.CAP_FFMPEG, capture_params)
+        try:
+            if not capture.isOpened():
+                raise RuntimeError(f"Can't open the video {url}")
+            fps = capture.get(cv2.CAP_PROP_FPS)
+            frame_count = capture.get(cv2.CAP_PROP_FRAME_COUNT)
+            duration = frame_count / fps if frame_count > 0 else default_duration
+            fourcc = int(capture.get(cv2.CAP_PROP_FOURCC))
+            codec = fourcc.to_bytes(4, "little").decode(errors="ignore").strip("\x00")
+            return cls._make_params(
+                width=int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                height=int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                fps=fps,
+                duration=duration,
+                framerate=framerate,
+                codec={"avc1": "h264", "hev1": "hevc", "hvc1": "hevc"}.get(codec, codec),
+            )
+        finally:
+            capture.release()
+
+    def _skip_to(self, frame: int) -> bool:
+        """
+        Moves the capture to a frame by grabbing the frames before it.
+
+        Parameters
+        ----------
+        frame : int
+            The number of the next frame to read.
+
+        Returns
+        -------
+        bool
+            False if the video has ended.
+        """
+        while self._position < frame:
+            if not self.capture.grab():
+                return False
+            self._position += 1
+        return True
+
+    def read(self) -> FramePacket | None:
+        # Skip the frames that don't fall on the output frame rate,
+        # like the fps filter of ffmpeg takes the nearest frame
+        if not self._skip_to(int(self._next_frame + 0.5)):
+            return None
+        self._next_frame += self._step
+
+        frame_buffer = self.frame_pool.acquire()
+        ok, frame = self.capture.read(frame_buffer.array)
+        self._position += 1
+        if not ok:
+            frame_buffer.release()
+            return None
+        if frame is not frame_buffer.array:
+            # The decoder returned a frame of another size or type
+            frame_buffer.release()
+            return None
+
+        timestamp = int(round(self.capture.get(cv2.CAP_PROP_POS_MSEC), 3))
+        if self.params.duration and timestamp >= self.params.duration * 1000:
+            frame_buffer.release()
+            return None
+        return self._packet(frame_buffer, None, timestamp)
+
+    def close(self) -> None:
+        self.capture.release()
+
+
+class SeekSource(OpenCVSource):
+    """
+    Samples a seekable video file sparsely: only the frames nearest
+    to the sampling times are decoded.
+
+    When a keyframe lies between the current position and the next
+    sampled frame, the capture seeks instead of grabbing the frames
+    in between, and the decoder starts from that keyframe. So the
+    decoding time grows with the number of sampled frames rather than
+    with the length of the video. The keyframes are listed with
+    ffprobe. Without them the frames are only grabbed, because seeking
+    to a frame far from a keyframe decodes more than it skips.
+
+    See `FrameSource` for the parameters.
+    """
+
+    name = "seek"
+
+    def __init__(self, url: str, params: FFprobeParameters, pool_size: int, **kwargs) -> None:
+        super().__init__(url, params, pool_size, **kwargs)
+        self.keyframes = self.probe_keyframes(url, params.fps)
+        """The numbers of the keyframes, or None if they are unknown."""
+        self.seeks = 0
+        """The number of seeks made."""
+
+    @staticmethod
+    def probe_keyframes(url: str, fps: float, timeout: float = 30) -> list[int] | None:
+        """
+        Lists the keyframes of a video file from its packets without decoding it.
+
+        Parameters
+        ----------
+        url : str
+            The path of the video.
+        fps : float
+            The frame rate of the video.
+        timeout : float, optional
+            The maximum time for ffprobe in seconds (default is 30).
+
+        Returns
+        -------
+        list[int] | None
+            The sorted numbers of the keyframes, or None if ffprobe failed.
+        """
+        try:
+            output = run(
+                [
+                    "ffprobe", "-v", "error", "-select_streams", "v:0",
+                    "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", url,
+                ],
+                capture_output=True,
+                check=True,
+                text=True,
+                timeout=timeout,
+            ).stdout
+        except (OSError, SubprocessError):
+            return None
+        return parse_keyframes(output, fps)
+
+    def stats(self) -> dict:
+        return {"seeks": self.seeks}
+
+    def _skip_to(self, frame: int) -> bool:
+        if frame > self._position and self._is_seek_faster(frame):
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, frame)
+            self._position = frame
+            self.seeks += 1
+            return True
+        return super()._skip_to(frame)
+
+    def _is_seek_faster(self, frame: int) -> bool:
+        """
+        Checks whether decoding from the keyframe before `frame`
+        is shorter than decoding from the current position.
+        """
+        if not self.keyframes:
+            return False
+        index = bisect_right(self.keyframes, frame) - 1
+        return index >= 0 and self.keyframes[index] > self._position
+
+
+def parse_keyframes(packets: str, fps: float) -> list[int]:
+    """
+    Takes the keyframe numbers from the "pts_time,flags" lines of ffprobe.
+
+    Parameters
+    ----------
+    packets : str
+        The packets of the video stream, one per line.
+    fps : float
+        The frame rate of the video.
+
+    Returns
+    -------
+    list[int]
+        The sorted numbers of the keyframes counted from the first packet.
+    """
+    times = []
+    keyframes = []
+    for line in packets.splitlines():
+        pts_time, _, flags = line.strip().partition(",")
+        try:
+            pts_time = float(pts_time)
+        except ValueError:
+            continue
+        times.append(pts_time)
+        if "K" in flags:
+            keyframes.append(pts_time)
+    if not times:
+        return []
+    start = min(times)
+    return sorted({round((t - start) * fps) for t in keyframes})
+
+
+class ImageDirectorySource(FrameSource):
+    """
+    Reads still images from a directory in the order of their names,
+    as if they were the frames of a video at the analysis frame rate.
+    Images of another size than the first one are resized to it.
+
+    See `FrameSource` for the parameters.
+    """
+
+    name = "images"
+
+    def __init__(self, url: str, params: FFprobeParameters, pool_size: int, **kwargs) -> None:
+        super().__init__(url, params, pool_size, **kwargs)
+        self.files = self.list_images(url)
+        """The paths of the images."""
+        self._index = 0
+
+    @staticmethod
+    def list_images(path: str) -> list[str]:
+        """
+        Lists the images of a directory sorted by name.
+
+        Parameters
+        ----------
+        path : str
+            The directory with the images.
+
+        Returns
+        -------
+        list[str]
+            The paths of the images.
+        """
+        return sorted(
+            os.path.join(path, name)
+            for name in os.listdir(path)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+
+    @classmethod
+    def probe(
+        cls,
+        url: str,
+        framerate: float,
+        default_duration: float,
+        timeout: float | None = None,
+    ) -> FFprobeParameters:
+        files = cls.list_images(url)
+        if not files:
+            raise RuntimeError(f"There are no images in {url}")
+        image = cv2.imread(files[0])
+        if image is None:
+            raise RuntimeError(f"Can't read the image {files[0]}")
+        return cls._make_params(
+            width=image.shape[1],
+            height=image.shape[0],
+            fps=framerate,
+            duration=len(files) / framerate,
+            framerate=framerate,
+        )
+
+    def read(self) -> FramePacket | None:
+        if self._index >= len(self.files):
+            return None
+        image = cv2.imread(self.files[self._index])
+        if image is None:
+            return None
+
+        frame_buffer = self.frame_pool.acquire()
+        if image.shape == frame_buffer.array.shape:
+            frame_buffer.array[...] = image
+        else:
+            cv2.resize(
+                image,
+                (self.params.width, self.params.height),
+                dst=frame_buffer.array,
+            )
+        timestamp = int(self._index * 1000 / self.params.fps)
+        self._index += 1
+        return self._packet(frame_buffer, None, timestamp)
+
+    def close(self) -> None:
+        self._index = len(self.files)
+
+
+_probe_cache: dict[tuple, FFprobeParameters] = {}
+_probe_cache_lock = threading.Lock()
+
+
+def probe_cached(
+    frame_source: type[FrameSource],
+    url: str,
+    framerate: float,
+    default_duration: float,
+    timeout: float | None = None,
+) -> FFprobeParameters:
+    """
+    Probes a video with a frame source backend. The parameters of a local
+    file are kept until its size or modification time changes, so
+    a file uploaded again under the same name is probed again.
+
+    See `FrameSource.probe` for the parameters.
+
+    Returns
+    -------
+    FFprobeParameters
+        A copy of the parameters of the video that may be modified.
+    """
+    if not os.path.isfile(url):
+        return frame_source.probe(url, framerate, default_duration, timeout)
+
+    stat = os.stat(url)
+    key = (
+        frame_source.name,
+        os.path.abspath(url),
+        stat.st_size,
+        stat.st_mtime_ns,
+        framerate,
+        default_duration,
+    )
+    with _probe_cache_lock:
+        params = _probe_cache.get(key)
+    if params is None:
+        params = frame_source.probe(url, framerate, default_duration, timeout)
+        with _probe_cache_lock:
+            if len(_probe_cache) >= PROBE_CACHE_SIZE:
+                del _probe_cache[next(iter(_probe_cache))]
+            _probe_cache[key] = params
+    return params.model_copy()
+
+
+FRAME_SOURCES: dict[str, type[FrameSource]] = {
+    source.name: source
+    for source in (FFmpegPipeSource, OpenCVSource, SeekSource, ImageDirectorySource)
+}
+"""The frame source backends by their names."""
+
+
+def get_frame_source(name: str, url: str) -> type[FrameSource]:
+    """
+    Selects the frame source backend for a video. A directory is always
+    read with `ImageDirectorySource`.
+
+    Parameters
+    ----------
+    name : str
+        The name of the backend (see `FRAME_SOURCES`).
+    url : str
+        The URL or path of the video.
+
+    Returns
+    -------
+    type[FrameSource]
+        The class of the backend.
+
+    Raises
+    ------
+    ValueError
+        If there is no backend with this name.
+    """
+    if os.path.isdir(url):
+        return ImageDirectorySource
+    if name not in FRAME_SOURCES:
+        raise ValueError(
+            f"Unknown frame source {name!r}, expected one of {list(FRAME_SOURCES)}"
+        )
+    return FRAME_SOURCES[name]
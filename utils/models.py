@@ -0,0 +1,325 @@
+import threading
+import time
+from logging import Logger
+
+import numpy as np
+import onnxruntime as ort
+
+from config import general_cfg
+from utils.batching import BatchScheduler
+from utils.sessions import SessionPool, load_optimized_model, make_session_options
+
+PROVIDERS = ["CUDAExecutionProvider", "CPUExecutionProvider"]
+"""The execution providers of the models in the order of preference."""
+
+
+class OnnxModel:
+    """
+    A loaded ONNX model with its sessions, ready to run on prepared images.
+
+    The sessions are created with the options from the general config,
+    from the cached optimized graph if `model_cache` is enabled, and are
+    warmed up before the model is used (see `warmup`).
+
+    Parameters
+    ----------
+    name : str
+        The name the tasks choose the model by.
+    model_path : str
+        Filename or serialized ONNX or ORT format model in a byte string.
+    input_shape : tuple[int, int]
+        The height and width of the model input.
+    conf_th : float
+        The confidence threshold for the results of the model.
+    iou_th : float
+        The threshold of intersection over union for the results of the model.
+    logger : Logger
+        A logger for displaying various information.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        model_path: str,
+        input_shape: tuple[int, int],
+        conf_th: float,
+        iou_th: float,
+        logger: Logger,
+    ) -> None:
+        start = time.perf_counter()
+        self.name = name
+        self.path = model_path if isinstance(model_path, str) else "<bytes>"
+        self.input_shape = input_shape
+        self.conf_th = conf_th
+        """The confidence threshold for the results of the model."""
+        self.iou_th = iou_th
+        """The threshold of intersection over union for the results of the model."""
+        self.logger = logger
+        self.loaded_at = time.time()
+
+        session_config = general_cfg.get("session_options", {})
+        options = make_session_options(session_config)
+        self.startup: dict = {"model_cache": "off"}
+        """The cold start timings of the model for `/api/metrics`."""
+        if (
+            general_cfg.get("model_cache", True)
+            and isinstance(model_path, str)
+            and model_path.endswith(".onnx")
+        ):
+            # The graph is optimized once and then loaded as it is
+            try:
+                model_path, options, hit = load_optimized_model(
+                    model_path, session_config, PROVIDERS
+                )
+                self.startup["model_cache"] = "hit" if hit else "miss"
+            except OSError as e:
+                self.logger.warning("The optimized model is not cached: %s", e)
+
+        self.sessions = SessionPool(
+            model_path,
+            general_cfg.get("session_pool_size", 1),
+            options,
+            providers=PROVIDERS,
+        )
+        """The onnx sessions to launch the model, each task checks one out."""
+        self.session: ort.InferenceSession = self.sessions.sessions[0]
+        """An onnx session to read the metadata of the model."""
+
+        self.input_name: str = self.session.get_inputs()[0].name
+        """The name of the input metadata."""
+        self.raw_input: bool = self.session.get_inputs()[0].type == "tensor(uint8)"
+        """Whether the model takes uint8 BGR images and prepares them itself."""
+        self.batch_input: bool = not isinstance(self.session.get_inputs()[0].shape[0], int)
+        """Whether the model takes a batch of several images at once."""
+        self.output_name: list[str] = [self.session.get_outputs()[0].name]
+        """The name of the output metadata."""
+        self.scheduler: BatchScheduler | None = None
+        """It gathers the images of all tasks into batches, if batching is enabled."""
+        if general_cfg.get("batching", False):
+            if self.batch_input:
+                self.scheduler = BatchScheduler(
+                    self._run_session,
+                    general_cfg.get("max_batch_size", 8),
+                    general_cfg.get("max_batch_wait_ms", 5),
+                )
+            else:
+                self.logger.warning(
+                    "Batching is disabled for the model %s: it has a fixed batch size, "
+                    "export it with models/convert.py --dynamic-batch",
+                    name,
+                )
+        self.io_binding: bool = general_cfg.get("io_binding", True)
+        """Whether the model reads and writes the buffers of the thread in place."""
+        self._local = threading.local()
+        """The output buffers of the thread, each task detects in its own threads."""
+
+        self.startup["load_sec"] = round(time.perf_counter() - start, 3)
+        self.warmup(general_cfg.get("warmup_runs", 3))
+        self.startup["cold_start_sec"] = round(time.perf_counter() - start, 3)
+
+    def warmup(self, runs: int) -> None:
+        """
+        Runs every session on blank images, so that ONNX Runtime allocates
+        its memory and prepares the kernels before the first frame.
+
+        Parameters
+        ----------
+        runs : int
+            The number of runs of each session.
+        """
+        height, width = self.input_shape
+        if self.raw_input:
+            img = np.zeros((1, height, width, 3), dtype=np.uint8)
+        else:
+            img = np.zeros((1, 3, height, width), dtype=np.float32)
+
+        times = []
+        for session in self.sessions.sessions:
+            for _ in range(runs):
+                start = time.perf_counter()
+                session.run(self.output_name, {self.input_name: img})
+                times.append(time.perf_counter() - start)
+        self.startup["warmup_runs"] = len(times)
+        if times:
+            self.startup["first_run_ms"] = round(1000 * times[0], 2)
+            self.startup["warm_run_ms"] = round(1000 * times[-1], 2)
+
+    def run(self, img: np.ndarray) -> np.ndarray:
+        """
+        Runs the model on prepared images in the way set by the general config.
+
+        Parameters
+        ----------
+        img : np.ndarray
+            The prepared images.
+
+        Returns
+        -------
+        np.ndarray
+            The outputs of the model, it may be a buffer that is overwritten
+            by the next run in the same thread.
+        """
+        if self.scheduler is not None:
+            return self.scheduler.submit(img)
+        if self.io_binding:
+            return self._run_bound(img)
+        return self._run_session(img)
+
+    def _run_session(self, img: np.ndarray) -> np.ndarray:
+        with self.sessions.checkout() as session:
+            return session.run(self.output_name, {self.input_name: img})[0]
+
+    def _run_bound(self, img: np.ndarray) -> np.ndarray:
+        """
+        Runs the model on the input buffer in place and writes the outputs
+        into the output buffer of the thread for inputs of this shape.
+
+        The output buffer is allocated by the first run, when the shape
+        of the outputs becomes known, and is reused by the next ones.
+        """
+        outputs = getattr(self._local, "outputs", None)
+        if outputs is None:
+            outputs = self._local.outputs = {}
+        output = outputs.get(img.shape)
+        img = np.ascontiguousarray(img)
+
+        with self.sessions.checkout() as session:
+            binding = self.sessions.io_binding(session)
+            binding.bind_input(
+                self.input_name, "cpu", 0, img.dtype, img.shape, img.ctypes.data
+            )
+            if output is None:
+                binding.bind_output(self.output_name[0], "cpu")
+            else:
+                binding.bind_output(
+                    self.output_name[0],
+                    "cpu",
+                    0,
+                    output.dtype,
+                    output.shape,
+                    output.ctypes.data,
+                )
+            session.run_with_iobinding(binding)
+            if output is None:
+                output = outputs[img.shape] = binding.copy_outputs_to_cpu()[0]
+        return output
+
+    def stats(self) -> dict:
+        """
+        Returns the description and the runtime metrics of the model.
+
+        Returns
+        -------
+        dict
+            The path, the time of loading, the thresholds, the cold start
+            timings and the use of the sessions and of batching.
+        """
+        stats = {
+            "path": self.path,
+            "loaded_at": round(self.loaded_at, 3),
+            "conf_th": self.conf_th,
+            "iou_th": self.iou_th,
+            "startup": self.startup,
+            "sessions": self.sessions.stats(),
+        }
+        if self.scheduler is not None:
+            stats["batching"] = self.scheduler.stats()
+        return stats
+
+    def close(self) -> None:
+        """
+        Stops the batching of the model.
+        """
+        if self.scheduler is not None:
+            self.scheduler.close()
+
+
+class ModelRegistry:
+    """
+    The loaded models by name. A model is replaced by a new version
+    without stopping the tasks: the new one is loaded and warmed up first
+    and then takes the name at once, the tasks get it for their next frame.
+    The old version is closed after `grace_sec`, when the frames that
+    were already passed to it are done.
+
+    Parameters
+    ----------
+    default : str
+        The name of the model of the tasks that do not choose one.
+    grace_sec : float, optional
+        The time the replaced model stays usable in seconds (default is 5).
+    """
+
+    def __init__(self, default: str, grace_sec: float = 5) -> None:
+        self.default = default
+        self.grace_sec = grace_sec
+        self._models: dict[str, OnnxModel] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str | None = None) -> OnnxModel:
+        """
+        Returns the current version of a model.
+
+        Parameters
+        ----------
+        name : str | None, optional
+            The name of the model (default is the default model).
+
+        Returns
+        -------
+        OnnxModel
+            The model.
+
+        Raises
+        ------
+        KeyError
+            If there is no model with this name.
+        """
+        with self._lock:
+            model = self._models.get(name or self.default)
+        if model is None:
+            raise KeyError(f"Unknown model: {name}")
+        return model
+
+    def add(self, model: OnnxModel) -> OnnxModel | None:
+        """
+        Registers a loaded model under its name, replacing the previous one.
+
+        Parameters
+        ----------
+        model : OnnxModel
+            The model.
+
+        Returns
+        -------
+        OnnxModel | None
+            The replaced model, it is closed after `grace_sec`.
+        """
+        with self._lock:
+            old = self._models.get(model.name)
+            self._models[model.name] = model
+        if old is not None:
+            timer = threading.Timer(self.grace_sec, old.close)
+            timer.daemon = True
+            timer.start()
+        return old
+
+    def names(self) -> list[str]:
+        """
+        Returns the names of the loaded models.
+        """
+        with self._lock:
+            return list(self._models)
+
+    def stats(self) -> dict:
+        """
+        Returns the description and the runtime metrics of every model.
+
+        Returns
+        -------
+        dict
+            The metrics of the models by name (see `OnnxModel.stats`).
+        """
+        with self._lock:
+            models = dict(self._models)
+        return {name: model.stats() for name, model in models.items()}
@@ -0,0 +1,101 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Decides whether a frame differs enough from the last processed one
+    to run the neural network on it.
+
+    The frames are compared as small blurred grayscale images: a pixel
+    has changed if its brightness differs by more than `threshold`, and
+    the frame has motion if the changed pixels take more than `min_area`
+    of it. The comparison is made with the last frame the network
+    processed, so slow changes add up. Every `force_frames` skipped frames
+    the network runs anyway, so that objects standing still are found too.
+    For the skipped frames the last detections are used again, and the
+    tracks keep going instead of being lost.
+
+    Parameters
+    ----------
+    threshold : int
+        The change of brightness of a pixel that counts, from 0 to 255.
+    min_area : float
+        The share of the changed pixels that means motion, from 0 to 1.
+    width : int
+        The width of the compared images.
+    force_frames : int
+        The maximum number of frames skipped in a row.
+    """
+
+    def __init__(
+        self, threshold: int, min_area: float, width: int, force_frames: int
+    ) -> None:
+        self.threshold = threshold
+        self.min_area = min_area
+        self.width = width
+        self.force_frames = max(1, force_frames)
+        self.detections: tuple = (None, None, None)
+        """The detections of the last processed frame, used for the skipped ones."""
+        self._reference: np.ndarray | None = None
+        self._skipped_in_row = 0
+        self._frames = 0
+        self._skipped = 0
+        self._forced = 0
+
+    def _small(self, img: np.ndarray) -> np.ndarray:
+        height = max(1, round(img.shape[0] * self.width / img.shape[1]))
+        small = cv2.resize(img, (self.width, height), interpolation=cv2.INTER_AREA)
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def check(self, img: np.ndarray) -> bool:
+        """
+        Checks whether the network has to process a frame.
+
+        Parameters
+        ----------
+        img : np.ndarray
+            The frame.
+
+        Returns
+        -------
+        bool
+            True if the frame has motion, or it is the first one,
+            or too many frames were skipped before it.
+        """
+        self._frames += 1
+        small = self._small(img)
+        if self._reference is None or self._reference.shape != small.shape:
+            process = True
+        else:
+            changed = cv2.absdiff(small, self._reference) > self.threshold
+            process = np.count_nonzero(changed) > self.min_area * changed.size
+            if not process and self._skipped_in_row >= self.force_frames:
+                process = True
+                self._forced += 1
+
+        if process:
+            self._reference = small
+            self._skipped_in_row = 0
+        else:
+            self._skipped_in_row += 1
+            self._skipped += 1
+        return process
+
+    def stats(self) -> dict:
+        """
+        Returns the decisions of the gate so far.
+
+        Returns
+        -------
+        dict
+            The number of frames, the skipped ones and the ones processed
+            only because of `force_frames`, and the share of the skipped ones.
+        """
+        return {
+            "frames": self._frames,
+            "skipped": self._skipped,
+            "forced": self._forced,
+            "skip_ratio": round(self._skipped / self._frames, 3) if self._frames else 0,
+        }
@@ -0,0 +1,518 @@
+from collections import defaultdict
+from queue import Empty, Full, Queue
+from threading import Event, Lock, Thread
+from typing import Any, Callable
+from urllib.parse import urlparse
+
+from schemas.inference_parameters import FFprobeParameters
+from utils.dataclasses import FramePacket
+from utils.frame_source import FrameSource
+
+LIVE_SCHEMES = ("rtsp", "rtsps", "rtmp", "rtmps", "rtp", "srt", "udp", "tcp")
+"""The URL schemes of live streams, which do not wait for slow tasks."""
+
+
+def is_live(url: str) -> bool:
+    """
+    Checks whether a URL is a live stream. The frames of a live stream
+    come at its own pace, while files and recordings can be read
+    as slowly as the tasks need.
+
+    Parameters
+    ----------
+    url : str
+        The URL of the stream.
+
+    Returns
+    -------
+    bool
+        True if the scheme of the URL is one of `LIVE_SCHEMES`.
+    """
+    return urlparse(url).scheme.lower() in LIVE_SCHEMES
+
+
+class StreamSubscription(FrameSource):
+    """
+    The frames of a `SharedStream` received by one task.
+
+    While the task is the only subscriber, it reads the source of the
+    stream itself. Once the stream is shared, the frames are the buffers
+    of the shared frame pools, each subscriber holds its own reference
+    to them, so they must not be modified in place. If the task falls
+    behind on a live stream, its oldest waiting frame is dropped instead
+    of delaying the other subscribers, a file or a recording waits for it.
+
+    Parameters
+    ----------
+    stream : SharedStream
+        The stream the task is subscribed to.
+    params : FFprobeParameters
+        The parameters of the frames for the task. If the source of the
+        stream has no duration, the task stops after `duration` seconds
+        of frames at `fps` unless it is 0.
+    buffers : int
+        The number of buffers added to the frame pools for the task.
+    queue_size : int
+        The maximum number of frames waiting for the task.
+    task_id : int, optional
+        The ID of the video processing task (default is 0).
+    """
+
+    name = "shared"
+
+    def __init__(
+        self,
+        stream: "SharedStream",
+        params: FFprobeParameters,
+        buffers: int,
+        queue_size: int,
+        task_id: int = 0,
+    ) -> None:
+        super().__init__(stream.url, params, 0, task_id=task_id)
+        self.stream = stream
+        self.buffers = buffers
+        self.frame_pool = stream.source.frame_pool
+        self.model_pool = stream.source.model_pool
+        self.queue: Queue[tuple[Any, ...] | None] = Queue(maxsize=max(1, queue_size))
+        """The frames waiting for the task, None marks the end of the stream."""
+        self.dropped = 0
+        """The number of frames dropped because the task fell behind."""
+        self._frames = 0
+        self._index: int | None = None
+        self._ended = False
+        self._closed = Event()
+
+    @classmethod
+    def probe(
+        cls,
+        url: str,
+        framerate: float,
+        default_duration: float,
+        timeout: float | None = None,
+    ) -> FFprobeParameters:
+        raise NotImplementedError("A shared stream is probed by its own source")
+
+    def put(self, packet: FramePacket | None, index: int = 0) -> None:
+        """
+        Passes a frame of the stream to the task. If the queue is full,
+        the oldest waiting frame of a live stream is dropped, otherwise
+        the stream waits for the task.
+
+        Parameters
+        ----------
+        packet : FramePacket | None
+            The frame with references taken for the task,
+            or None at the end of the stream.
+        index : int, optional
+            The number of the frame in the stream (default is 0).
+        """
+        item = (
+            (packet.frame_buffer, packet.model_buffer, packet.timestamp, index)
+            if packet is not None
+            else None
+        )
+        while not self._closed.is_set():
+            try:
+                if self.stream.live:
+                    self.queue.put_nowait(item)
+                else:
+                    self.queue.put(item, timeout=0.1)
+            except Full:
+                if self.stream.live:
+                    self._drop_oldest()
+                continue
+            if self._closed.is_set():
+                # The subscription was closed while the frame was put
+                self._drain()
+            return
+        # Nobody reads the frames of a closed subscription
+        if packet is not None:
+            packet.release_frame()
+            packet.release_model_frame()
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except Empty:
+                break
+            if item is not None:
+                self._release(item)
+    def _drop_oldest(self) -> None:
+        try:
+            oldest = self.queue.get_nowait()
+        except Empty:
+            return
+        if oldest is not None:
+            self._release(oldest)
+            self.dropped += 1
+
+    @staticmethod
+    def _release(item: tuple[Any, ...]) -> None:
+        for buffer in item[:2]:
+            if buffer is not None:
+                buffer.release()
+
+    def read(self) -> FramePacket | None:
+        if self._ended:
+            return None
+        packet = self.stream.read_direct()
+        if packet is SharedStream.SHARED:
+            item = self.queue.get()
+            if item is None:
+                packet = None
+            else:
+                frame_buffer, model_buffer, timestamp, index = item
+                packet = self._packet(frame_buffer, model_buffer, timestamp)
+                if self._index is not None:
+                    packet.skipped = index - self._index - 1
+                self._index = index
+        if packet is None:
+            self._ended = True
+            return None
+
+        self._frames += 1 + packet.skipped
+        # A source with a duration of its own ends by itself
+        if (
+            not self.stream.source.params.duration
+            and self.params.duration
+            and self._frames > self.params.duration * self.params.fps
+        ):
+            packet.release_frame()
+            packet.release_model_frame()
+            self._ended = True
+            return None
+        return packet
+
+    def stats(self) -> dict:
+        return {
+            "shared": self.stream.shared,
+            "subscribers": self.stream.subscribers,
+            "dropped": self.dropped,
+        }
+
+    def close(self) -> None:
+        self._closed.set()
+        self.stream.unsubscribe(self)
+        self._drain()
+
+
+class SharedStream:
+    """
+    Decodes a stream once for every task subscribed to it.
+
+    The first subscriber reads the source itself, like a source of its own.
+    When a second one joins, a thread starts reading the frames from the
+    source and passes each of them to every subscriber with a reference
+    of its own, so a frame returns to the pool when the last subscriber
+    releases it. The source is closed when the last subscriber leaves
+    or the stream ends.
+
+    Parameters
+    ----------
+    url : str
+        The URL of the stream.
+    source : FrameSource
+        The source that decodes the stream.
+    on_close : Callable[[SharedStream], None]
+        It is called when the stream stops accepting subscribers.
+    live : bool, optional
+        Whether the stream is live (see `is_live`), so slow subscribers
+        lose frames instead of delaying it (default is True).
+    """
+
+    SHARED = object()
+    """Returned by `read_direct` once the frames come from the decoding thread."""
+
+    def __init__(
+        self,
+        url: str,
+        source: FrameSource,
+        on_close: Callable[["SharedStream"], None],
+        live: bool = True,
+    ) -> None:
+        self.url = url
+        self.source = source
+        self.on_close = on_close
+        self.live = live
+        self.closed = False
+        """Whether the stream has ended or has no subscribers left."""
+        self.shared = False
+        """Whether the frames are decoded by the thread for several subscribers."""
+        self._subscriptions: list[StreamSubscription] = []
+        self._frames = 0
+        self._lock = Lock()
+        self._read_lock = Lock()
+        self._thread = Thread(target=self._read, name="shared-decode", daemon=True)
+
+    @property
+    def subscribers(self) -> int:
+        """The number of tasks subscribed to the stream."""
+        return len(self._subscriptions)
+
+    def subscribe(
+        self, params: FFprobeParameters, pool_size: int, queue_size: int, task_id: int = 0
+    ) -> StreamSubscription | None:
+        """
+        Adds a task to the subscribers of the stream. The second
+        subscriber starts decoding in the thread.
+
+        Parameters
+        ----------
+        params : FFprobeParameters
+            The parameters of the frames for the task.
+        pool_size : int
+            The number of frames the task may hold at once besides its queue.
+            The frame pools of the source grow by this number plus
+            `queue_size` until the task unsubscribes.
+        queue_size : int
+            The maximum number of frames waiting for the task.
+        task_id : int, optional
+            The ID of the video processing task (default is 0).
+
+        Returns
+        -------
+        StreamSubscription | None
+            The subscription, or None if the stream is already closed.
+        """
+        with self._lock:
+            if self.closed:
+                return None
+            buffers = pool_size + queue_size
+            subscription = StreamSubscription(self, params, buffers, queue_size, task_id)
+            for pool in (self.source.frame_pool, self.source.model_pool):
+                if pool is not None:
+                    pool.grow(buffers)
+            self._subscriptions.append(subscription)
+            if len(self._subscriptions) > 1 and not self.shared:
+                self.shared = True
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription: StreamSubscription) -> None:
+        """
+        Removes a task from the subscribers of the stream and the buffers
+        added for it from the frame pools. Decoding stops after the last
+        subscriber leaves.
+
+        Parameters
+        ----------
+        subscription : StreamSubscription
+            The subscription of the task.
+        """
+        with self._lock:
+            if subscription not in self._subscriptions:
+                return
+            self._subscriptions.remove(subscription)
+            for pool in (self.source.frame_pool, self.source.model_pool):
+                if pool is not None:
+                    pool.shrink(subscription.buffers)
+            empty = not self._subscriptions
+            notify = empty and not self.closed
+            if empty:
+                self.closed = True
+        if notify:
+            self.on_close(self)
+        if empty and not self.shared:
+            # Only the task that left has read the source
+            self.source.close()
+
+    def read_direct(self) -> FramePacket | None | object:
+        """
+        Reads the next frame of the source for the only subscriber.
+
+        Returns
+        -------
+        FramePacket | None | object
+            The packet of the source, None if the stream has ended,
+            or `SHARED` if the frames come from the decoding thread.
+        """
+        # A shared stream never goes back to direct reads
+        if self.shared:
+            return self.SHARED
+        with self._read_lock:
+            if self.shared:
+                return self.SHARED
+            packet = self.source.read()
+        if packet is None:
+            with self._lock:
+                notify = not self.closed
+                self.closed = True
+            if notify:
+                self.on_close(self)
+        return packet
+
+    def _read(self) -> None:
+        try:
+            while not self.closed:
+                # A direct read of the first subscriber may still be running
+                with self._read_lock:
+                    packet = self.source.read()
+                if packet is None:
+                    break
+                self._frames += 1
+                with self._lock:
+                    # The references are taken while the subscribers
+                    # cannot change, the frames are passed without the lock,
+                    # so a slow subscriber does not hold up the others
+                    # subscribing or leaving (a closed one releases them)
+                    packets = [
+                        (subscription, self._retain(packet))
+                        for subscription in self._subscriptions
+                    ]
+                for subscription, retained in packets:
+                    subscription.put(retained, self._frames)
+                packet.release_frame()
+                packet.release_model_frame()
+        finally:
+            with self._lock:
+                was_closed = self.closed
+                self.closed = True
+                subscriptions = list(self._subscriptions)
+            for subscription in subscriptions:
+                subscription.put(None)
+            if not was_closed:
+                self.on_close(self)
+            self.source.close()
+
+    @staticmethod
+    def _retain(packet: FramePacket) -> FramePacket:
+        return FramePacket(
+            frame=packet.frame,
+            timestamp=packet.timestamp,
+            model_frame=packet.model_frame,
+            frame_buffer=packet.frame_buffer and packet.frame_buffer.retain(),
+            model_buffer=packet.model_buffer and packet.model_buffer.retain(),
+        )
+
+
+class StreamMultiplexer:
+    """
+    Shares the decoding of a stream between the tasks that process it.
+
+    The first task that subscribes to a stream opens it, the next ones
+    receive the same frames, and the stream is closed when the last of them
+    unsubscribes. The streams are told apart by the URL and the options
+    of the source (see `FrameSource.has_options`), so tasks only share
+    the frames decoded the way each of them would decode them. Each task
+    still has its own tracker, region of interest and frame rate, since
+    they are applied to the received frames.
+    """
+
+    def __init__(self) -> None:
+        self._streams: dict[tuple, SharedStream] = {}
+        self._lock = Lock()
+        # Opening a stream may take seconds, so only the same stream waits
+        # for it. The lock of a key is kept while it has a stream or a task
+        # subscribing to it, with the number of those tasks.
+        self._key_locks: dict[tuple, list] = {}
+
+    def params(self, url: str) -> FFprobeParameters | None:
+        """
+        Returns the parameters of a stream that is already decoded,
+        so another task on it does not have to probe it.
+
+        Parameters
+        ----------
+        url : str
+            The URL of the stream.
+
+        Returns
+        -------
+        FFprobeParameters | None
+            A copy of the parameters of the source of the stream,
+            or None if nobody decodes it.
+        """
+        with self._lock:
+            for (stream_url, _), stream in self._streams.items():
+                if stream_url == url:
+                    return stream.source.params.model_copy()
+        return None
+
+    def subscribe(
+        self,
+        url: str,
+        options: dict,
+        open_source: Callable[[], FrameSource],
+        params: FFprobeParameters,
+        pool_size: int,
+        queue_size: int,
+        task_id: int = 0,
+    ) -> StreamSubscription:
+        """
+        Subscribes a task to a stream, opening it if nobody decodes it
+        with the same options yet.
+
+        Parameters
+        ----------
+        url : str
+            The URL of the stream.
+        options : dict
+            The options of the source (see `FrameSource.has_options`).
+        open_source : Callable[[], FrameSource]
+            Opens the source of the stream with these options, it is only
+            called for the first subscriber. Its frame pools only need
+            the frame being distributed, they grow for each subscriber.
+        params : FFprobeParameters
+            The parameters of the frames for the task.
+        pool_size : int
+            The number of frames the task may hold at once besides its queue.
+        queue_size : int
+            The maximum number of frames waiting for the task.
+        task_id : int, optional
+            The ID of the video processing task (default is 0).
+
+        Returns
+        -------
+        StreamSubscription
+            The subscription of the task.
+        """
+        key = (url, tuple(sorted(options.items())))
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, [Lock(), 0])
+            key_lock[1] += 1
+        try:
+            with key_lock[0]:
+                with self._lock:
+                    stream = self._streams.get(key)
+                subscription = None
+                if stream is not None:
+                    subscription = stream.subscribe(params, pool_size, queue_size, task_id)
+                if subscription is None:
+                    stream = SharedStream(url, open_source(), self._remove, live=is_live(url))
+                    subscription = stream.subscribe(params, pool_size, queue_size, task_id)
+                    with self._lock:
+                        self._streams[key] = stream
+        finally:
+            with self._lock:
+                key_lock[1] -= 1
+                self._prune(key)
+        return subscription
+
+    def streams(self) -> dict[str, int]:
+        """
+        Returns the number of subscribers of every open stream.
+
+        Returns
+        -------
+        dict[str, int]
+            The URL of the stream mapped to its number of subscribers.
+        """
+        streams: dict[str, int] = defaultdict(int)
+        with self._lock:
+            for (url, _), stream in self._streams.items():
+                streams[url] += stream.subscribers
+        return dict(streams)
+
+    def _remove(self, stream: SharedStream) -> None:
+        with self._lock:
+            for key, value in list(self._streams.items()):
+                if value is stream:
+                    del self._streams[key]
+                    self._prune(key)
+
+    def _prune(self, key: tuple) -> None:
+        # Called under `_lock`
+        key_lock = self._key_locks.get(key)
+        if key_lock is not None and not key_lock[1] and key not in self._streams:
+            del self._key_locks[key]
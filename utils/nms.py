@@ -1,56 +1,188 @@
 import numpy as np
 
+CHUNK_SIZE = 128
+"""The number of boxes NMS processes at once."""
 
-def non_maximum_suppression(boxes, scores, iou_threshold):
+
+def _prepare(boxes, scores, classes=None, top_k=None):
+    """
+    Sort the boxes by score, keep the best `top_k` of them and move the boxes
+    of different classes apart, so that they never overlap.
+
+    Args:
+        boxes (numpy.ndarray): Array of bounding boxes with shape (N, 4).
+        scores (numpy.ndarray): Array of scores with shape (N,).
+        classes (numpy.ndarray, optional): Array of class indices with shape (N,).
+        top_k (int, optional): The number of the best boxes to keep.
+
+    Returns:
+        tuple: The indices of the kept boxes in descending order of their
+               scores and the kept boxes. They keep the floating point type
+               of the input, so the IoU is computed and compared with the
+               threshold exactly as by the box by box NMS. With classes
+               they are float64: the class offsets reach the size of the
+               frame times the number of classes, where float32 would round
+               the coordinates to a fraction of a pixel.
+    """
+    order = scores.argsort()[::-1]
+    if top_k is not None and top_k > 0:
+        order = order[:top_k]
+    dtype = np.float64 if classes is not None else np.result_type(boxes.dtype, np.float32)
+    prepared = boxes[order].astype(dtype)
+    if classes is not None and len(order):
+        # The extent of all boxes plus the pixel added to the sizes below
+        offset = prepared.max() - min(prepared.min(), 0) + 2
+        prepared += (classes[order] * offset)[:, None]
+    return order, prepared
+
+
+def _pixel_iou(boxes1, boxes2):
+    """
+    Compute the pairwise IoU of boxes with inclusive pixel coordinates,
+    so that the size of a box is `x2 - x1 + 1`.
+
+    Args:
+        boxes1 (numpy.ndarray): Array of bounding boxes with shape (N, 4).
+        boxes2 (numpy.ndarray): Array of bounding boxes with shape (M, 4).
+
+    Returns:
+        numpy.ndarray: IoU of every pair of boxes with shape (N, M).
+    """
+    # The temporary matrices are reused, NMS computes large blocks of them
+    iou = np.minimum(boxes1[:, None, 2], boxes2[None, :, 2])
+    iou -= np.maximum(boxes1[:, None, 0], boxes2[None, :, 0])
+    iou += 1
+    np.maximum(iou, 0, out=iou)
+    union = np.minimum(boxes1[:, None, 3], boxes2[None, :, 3])
+    union -= np.maximum(boxes1[:, None, 1], boxes2[None, :, 1])
+    union += 1
+    np.maximum(union, 0, out=union)
+    iou *= union  # The intersection
+
+    areas1 = (boxes1[:, 2] - boxes1[:, 0] + 1) * (boxes1[:, 3] - boxes1[:, 1] + 1)
+    areas2 = (boxes2[:, 2] - boxes2[:, 0] + 1) * (boxes2[:, 3] - boxes2[:, 1] + 1)
+    np.add(areas1[:, None], areas2[None, :], out=union)
+    union -= iou
+    iou /= union
+    return iou
+
+
+def non_maximum_suppression(boxes, scores, iou_threshold, classes=None, top_k=None):
     """
     Perform Non-Maximum Suppression (NMS) on bounding boxes.
 
+    The boxes are processed in blocks of `CHUNK_SIZE` in descending order
+    of scores. The overlaps of a block with all the boxes kept so far are
+    computed at once and remove the suppressed ones, then the overlaps of
+    the remaining boxes of the block with each other are packed into bit
+    masks of the boxes with lower scores each of them suppresses, and the
+    greedy pass over the block only merges the masks of the kept boxes.
+    The kept boxes are the same as with the box by box greedy NMS.
+
     Args:
         boxes (numpy.ndarray): Array of bounding boxes with shape (N, 4).
                                Each box is represented as [x1, y1, x2, y2].
         scores (numpy.ndarray): Array of scores with shape (N,).
         iou_threshold (float): Intersection-over-Union (IoU) threshold for suppression.
+        classes (numpy.ndarray, optional): Array of class indices with shape (N,).
+                                           If given, boxes suppress only the boxes
+                                           of their own class.
+        top_k (int, optional): Only the `top_k` boxes with the highest scores
+                               take part in NMS, the rest are dropped.
 
     Returns:
-        numpy.ndarray: Indices of the boxes to keep.
+        numpy.ndarray: Indices of the boxes to keep in descending order of scores.
     """
     if len(boxes) == 0:
         return np.array([], dtype=int)
 
-    # Compute areas of all boxes
-    x1 = boxes[:, 0]
-    y1 = boxes[:, 1]
-    x2 = boxes[:, 2]
-    y2 = boxes[:, 3]
-    
-    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    order, prepared = _prepare(boxes, scores, classes, top_k)
+    keep = np.empty(0, dtype=int)
+    for start in range(0, len(order), CHUNK_SIZE):
+        block = prepared[start:start + CHUNK_SIZE]
+        # The boxes of the block that no kept box suppresses
+        if len(keep):
+            overlaps = _pixel_iou(block, prepared[keep]) > iou_threshold
+            remaining = np.flatnonzero(~overlaps.any(axis=1))
+        else:
+            remaining = np.arange(len(block))
+        if not len(remaining):
+            continue
 
-    # Sort by scores in descending order
-    order = scores.argsort()[::-1]
+        candidates = block[remaining]
+        suppressed = np.triu(_pixel_iou(candidates, candidates) > iou_threshold, 1)
+        masks = np.packbits(suppressed, axis=1)
+        removed = np.zeros(masks.shape[1], dtype=np.uint8)
+        kept = []
+        for i in range(len(remaining)):
+            if removed[i >> 3] & (128 >> (i & 7)):
+                continue
+            kept.append(i)
+            np.bitwise_or(removed, masks[i], out=removed)
+        keep = np.concatenate([keep, start + remaining[kept]])
 
-    keep = []
+    return order[keep]
 
-    while order.size > 0:
-        # Select the box with the highest score and add it to the keep list
-        i = order[0]
-        keep.append(i)
 
-        # Compute IoU of the selected box with the rest
-        xx1 = np.maximum(x1[i], x1[order[1:]])
-        yy1 = np.maximum(y1[i], y1[order[1:]])
-        xx2 = np.minimum(x2[i], x2[order[1:]])
-        yy2 = np.minimum(y2[i], y2[order[1:]])
+def soft_nms(boxes, scores, sigma, score_threshold, classes=None, top_k=None):
+    """
+    Perform Gaussian Soft-NMS on bounding boxes: instead of removing the boxes
+    that overlap a better one, their scores are multiplied by exp(-IoU² / sigma),
+    so that close objects, e.g. in a herd, are kept with lower scores.
 
-        w = np.maximum(0, xx2 - xx1 + 1)
-        h = np.maximum(0, yy2 - yy1 + 1)
-        intersection = w * h
+    Args:
+        boxes (numpy.ndarray): Array of bounding boxes with shape (N, 4).
+                               Each box is represented as [x1, y1, x2, y2].
+        scores (numpy.ndarray): Array of scores with shape (N,).
+        sigma (float): The width of the Gaussian decay of the scores.
+        score_threshold (float): The boxes whose scores decay below it are removed.
+        classes (numpy.ndarray, optional): Array of class indices with shape (N,).
+                                           If given, boxes decay only the scores
+                                           of their own class.
+        top_k (int, optional): Only the `top_k` boxes with the highest scores
+                               take part in NMS, the rest are dropped.
 
-        union = areas[i] + areas[order[1:]] - intersection
+    Returns:
+        tuple: Indices of the boxes to keep in descending order of their new
+               scores, and the new scores of these boxes.
+    """
+    if len(boxes) == 0:
+        return np.array([], dtype=int), np.array([], dtype=np.float32)
+
+    order, prepared = _prepare(boxes, scores, classes, top_k)
+    decayed = scores[order].astype(np.float64)
+    remaining = np.arange(len(order))
+    keep = []
+    keep_scores = []
+    while len(remaining):
+        best = np.argmax(decayed[remaining])
+        i = remaining[best]
+        keep.append(i)
+        keep_scores.append(decayed[i])
+        remaining = np.delete(remaining, best)
+        if not len(remaining):
+            break
+        iou = _pixel_iou(prepared[i:i + 1], prepared[remaining])[0]
+        decayed[remaining] *= np.exp(-(iou**2) / sigma)
+        remaining = remaining[decayed[remaining] >= score_threshold]
+
+    return order[np.array(keep, dtype=int)], np.array(keep_scores, dtype=scores.dtype)
 
-        iou = intersection / union
 
-        # Keep boxes with IoU less than the threshold
-        remaining_indices = np.where(iou <= iou_threshold)[0]
-        order = order[remaining_indices + 1]
+def box_iou(boxes1, boxes2):
+    """
+    Compute the pairwise Intersection-over-Union (IoU) of two sets of boxes
+    the same way as NMS does (see `_pixel_iou`), so that the overlaps
+    measured elsewhere agree with the suppression.
+
+    Args:
+        boxes1 (numpy.ndarray): Array of bounding boxes with shape (N, 4).
+        boxes2 (numpy.ndarray): Array of bounding boxes with shape (M, 4).
+                                Each box is represented as [x1, y1, x2, y2].
 
-    return np.array(keep, dtype=int)
\ No newline at end of file
+    Returns:
+        numpy.ndarray: IoU of every pair of boxes with shape (N, M).
+    """
+    return _pixel_iou(
+        np.asarray(boxes1, dtype=np.float64), np.asarray(boxes2, dtype=np.float64)
+    )
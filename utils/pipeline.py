@@ -0,0 +1,186 @@
+from queue import Empty, Full, Queue
+from threading import Event, Thread
+from typing import Any, Callable
+
+
+class FramePipeline:
+    """
+    Runs the stages of the inference cycle in separate threads connected
+    by bounded queues, so that decoding, inference, tracking and output
+    of neighbouring frames overlap in time.
+
+    Every stage is served by exactly one thread and every queue is FIFO,
+    so frames leave the pipeline in the order they were produced and each
+    stage (in particular the tracker) sees them in the same order as
+    in the sequential cycle.
+    The results only match the sequential cycle if no stage depends on
+    what a later stage did with the previous items, since the stages
+    of neighbouring items overlap in time.
+
+    Parameters
+    ----------
+    source : Callable[[], Any | None]
+        The first stage. It is called in the thread that runs the pipeline
+        and returns the next item or None when there is nothing left.
+    stages : list[tuple[str, Callable[[Any], Any]]]
+        The named stages that follow the source. Each stage receives
+        the item returned by the previous one.
+    queue_size : int
+        The maximum number of items waiting in front of each stage.
+    is_running : Callable[[], bool]
+        It is polled between items and stops the pipeline when False.
+    on_item : Callable[[dict[str, int]], None], optional
+        It is called with the current queue depths after each produced item.
+    on_drop : Callable[[Any], None], optional
+        It is called with every item that is dropped when the pipeline
+        is aborted, including the one whose stage failed, e.g. to return
+        its frame buffers to their pools. It must tolerate items that
+        were already partly released.
+    """
+
+    _SENTINEL = object()
+
+    def __init__(
+        self,
+        source: Callable[[], Any | None],
+        stages: list[tuple[str, Callable[[Any], Any]]],
+        queue_size: int,
+        is_running: Callable[[], bool],
+        on_item: Callable[[dict[str, int]], None] | None = None,
+        on_drop: Callable[[Any], None] | None = None,
+    ) -> None:
+        self.source = source
+        self.stages = stages
+        self.is_running = is_running
+        self.on_item = on_item
+        self.on_drop = on_drop
+        self.queues: dict[str, Queue] = {
+            name: Queue(maxsize=max(1, queue_size)) for name, _ in stages
+        }
+        """The bounded input queue of each stage."""
+        self._abort = Event()
+        self._error: BaseException | None = None
+
+    def queue_depth(self) -> dict[str, int]:
+        """
+        Returns the number of items waiting in front of each stage.
+
+        Returns
+        -------
+        dict[str, int]
+            The stage name mapped to the size of its input queue.
+        """
+        return {name: q.qsize() for name, q in self.queues.items()}
+
+    def _put(self, q: Queue, item: Any) -> bool:
+        """
+        Puts an item into a queue, giving up if the pipeline was aborted.
+
+        Returns
+        -------
+        bool
+            True if the item was queued.
+        """
+        while not self._abort.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _drop(self, item: Any) -> None:
+        """
+        Passes an item that will not be processed to `on_drop`.
+        """
+        if self.on_drop is not None and item is not self._SENTINEL:
+            self.on_drop(item)
+
+    def _drain(self) -> None:
+        """
+        Drops the items left in the queues after the stage threads ended.
+        """
+        for q in self.queues.values():
+            while True:
+                try:
+                    self._drop(q.get_nowait())
+                except Empty:
+                    break
+
+    def _worker(self, index: int) -> None:
+        """
+        Serves one stage: takes items from its queue, processes them and
+        passes the results on to the next stage.
+        """
+        name, func = self.stages[index]
+        in_queue = self.queues[name]
+        out_queue = (
+            self.queues[self.stages[index + 1][0]]
+            if index + 1 < len(self.stages)
+            else None
+        )
+
+        while True:
+            try:
+                item = in_queue.get(timeout=0.1)
+            except Empty:
+                if self._abort.is_set():
+                    return
+                continue
+            if item is self._SENTINEL:
+                if out_queue is not None:
+                    self._put(out_queue, self._SENTINEL)
+                return
+            if self._abort.is_set():
+                self._drop(item)
+                continue
+            try:
+                result = func(item)
+            except BaseException as e:  # pylint: disable=broad-except
+                self._error = e
+                self._abort.set()
+                self._drop(item)
+                return
+            if out_queue is not None and not self._put(out_queue, result):
+                self._drop(result)
+
+    def run(self) -> None:
+        """
+        Starts the stage threads, feeds them from the source until it is
+        exhausted or the pipeline is stopped, and waits for every
+        queued item to be processed.
+
+        Raises
+        ------
+        BaseException
+            The first exception raised by any stage.
+        """
+        threads = [
+            Thread(target=self._worker, args=(i,), name=f"pipeline-{name}", daemon=True)
+            for i, (name, _) in enumerate(self.stages)
+        ]
+        for thread in threads:
+            thread.start()
+
+        first_queue = self.queues[self.stages[0][0]]
+        try:
+            while self.is_running() and not self._abort.is_set():
+                item = self.source()
+                if item is None:
+                    break
+                if not self._put(first_queue, item):
+                    self._drop(item)
+                    break
+                if self.on_item is not None:
+                    self.on_item(self.queue_depth())
+        except BaseException as e:  # pylint: disable=broad-except
+            self._error = e
+            self._abort.set()
+        finally:
+            self._put(first_queue, self._SENTINEL)
+            for thread in threads:
+                thread.join()
+            self._drain()
+
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,123 @@
+import cv2
+import numpy as np
+
+from utils.dataclasses import LetterboxGeometry
+
+
+class LetterboxPreprocessor:
+    """
+    Prepares the frames of one stream for the neural network in a single
+    preallocated tensor.
+
+    The frame is resized, converted from BGR to RGB, normalized to [0, 1]
+    and transposed to NCHW by writing straight into the tensor, so no other
+    full-size arrays are created. The geometry is the same for all frames
+    of a stream, therefore the padding is filled only once. The result is
+    identical to `cvtColor`, `letterbox`, `astype("float32") / 255.0` and
+    `transpose` applied one after another.
+
+    Models exported with the preprocessing in their graph (see
+    `models/convert.py --uint8-input`) take the letterboxed uint8 BGR
+    image instead, so with `raw` the frame is only resized into
+    the uint8 tensor of shape (1, height, width, 3).
+
+    The returned tensor is overwritten by the next call, so it must be
+    consumed (e.g. by the model) before the next frame is prepared.
+
+    Parameters
+    ----------
+    geometry : LetterboxGeometry
+        The resize and padding of the frames of the stream.
+    color : tuple[int, int, int], optional
+        The color of the padding (default is (114, 114, 114)).
+    raw : bool, optional
+        Whether to prepare uint8 BGR NHWC input (default is False).
+    tensor : np.ndarray | None, optional
+        The tensor of shape (1, ...) to write into, e.g. a slice of a batch
+        (default is a new one).
+    """
+
+    def __init__(
+        self,
+        geometry: LetterboxGeometry,
+        color: tuple[int, int, int] = (114, 114, 114),
+        raw: bool = False,
+        tensor: np.ndarray | None = None,
+    ) -> None:
+        self.geometry = geometry
+        self.raw = raw
+        height, width = geometry.new_shape
+        top, _, left, _ = geometry.border
+        unpad_width, unpad_height = geometry.new_unpad
+        rows = slice(top, top + unpad_height)
+        columns = slice(left, left + unpad_width)
+
+        if raw:
+            shape, dtype = (1, height, width, 3), np.uint8
+        else:
+            shape, dtype = (1, 3, height, width), np.float32
+        if tensor is None:
+            tensor = np.empty(shape, dtype=dtype)
+        elif tensor.shape != shape or tensor.dtype != dtype:
+            raise ValueError(f"The tensor must be {dtype.__name__} of shape {shape}")
+        self.tensor = tensor
+        """The contiguous input tensor of the model."""
+        # The part of the tensor without the padding, HWC or CHW
+        if raw:
+            self.tensor[0] = color
+            self._image = self.tensor[0, rows, columns]
+        else:
+            for channel, value in enumerate(color):
+                self.tensor[0, channel] = np.float32(value) / np.float32(255.0)
+            self._image = self.tensor[0, :, rows, columns]
+
+    def __call__(self, img: np.ndarray) -> np.ndarray:
+        """
+        Prepares a BGR frame of the stream.
+
+        Parameters
+        ----------
+        img : np.ndarray
+            The original BGR frame.
+
+        Returns
+        -------
+        np.ndarray
+            The tensor with the frame.
+        """
+        resize = img.shape[1::-1] != self.geometry.new_unpad
+        if self.raw:
+            if resize:
+                img = cv2.resize(
+                    img, self.geometry.new_unpad, dst=self._image, interpolation=cv2.INTER_LINEAR
+                )
+            if img is not self._image:
+                self._image[...] = img
+            return self.tensor
+
+        if resize:
+            img = cv2.resize(img, self.geometry.new_unpad, interpolation=cv2.INTER_LINEAR)
+        # Reversing the channels of the CHW view converts BGR to RGB
+        np.divide(img.transpose(2, 0, 1)[::-1], 255.0, out=self._image, dtype=np.float32)
+        return self.tensor
+
+    def letterboxed(self, img: np.ndarray) -> np.ndarray:
+        """
+        Prepares an RGB frame that was already resized and padded
+        according to the geometry.
+
+        Parameters
+        ----------
+        img : np.ndarray
+            The letterboxed RGB frame.
+
+        Returns
+        -------
+        np.ndarray
+            The tensor with the frame.
+        """
+        if self.raw:
+            self.tensor[0] = img[..., ::-1]
+            return self.tensor
+        np.divide(img.transpose(2, 0, 1), 255.0, out=self.tensor[0], dtype=np.float32)
+        return self.tensor
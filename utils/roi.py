@@ -0,0 +1,122 @@
+import cv2
+import numpy as np
+
+from utils.dataclasses import RegionOfInterest
+
+
+def parse_regions(properties: dict, width: int, height: int) -> list[RegionOfInterest]:
+    """
+    Collects the regions of interest of a task from its properties.
+
+    The `corners` property is a rectangle given as [up, left, bottom, right].
+    The `regions` property is a list of such rectangles and polygons,
+    each polygon is a list of [x, y] vertices. The regions are clipped
+    to the frame, and the empty ones are skipped.
+
+    Parameters
+    ----------
+    properties : dict
+        The properties of the task.
+    width : int
+        The width of the frames.
+    height : int
+        The height of the frames.
+
+    Returns
+    -------
+    list[RegionOfInterest]
+        The regions, or an empty list if the whole frame is processed.
+
+    Raises
+    ------
+    ValueError
+        If a region is neither a rectangle nor a polygon.
+    """
+    shapes = []
+    if properties.get("corners"):
+        shapes.append(properties["corners"])
+    shapes.extend(properties.get("regions") or [])
+
+    regions = []
+    for shape in shapes:
+        if len(shape) == 4 and all(np.isscalar(value) for value in shape):
+            up, left, bottom, right = (int(value) for value in shape)
+            polygon = None
+        else:
+            polygon = np.asarray(shape, dtype=np.int32)
+            if polygon.ndim != 2 or polygon.shape[1] != 2 or len(polygon) < 3:
+                raise ValueError(f"A region must be a rectangle or a polygon: {shape}")
+            (left, up), (right, bottom) = polygon.min(axis=0), polygon.max(axis=0) + 1
+
+        box = (max(left, 0), max(up, 0), min(right, width), min(bottom, height))
+        if box[0] >= box[2] or box[1] >= box[3]:
+            continue
+        regions.append(RegionOfInterest(box=box, polygon=polygon))
+    return regions
+
+
+def covers_frame(regions: list[RegionOfInterest], width: int, height: int) -> bool:
+    """
+    Checks whether the regions leave no part of the frame out.
+
+    Parameters
+    ----------
+    regions : list[RegionOfInterest]
+        The regions of interest.
+    width : int
+        The width of the frames.
+    height : int
+        The height of the frames.
+
+    Returns
+    -------
+    bool
+        True if there are no regions or one of them is the whole frame.
+    """
+    return not regions or any(
+        region.polygon is None and region.box == (0, 0, width, height)
+        for region in regions
+    )
+
+
+def inside_polygon(boxes: np.ndarray, polygon: np.ndarray) -> np.ndarray:
+    """
+    Checks which boxes have their centers inside a polygon.
+
+    Parameters
+    ----------
+    boxes : np.ndarray
+        The boxes [x_min, y_min, x_max, y_max] in frame coordinates.
+    polygon : np.ndarray
+        The vertices (x, y) of the polygon.
+
+    Returns
+    -------
+    np.ndarray
+        The boolean mask of the boxes inside the polygon.
+    """
+    contour = polygon.reshape(-1, 1, 2)
+    centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+    return np.array(
+        [cv2.pointPolygonTest(contour, (float(x), float(y)), False) >= 0 for x, y in centers],
+        dtype=bool,
+    )
+
+
+def draw_regions(img: np.ndarray, regions: list[RegionOfInterest]) -> None:
+    """
+    Outlines the regions of interest on a frame in place.
+
+    Parameters
+    ----------
+    img : np.ndarray
+        The frame.
+    regions : list[RegionOfInterest]
+        The regions of interest.
+    """
+    for region in regions:
+        if region.polygon is None:
+            left, up, right, bottom = region.box
+            cv2.rectangle(img, (left, up), (right - 1, bottom - 1), (0, 255, 255), 2)
+        else:
+            cv2.polylines(img, [region.polygon.reshape(-1, 1, 2)], True, (0, 255, 255), 2)
@@ -0,0 +1,211 @@
+from threading import Condition, Thread
+from typing import BinaryIO
+
+import numpy as np
+
+from utils.validate import validate_unix_timestamp
+
+
+H264_NAL_SLICE = 1
+"""The NAL unit type of a coded slice of a non-IDR picture."""
+H264_NAL_IDR_SLICE = 5
+"""The NAL unit type of a coded slice of an IDR picture."""
+H264_NAL_SEI = 6
+"""The NAL unit type of supplemental enhancement information."""
+
+NAL_HEAD_SIZE = 32
+"""The number of leading bytes of each NAL unit that are kept for parsing."""
+
+
+def unescape_rbsp(nal: bytes) -> bytes:
+    """
+    Removes emulation prevention bytes (0x000003 -> 0x0000) from a NAL unit.
+
+    Parameters
+    ----------
+    nal : bytes
+        The NAL unit starting with its header byte.
+
+    Returns
+    -------
+    bytes
+        The raw byte sequence payload with the header byte.
+    """
+    return nal.replace(b"\x00\x00\x03", b"\x00\x00")
+
+
+def parse_sei_timestamp(nal: bytes) -> int | None:
+    """
+    Extracts the camera timestamp from an H.264 SEI NAL unit.
+
+    The cameras write the timestamp as a little-endian 64-bit integer
+    right after the header byte, the payload type and the payload size
+    of the first SEI message.
+
+    Parameters
+    ----------
+    nal : bytes
+        The SEI NAL unit starting with its header byte.
+
+    Returns
+    -------
+    int | None
+        The timestamp, or None if the unit does not carry a valid one.
+    """
+    rbsp = unescape_rbsp(nal)
+    if len(rbsp) < 11:
+        return None
+    timestamp = int.from_bytes(rbsp[3:11], "little", signed=True)
+    if not validate_unix_timestamp(timestamp):
+        return None
+    return timestamp
+
+
+class SEITimestampReader:
+    """
+    Reads an H.264 Annex B elementary stream (for example, a stream copy
+    output of the ffmpeg read process) in a background thread and collects
+    the SEI timestamp of every picture.
+
+    Pictures are numbered in decoding order starting from 0. For streams
+    without B-frames this is also the order of the decoded frames,
+    so the input frame number reported by ffmpeg for an output frame
+    is the number of its picture. A picture without its own SEI message
+    gets the timestamp of the previous one.
+
+    Parameters
+    ----------
+    pipe : BinaryIO
+        The binary stream with the elementary stream.
+    chunk_size : int, optional
+        The number of bytes read from the pipe at once (default is 65536).
+    """
+
+    def __init__(self, pipe: BinaryIO, chunk_size: int = 1 << 16) -> None:
+        self.pipe = pipe
+        self.chunk_size = chunk_size
+        self._timestamps: dict[int, int] = {}
+        self._pictures = 0
+        self._pending: int | None = None
+        self._last: int | None = None
+        self._closed = False
+        self._condition = Condition()
+
+        self._nal = bytearray()
+        self._in_nal = False
+        self._tail = b""
+
+        self._thread = Thread(target=self._read, name="sei-reader", daemon=True)
+        self._thread.start()
+
+    def timestamp(self, picture: int, timeout: float = 1.0) -> int | None:
+        """
+        Returns the SEI timestamp of a picture, waiting until the picture
+        is parsed if the elementary stream is behind the decoded frames.
+
+        Parameters
+        ----------
+        picture : int
+            The number of the picture in decoding order.
+        timeout : float, optional
+            The maximum time to wait for the picture in seconds (default is 1).
+
+        Returns
+        -------
+        int | None
+            The timestamp, or None if the picture has none.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._pictures > picture or self._closed, timeout
+            )
+            # Frames are requested in order, so older pictures are not needed anymore
+            for old in [p for p in self._timestamps if p < picture]:
+                del self._timestamps[old]
+            return self._timestamps.get(picture)
+
+    def close(self) -> None:
+        """
+        Closes the pipe and waits for the reading thread to finish.
+        """
+        self.pipe.close()
+        self._thread.join(timeout=5)
+
+    def _read(self) -> None:
+        try:
+            while True:
+                chunk = self.pipe.read1(self.chunk_size)
+                if not chunk:
+                    break
+                self.feed(chunk)
+        except (OSError, ValueError):
+            # The pipe was closed by `close`
+            pass
+        finally:
+            with self._condition:
+                self._finish_nal()
+                self._closed = True
+                self._condition.notify_all()
+
+    def feed(self, chunk: bytes) -> None:
+        """
+        Parses the next part of the elementary stream.
+
+        Only the first `NAL_HEAD_SIZE` bytes of each NAL unit are kept,
+        so large slices are skipped without copying them.
+
+        Parameters
+        ----------
+        chunk : bytes
+            The next bytes of the stream.
+        """
+        data = self._tail + chunk
+        arr = np.frombuffer(data, np.uint8)
+        if len(arr) < 3:
+            self._tail = data
+            return
+
+        starts = np.flatnonzero((arr[:-2] == 0) & (arr[1:-1] == 0) & (arr[2:] == 1))
+        pos = 0
+        for start in starts:
+            if self._in_nal:
+                self._append(data, pos, start)
+            self._finish_nal()
+            self._in_nal = True
+            pos = start + 3
+
+        # The last bytes may be the beginning of a start code
+        end = max(pos, len(data) - 2)
+        if self._in_nal:
+            self._append(data, pos, end)
+        self._tail = data[end:]
+
+    def _append(self, data: bytes, begin: int, end: int) -> None:
+        missing = NAL_HEAD_SIZE - len(self._nal)
+        if missing > 0:
+            self._nal += data[begin : min(end, begin + missing)]
+
+    def _finish_nal(self) -> None:
+        nal = bytes(self._nal)
+        self._nal = bytearray()
+        if not self._in_nal or not nal:
+            return
+
+        nal_type = nal[0] & 0x1F
+        if nal_type == H264_NAL_SEI:
+            timestamp = parse_sei_timestamp(nal)
+            if timestamp is not None:
+                self._pending = timestamp
+        elif nal_type in (H264_NAL_SLICE, H264_NAL_IDR_SLICE):
+            # first_mb_in_slice is ue(v), its first bit is 1 only for 0,
+            # i.e. for the first slice of a new picture
+            if len(nal) > 1 and nal[1] & 0x80:
+                with self._condition:
+                    # A picture without its own SEI keeps the last timestamp
+                    if self._pending is not None:
+                        self._last = self._pending
+                        self._pending = None
+                    if self._last is not None:
+                        self._timestamps[self._pictures] = self._last
+                    self._pictures += 1
+                    self._condition.notify_all()
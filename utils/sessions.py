@@ -0,0 +1,291 @@
+import hashlib
+import json
+import os
+import platform
+import time
+from contextlib import contextmanager
+from queue import Queue
+from threading import Lock
+from typing import Iterator
+
+import onnxruntime as ort
+
+EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+OPTIMIZATION_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+
+def make_session_options(config: dict) -> ort.SessionOptions:
+    """
+    Creates the options of an ONNX Runtime session from the configuration.
+
+    Parameters
+    ----------
+    config : dict
+        The options: `intra_op_num_threads` and `inter_op_num_threads`
+        (0 lets ONNX Runtime choose), `execution_mode` ("sequential" or
+        "parallel"), `graph_optimization_level` ("disable", "basic",
+        "extended" or "all"), `enable_cpu_mem_arena` and `enable_mem_pattern`.
+        The missing ones keep the defaults of ONNX Runtime.
+
+    Returns
+    -------
+    ort.SessionOptions
+        The session options.
+
+    Raises
+    ------
+    ValueError
+        If the execution mode or the optimization level is unknown.
+    """
+    options = ort.SessionOptions()
+    for name in ("intra_op_num_threads", "inter_op_num_threads"):
+        if name in config:
+            setattr(options, name, int(config[name]))
+    for name in ("enable_cpu_mem_arena", "enable_mem_pattern"):
+        if name in config:
+            setattr(options, name, bool(config[name]))
+
+    if "execution_mode" in config:
+        mode = config["execution_mode"]
+        if mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode: {mode}")
+        options.execution_mode = EXECUTION_MODES[mode]
+    if "graph_optimization_level" in config:
+        level = config["graph_optimization_level"]
+        if level not in OPTIMIZATION_LEVELS:
+            raise ValueError(f"Unknown graph optimization level: {level}")
+        options.graph_optimization_level = OPTIMIZATION_LEVELS[level]
+    return options
+
+
+def host_signature() -> str:
+    """
+    Describes the processor the optimized graphs are made for. The graph
+    optimizations may use the instructions of the processor (e.g. AVX-512
+    layouts), so a graph is not portable to another one.
+
+    Returns
+    -------
+    str
+        The architecture and, where the system reports them,
+        the model and the instruction set flags of the processor.
+    """
+    parts = [platform.system(), platform.machine(), platform.processor()]
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name.strip() in ("model name", "flags", "Features"):
+                    parts.append(value.strip())
+                elif not line.strip():
+                    # The first processor is enough
+                    break
+    except OSError:
+        pass
+    return "|".join(parts)
+
+
+def optimized_model_path(model_path: str, config: dict, providers: list[str]) -> str:
+    """
+    Returns the path of the optimized copy of a model in the cache next to it.
+
+    The name of the copy includes the hash of the model, the version of
+    ONNX Runtime, all the session options, the available execution
+    providers and the processor (see `host_signature`), so a copy is never
+    used with another model, runtime, configuration or host.
+
+    Parameters
+    ----------
+    model_path : str
+        Path to the ONNX model.
+    config : dict
+        The session options (see `make_session_options`).
+    providers : list[str]
+        The execution providers in the order of preference.
+
+    Returns
+    -------
+    str
+        The path of the copy, which may not exist yet.
+    """
+    digest = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    available = ort.get_available_providers()
+    key = "|".join(
+        [
+            digest.hexdigest(),
+            ort.__version__,
+            json.dumps(config, sort_keys=True),
+            *(provider for provider in providers if provider in available),
+            host_signature(),
+        ]
+    )
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    return os.path.join(
+        os.path.dirname(os.path.abspath(model_path)),
+        ".ort_cache",
+        f"{name}.{hashlib.sha256(key.encode()).hexdigest()[:16]}.onnx",
+    )
+
+
+def load_optimized_model(
+    model_path: str, config: dict, providers: list[str]
+) -> tuple[str, ort.SessionOptions, bool]:
+    """
+    Finds the optimized copy of a model in the cache, or creates it
+    by optimizing the model once.
+
+    The copy is loaded with the graph optimizations disabled, since they
+    are already applied, so the sessions are created faster.
+
+    Parameters
+    ----------
+    model_path : str
+        Path to the ONNX model.
+    config : dict
+        The session options (see `make_session_options`).
+    providers : list[str]
+        The execution providers in the order of preference.
+
+    Returns
+    -------
+    tuple[str, ort.SessionOptions, bool]
+        The path of the copy, the options to create its sessions with, and
+        whether the copy was already in the cache.
+
+    Raises
+    ------
+    OSError
+        If the cache cannot be written.
+    """
+    cache_path = optimized_model_path(model_path, config, providers)
+    hit = os.path.exists(cache_path)
+    if not hit:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # Other workers may optimize the same model at the same time
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        options = make_session_options(config)
+        options.optimized_model_filepath = temp_path
+        ort.InferenceSession(model_path, sess_options=options, providers=providers)
+        os.replace(temp_path, cache_path)
+
+    options = make_session_options(config)
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+    return cache_path, options, hit
+
+
+class SessionPool:
+    """
+    A fixed set of ONNX Runtime sessions of the same model, which the
+    tasks check out to run the model.
+
+    One session runs one call at a time, so the tasks are only queued
+    when all sessions are busy. A few sessions with a few threads each
+    give more frames per second in total, and one session with all
+    threads gives the lowest latency of a frame.
+
+    Parameters
+    ----------
+    model_path : str
+        Filename or serialized ONNX or ORT format model in a byte string.
+    size : int
+        The number of sessions.
+    options : ort.SessionOptions
+        The options of every session.
+    providers : list[str]
+        The execution providers in the order of preference.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        size: int,
+        options: ort.SessionOptions,
+        providers: list[str],
+    ) -> None:
+        self.sessions = [
+            ort.InferenceSession(model_path, sess_options=options, providers=providers)
+            for _ in range(max(1, size))
+        ]
+        self._bindings = {id(session): session.io_binding() for session in self.sessions}
+        self._idle: Queue[ort.InferenceSession] = Queue()
+        for session in self.sessions:
+            self._idle.put(session)
+        self._lock = Lock()
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @contextmanager
+    def checkout(self) -> Iterator[ort.InferenceSession]:
+        """
+        Takes an idle session for the duration of the block, waiting
+        for one if all of them are busy.
+
+        Yields
+        ------
+        ort.InferenceSession
+            The session, which is only used by the caller until the block ends.
+        """
+        start = time.perf_counter()
+        session = self._idle.get()
+        wait = time.perf_counter() - start
+        with self._lock:
+            self._checkouts += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+        try:
+            yield session
+        finally:
+            self._idle.put(session)
+
+    def io_binding(self, session: ort.InferenceSession) -> ort.IOBinding:
+        """
+        Returns the IO binding of a session of the pool.
+
+        The binding is reused for every run of the session, so it may only be
+        changed while the session is checked out.
+
+        Parameters
+        ----------
+        session : ort.InferenceSession
+            The checked out session.
+
+        Returns
+        -------
+        ort.IOBinding
+            The binding of the inputs and outputs of the session.
+        """
+        return self._bindings[id(session)]
+
+    def stats(self) -> dict:
+        """
+        Returns the use of the sessions so far.
+
+        Returns
+        -------
+        dict
+            The number of sessions and the busy ones, the number of runs,
+            the mean and the maximum time waited for a session in milliseconds.
+        """
+        with self._lock:
+            checkouts = self._checkouts
+            return {
+                "size": len(self.sessions),
+                "busy": len(self.sessions) - self._idle.qsize(),
+                "runs": checkouts,
+                "mean_wait_ms": (
+                    round(1000 * self._wait_total / checkouts, 2) if checkouts else 0
+                ),
+                "max_wait_ms": round(1000 * self._wait_max, 2),
+            }
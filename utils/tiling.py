@@ -0,0 +1,127 @@
+import math
+from collections import deque
+from threading import Lock
+
+import numpy as np
+
+
+def make_tiles(
+    width: int, height: int, grid: tuple[int, int], overlap: float
+) -> list[tuple[int, int, int, int]]:
+    """
+    Splits a frame into a grid of overlapping tiles of the same size.
+
+    Parameters
+    ----------
+    width : int
+        The width of the frame.
+    height : int
+        The height of the frame.
+    grid : tuple[int, int]
+        The number of columns and rows of tiles.
+    overlap : float
+        The share of a tile that overlaps with its neighbour, from 0 to 1.
+
+    Returns
+    -------
+    list[tuple[int, int, int, int]]
+        The left, top, right and bottom edges of every tile, row by row.
+    """
+    columns, rows = grid
+
+    def edges(size: int, count: int) -> list[tuple[int, int]]:
+        if count <= 1:
+            return [(0, size)]
+        # count tiles of length `tile` with `overlap * tile` in common cover `size`
+        tile = min(size, math.ceil(size / (count - (count - 1) * overlap)))
+        step = (size - tile) / (count - 1)
+        return [(round(i * step), round(i * step) + tile) for i in range(count)]
+
+    return [
+        (left, top, right, bottom)
+        for top, bottom in edges(height, rows)
+        for left, right in edges(width, columns)
+    ]
+
+
+class TileSelector:
+    """
+    Chooses the tiles of a frame to detect objects in.
+
+    Without `adaptive` every tile is processed. Otherwise only the tiles
+    with objects tracked during the last `track_frames` frames are,
+    and all of them once every `scan_frames` frames, so that new small
+    objects are found too. This bounds the cost of the tiles by the area
+    where the objects are.
+
+    Parameters
+    ----------
+    tiles : list[tuple[int, int, int, int]]
+        All tiles of the frame (see `make_tiles`).
+    adaptive : bool
+        Whether to skip the tiles without recent objects.
+    track_frames : int
+        The number of frames a tracked object keeps its tiles processed.
+    scan_frames : int
+        The period of processing all tiles in frames.
+    """
+
+    def __init__(
+        self,
+        tiles: list[tuple[int, int, int, int]],
+        adaptive: bool,
+        track_frames: int,
+        scan_frames: int,
+    ) -> None:
+        self.tiles = tiles
+        self.adaptive = adaptive
+        self.track_frames = max(1, track_frames)
+        self.scan_frames = max(1, scan_frames)
+        self._frame = 0
+        self._recent: deque[np.ndarray] = deque(maxlen=self.track_frames)
+        self._lock = Lock()
+
+    def select(self) -> list[tuple[int, int, int, int]]:
+        """
+        Returns the tiles to process in the next frame.
+
+        Returns
+        -------
+        list[tuple[int, int, int, int]]
+            The selected tiles.
+        """
+        with self._lock:
+            frame = self._frame
+            self._frame += 1
+            if not self.adaptive or frame % self.scan_frames == 0:
+                return self.tiles
+            if not self._recent:
+                return []
+            boxes = np.concatenate(self._recent)
+        if not len(boxes):
+            return []
+        centers = (boxes[:, :2] + boxes[:, 2:4]) / 2
+        return [
+            tile
+            for tile in self.tiles
+            if np.any(
+                (centers[:, 0] >= tile[0])
+                & (centers[:, 0] < tile[2])
+                & (centers[:, 1] >= tile[1])
+                & (centers[:, 1] < tile[3])
+            )
+        ]
+
+    def update(self, result: list) -> None:
+        """
+        Remembers the objects tracked in a frame.
+
+        Parameters
+        ----------
+        result : list
+            The tracked objects, each starting with its box
+            [x_min, y_min, x_max, y_max].
+        """
+        boxes = np.array([det[:4] for det in result], dtype=np.float32).reshape(-1, 4)
+        with self._lock:
+            self._recent.append(boxes)
@@ -0,0 +1,506 @@
+import multiprocessing as mp
+import queue
+import threading
+import time
+from dataclasses import asdict
+from logging import Logger
+from typing import Any, Callable
+
+from config import general_cfg
+from utils.dataclasses import StatusTask, TaskParameters
+
+STATUS_INTERVAL = 0.5
+"""The period of sending the status of the tasks from a worker in seconds."""
+CALL_TIMEOUT = 300.0
+"""The time to wait for the workers to answer a call in seconds."""
+RESTART_DELAY = 5.0
+"""The delay before restarting a worker that exited in seconds, it doubles
+after each failure in a row up to `MAX_RESTART_DELAY`."""
+MAX_RESTART_DELAY = 300.0
+"""The longest delay before restarting a worker in seconds."""
+
+
+def _worker_main(
+    factory: Callable[[], Any],
+    config: dict,
+    index: int,
+    commands: mp.Queue,
+    events: mp.Queue,
+    calls: list[tuple[str, tuple]],
+) -> None:
+    """
+    The main loop of a worker process: creates its own detector, starts
+    the tasks it gets in threads, reports their status and answers
+    the calls of the methods of its detector (see `WorkerPool.call`)
+    in threads too, so a long call does not hold up the tasks.
+
+    Parameters
+    ----------
+    factory : Callable[[], Base]
+        Creates the detector of the worker (see `Base.worker_factory`).
+    config : dict
+        The general config of the main process.
+    index : int
+        The number of the worker.
+    commands : mp.Queue
+        The commands of the main process to the worker.
+    events : mp.Queue
+        The status of the tasks, the metrics of the worker and the results
+        of the calls for the main process.
+    calls : list[tuple[str, tuple]]
+        The calls made to the previous workers that the detector must
+        repeat before it is ready, e.g. to load the same models.
+    """
+    general_cfg.update(config)
+    # The tasks of a worker run in its own threads
+    general_cfg["workers"] = 0
+    try:
+        detector = factory()
+        for method, call_args in calls:
+            getattr(detector, method)(*call_args)
+    except Exception as e:
+        events.put(("failed", index, None, f"{type(e).__name__}: {e}"))
+        raise
+    threads: dict[int, threading.Thread] = {}
+
+    def run_task(video_url: str, task_id: int, properties: dict) -> None:
+        try:
+            status = detector._perform_inference_async(video_url, task_id, properties)
+            # The results are already sent to the manager by the worker
+            status.pop("results", None)
+        except Exception as e:
+            detector.logger.error("Task %s failed in worker %s: %s", task_id, index, e)
+            status = {"state": StatusTask.ERROR, "success": False}
+        events.put(("done", index, task_id, status))
+
+    def report() -> None:
+        tasks = {
+            task_id: asdict(params)
+            for task_id, params in list(detector.task_params.items())
+            if task_id in threads
+        }
+        events.put(("status", index, tasks, detector.service_metrics()))
+
+    def answer(call_id: int, method: str, call_args: tuple) -> None:
+        try:
+            reply = (True, getattr(detector, method)(*call_args))
+        except Exception as e:
+            detector.logger.error("%s failed in worker %s: %s", method, index, e)
+            reply = (False, str(e))
+        events.put(("reply", index, call_id, reply))
+
+    events.put(("ready", index, None, None))
+    last_report = 0.0
+    while True:
+        try:
+            command, *args = commands.get(timeout=STATUS_INTERVAL)
+        except queue.Empty:
+            command = ""
+        match command:
+            case "start":
+                video_url, task_id, properties = args
+                thread = threading.Thread(
+                    target=run_task,
+                    args=(video_url, task_id, properties),
+                    name=f"task-{task_id}",
+                    daemon=True,
+                )
+                threads[task_id] = thread
+                thread.start()
+            case "stop":
+                params = detector.task_params.get(args[0])
+                if params is not None and params.inference_status == StatusTask.RUNNING:
+                    params.inference_status = StatusTask.STOPPED
+            case "call":
+                threading.Thread(
+                    target=answer, args=args, name=f"call-{args[0]}", daemon=True
+                ).start()
+            case "close":
+                break
+
+        for task_id in [task_id for task_id, thread in threads.items() if not thread.is_alive()]:
+            threads.pop(task_id)
+        if time.monotonic() - last_report >= STATUS_INTERVAL:
+            report()
+            last_report = time.monotonic()
+
+
+class WorkerPool:
+    """
+    Runs the tasks in worker processes instead of the threads of the main
+    process, so preprocessing, tracking, drawing and encoding of different
+    tasks do not contend for one GIL.
+
+    Every worker creates its own detector with its own models and runs
+    the tasks it gets in its threads from start to end: it decodes the
+    stream, sends the frames and the results to the manager, so frames
+    never cross the process boundary. The main process only holds
+    the status of the tasks, which the workers report every
+    `STATUS_INTERVAL` seconds, and passes the stop requests to them.
+    It does not load the models, the calls that change them
+    are passed to every worker (see `call`).
+
+    A task goes to the worker that already processes the same stream,
+    so the decoding is still shared (see `StreamMultiplexer`), otherwise
+    to the worker with the fewest tasks.
+
+    A worker that exits, including one whose detector fails to start,
+    fails its tasks and is started again after `RESTART_DELAY` seconds.
+    The new worker repeats the calls marked for it (see `call`).
+
+    The frames never leave the worker that decodes them, so no frame
+    transport between the processes is needed: each process only sends
+    the status of its tasks (see `benchmarks.workers` for the amount
+    of data and the scaling with the number of tasks).
+
+    Parameters
+    ----------
+    size : int
+        The number of worker processes.
+    task_params : dict[int, TaskParameters]
+        The parameters of the tasks in the main process, the status
+        reported by the workers is written into them.
+    logger : Logger
+        A logger for displaying various information.
+    """
+
+    def __init__(
+        self, size: int, task_params: dict[int, TaskParameters], logger: Logger
+    ) -> None:
+        self.size = max(1, size)
+        self.task_params = task_params
+        self.logger = logger
+        self._context = mp.get_context("spawn")
+        self._processes: list[Any] = []
+        self._commands: list[Any] = []
+        self._events: Any = None
+        self._tasks: dict[int, tuple[int, str]] = {}
+        """The worker and the stream of every running task."""
+        self._done: dict[int, tuple[threading.Event, dict]] = {}
+        self._stopping: set[int] = set()
+        self._calls: dict[int, tuple[threading.Event, dict[int, tuple[bool, Any]]]] = {}
+        """The replies of the workers to every pending call by worker."""
+        self._call_id = 0
+        self._metrics: list[dict] = [{} for _ in range(self.size)]
+        self._ready: list[bool] = [False] * self.size
+        self._factory: Callable[[], Any] | None = None
+        self._replay: list[tuple[str, tuple]] = []
+        """The calls a restarted worker repeats, in the order they were made."""
+        self._errors: list[str | None] = [None] * self.size
+        """The last error that stopped every worker from starting."""
+        self._restarts: list[int] = [0] * self.size
+        self._failures: list[int] = [0] * self.size
+        """The number of times in a row every worker exited before it was ready."""
+        self._restart_at: list[float | None] = [None] * self.size
+        self._lock = threading.Lock()
+        self._relay: threading.Thread | None = None
+        self._closed = False
+
+    def start(self, factory: Callable[[], Any]) -> None:
+        """
+        Starts the worker processes.
+
+        Parameters
+        ----------
+        factory : Callable[[], Base]
+            Creates the detector of a worker, it must be picklable.
+        """
+        self._factory = factory
+        self._events = self._context.Queue()
+        self._commands = [None] * self.size
+        self._processes = [None] * self.size
+        for index in range(self.size):
+            self._spawn(index)
+        self._relay = threading.Thread(target=self._relay_events, name="worker-relay", daemon=True)
+        self._relay.start()
+        self.logger.info("Started %s worker processes", self.size)
+
+    def _spawn(self, index: int) -> None:
+        """
+        Starts a worker process in place of the previous one.
+        """
+        # The commands left for the previous worker are not repeated
+        commands = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(
+                self._factory,
+                dict(general_cfg),
+                index,
+                commands,
+                self._events,
+                list(self._replay),
+            ),
+            name=f"worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        self._commands[index] = commands
+        self._processes[index] = process
+        self._ready[index] = False
+        self._metrics[index] = {}
+
+    def run(self, video_url: str, task_id: int, properties: dict) -> dict:
+        """
+        Runs a task in a worker and waits for it to end.
+
+        Parameters
+        ----------
+        video_url : str
+            A link to the video stream or file to be processed.
+        task_id : int
+            The ID of the video processing task.
+        properties : dict
+            Additional parameters for processing.
+
+        Returns
+        -------
+        dict
+            The final status of the task as it was sent to the manager.
+        """
+        done = threading.Event()
+        with self._lock:
+            index = self._choose(video_url)
+            self._tasks[task_id] = (index, video_url)
+            self._done[task_id] = (done, {})
+        self._commands[index].put(("start", video_url, task_id, properties))
+        done.wait()
+        with self._lock:
+            self._tasks.pop(task_id, None)
+            self._stopping.discard(task_id)
+            return self._done.pop(task_id)[1]
+
+    def _choose(self, video_url: str) -> int:
+        for index, url in self._tasks.values():
+            if url == video_url and self._processes[index].is_alive():
+                return index
+        load = [0] * self.size
+        for index, _ in self._tasks.values():
+            load[index] += 1
+        alive = [i for i in range(self.size) if self._processes[i].is_alive()]
+        if not alive:
+            raise RuntimeError("No worker processes are running")
+        # The workers that are still starting get the tasks only if no other can
+        ready = [i for i in alive if self._ready[i]] or alive
+        return min(ready, key=lambda i: load[i])
+
+    def call(
+        self,
+        method: str,
+        *args: Any,
+        timeout: float = CALL_TIMEOUT,
+        replay: bool = False,
+    ) -> list[Any]:
+        """
+        Calls a method of the detector in every worker and waits
+        for all of them, e.g. to load a model.
+
+        Parameters
+        ----------
+        method : str
+            The name of the method of the detector.
+        *args
+            The arguments of the method, they must be picklable.
+        timeout : float, optional
+            The time to wait for the workers in seconds, a worker that
+            has not answered by then fails the call (default is `CALL_TIMEOUT`).
+        replay : bool, optional
+            Whether the workers started later repeat the call if it succeeds,
+            for the calls that change the detectors (default is False).
+
+        Returns
+        -------
+        list[Any]
+            The results of the method in every worker.
+
+        Raises
+        ------
+        RuntimeError
+            If the method failed in any worker, a worker is not running
+            or has not answered in time.
+        """
+        done = threading.Event()
+        replies: dict[int, tuple[bool, Any]] = {}
+        with self._lock:
+            self._call_id += 1
+            call_id = self._call_id
+            self._calls[call_id] = (done, replies)
+            # A worker restarted meanwhile never gets the call
+            processes = list(self._processes)
+            for commands in self._commands:
+                commands.put(("call", call_id, method, args))
+        deadline = time.monotonic() + timeout
+        while not done.wait(STATUS_INTERVAL):
+            with self._lock:
+                for index, process in enumerate(processes):
+                    if index not in replies and not process.is_alive():
+                        replies[index] = (False, "the worker is not running")
+                if time.monotonic() >= deadline:
+                    for index in range(self.size):
+                        replies.setdefault(index, (False, f"no answer in {timeout} s"))
+                if len(replies) == self.size:
+                    break
+        with self._lock:
+            self._calls.pop(call_id)
+
+        errors = [
+            f"worker {index}: {result}"
+            for index, (success, result) in sorted(replies.items())
+            if not success
+        ]
+        if errors:
+            raise RuntimeError("; ".join(errors))
+        if replay:
+            with self._lock:
+                self._replay.append((method, args))
+        return [replies[index][1] for index in range(self.size)]
+
+    def broadcast(self, command: str, *args: Any) -> None:
+        """
+        Passes a command to every worker without waiting for it,
+        e.g. to close them.
+
+        Parameters
+        ----------
+        command : str
+            The name of the command.
+        *args
+            The arguments of the command, they must be picklable.
+        """
+        for commands in self._commands:
+            commands.put((command, *args))
+
+    def _relay_events(self) -> None:
+        """
+        Writes the status reported by the workers into the parameters
+        of the tasks, collects the replies to the calls, passes the stop
+        requests to the workers, fails the tasks of the workers that died
+        and restarts them.
+        """
+        while not self._closed:
+            try:
+                event, index, task_id, data = self._events.get(timeout=STATUS_INTERVAL)
+            except queue.Empty:
+                event = ""
+            except (EOFError, OSError):
+                break
+
+            with self._lock:
+                match event:
+                    case "ready":
+                        self._ready[index] = True
+                        self._errors[index] = None
+                        self._failures[index] = 0
+                    case "failed":
+                        self._errors[index] = data
+                        self.logger.error("Worker %s failed to start: %s", index, data)
+                    case "status":
+                        self._metrics[index] = data
+                        for reported_id, fields in task_id.items():
+                            params = self.task_params.get(reported_id)
+                            if params is None:
+                                continue
+                            if params.inference_status == StatusTask.STOPPED:
+                                # The stop request wins over the reported status
+                                fields.pop("inference_status", None)
+                            fields.pop("host_ip", None)
+                            for name, value in fields.items():
+                                setattr(params, name, value)
+                    case "done":
+                        if task_id in self._done:
+                            self._done[task_id][1].update(data or {})
+                            self._done[task_id][0].set()
+                    case "reply":
+                        # The ID of the call comes in place of the task
+                        if task_id in self._calls:
+                            done, replies = self._calls[task_id]
+                            replies[index] = data
+                            if len(replies) == self.size:
+                                done.set()
+
+                for running_id, (worker, _) in self._tasks.items():
+                    params = self.task_params.get(running_id)
+                    if (
+                        params is not None
+                        and params.inference_status == StatusTask.STOPPED
+                        and running_id not in self._stopping
+                    ):
+                        self._stopping.add(running_id)
+                        self._commands[worker].put(("stop", running_id))
+                    if not self._processes[worker].is_alive() and running_id in self._done:
+                        self.logger.error("Worker %s died, task %s failed", worker, running_id)
+                        self._done[running_id][1]["state"] = StatusTask.ERROR
+                        self._done[running_id][0].set()
+                if not self._closed:
+                    self._restart_dead()
+
+    def _restart_dead(self) -> None:
+        """
+        Restarts the workers that exited once their delay is over.
+        Called under `_lock`.
+        """
+        now = time.monotonic()
+        for index, process in enumerate(self._processes):
+            if process.is_alive():
+                continue
+            if self._restart_at[index] is None:
+                if not self._ready[index]:
+                    self._failures[index] += 1
+                delay = min(RESTART_DELAY * 2 ** self._failures[index], MAX_RESTART_DELAY)
+                self._ready[index] = False
+                self._restart_at[index] = now + delay
+                self.logger.error(
+                    "Worker %s exited with code %s, restarting in %.0f s",
+                    index,
+                    process.exitcode,
+                    delay,
+                )
+            elif now >= self._restart_at[index]:
+                self._restart_at[index] = None
+                self._restarts[index] += 1
+                self._spawn(index)
+
+    def stats(self) -> list[dict]:
+        """
+        Returns the state and the metrics of every worker.
+
+        Returns
+        -------
+        list[dict]
+            The process ID, whether it is alive and has loaded its models,
+            the number of its tasks and of its restarts, the error that
+            stopped it from starting if it has not started since, and its
+            own service metrics (see `Base.service_metrics`) as last reported.
+        """
+        with self._lock:
+            load = [0] * self.size
+            for index, _ in self._tasks.values():
+                load[index] += 1
+            return [
+                {
+                    "pid": process.pid,
+                    "alive": process.is_alive(),
+                    "ready": self._ready[index],
+                    "tasks": load[index],
+                    "restarts": self._restarts[index],
+                    "error": self._errors[index],
+                    **self._metrics[index],
+                }
+                for index, process in enumerate(self._processes)
+            ]
+
+    def close(self, timeout: float = 5) -> None:
+        """
+        Stops the workers, the running tasks are interrupted.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The time to wait for each worker in seconds (default is 5).
+        """
+        self._closed = True
+        self.broadcast("close")
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()